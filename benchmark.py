@@ -0,0 +1,213 @@
+import csv
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+from config import Config
+
+# Columns of the per-request CSV, in order
+RECORD_FIELDS = ["provider", "model", "question", "scheduled", "latency", "ttft", "rate_limit_wait",
+                 "success", "error", "source", "cache_hit", "warmup"]
+
+
+def percentile(values: list, pct: float) -> Optional[float]:
+    """Linearly interpolated percentile (0-100) of values; None when there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def distribution(values: list) -> dict:
+    """p50/p90/p99/max/mean of a list of seconds"""
+    return {
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+        "mean": sum(values) / len(values) if values else None
+    }
+
+
+class LoadBenchmark:
+    """Drive a RAGEngine with concurrent requests and measure latency, TTFT, throughput and errors.
+
+    Closed loop (no rate): `concurrency` workers each send their next question as soon as
+    the previous answer arrives. Open loop (rate in requests per second): questions are
+    sent on schedule whether or not earlier ones finished, with at most `concurrency` in
+    flight; latency counts from when each request was due, so time spent queued behind a
+    slow server is not hidden. Requests sent during the first `warmup` seconds run but
+    are left out of the results.
+    """
+
+    def __init__(self, rag, questions: List[str], concurrency: Optional[int] = None,
+                 rate: Optional[float] = None, duration: Optional[float] = None,
+                 warmup: Optional[float] = None, stream: bool = True, arrival: str = "constant"):
+        if not questions:
+            raise ValueError("At least one question is required")
+        if arrival not in ("constant", "poisson"):
+            raise ValueError(f"Unknown arrival pattern: {arrival}")
+        self.rag = rag
+        self.questions = questions
+        self.concurrency = concurrency or Config.BENCHMARK_CONCURRENCY
+        self.rate = Config.BENCHMARK_RATE if rate is None else rate
+        self.duration = Config.BENCHMARK_DURATION if duration is None else duration
+        self.warmup = Config.BENCHMARK_WARMUP if warmup is None else warmup
+        # Streaming measures time to first token; otherwise only whole-response latency
+        self.stream = stream
+        self.arrival = arrival
+        self.records = []
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._next = 0
+        self._start = 0.0
+
+    @property
+    def mode(self) -> str:
+        return "open" if self.rate else "closed"
+
+    def _next_question(self) -> str:
+        with self._lock:
+            question = self.questions[self._next % len(self.questions)]
+            self._next += 1
+            return question
+
+    def _request(self, question: str, scheduled: float):
+        """Send one question and record its outcome; scheduled is when it was due (perf_counter)"""
+        # Imported here so compare_results can use this module without the provider SDKs
+        from rag_engine import is_error_response
+        sent = time.perf_counter()
+        ttft = None
+        wait = 0.0
+        source = "error"
+        cache_hit = False
+        error = None
+        try:
+            if self.stream:
+                stream = self.rag.stream_query(question)
+                for _ in stream:
+                    pass
+                response, source, cache_hit = stream.text, stream.source, stream.cache_hit
+                wait = stream.rate_limit_wait
+                # Measured from the request being due, like latency, so rate limiting counts as queueing
+                ttft = None if stream.ttft is None else stream.ttft + wait + (sent - scheduled)
+            else:
+                result = self.rag.query_detailed(question)
+                response, source, cache_hit = result["response"], result["source"], result["cache_hit"]
+                wait = result.get("rate_limit_wait", 0.0)
+            if is_error_response(response):
+                error = response
+        except Exception as e:
+            error = str(e)
+        finished = time.perf_counter()
+        record = {
+            "provider": self.rag.provider_type,
+            "model": self.rag.provider.model_name,
+            "question": question,
+            "scheduled": scheduled - self._start,
+            "finished": finished - self._start,
+            "latency": finished - scheduled,
+            "ttft": ttft,
+            "rate_limit_wait": wait,
+            "success": error is None,
+            "error": error,
+            "source": source,
+            "cache_hit": cache_hit,
+            "warmup": scheduled - self._start < self.warmup
+        }
+        with self._lock:
+            self.records.append(record)
+
+    def _closed_worker(self, end: float):
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                return
+            self._request(self._next_question(), now)
+
+    def _interval(self) -> float:
+        if self.arrival == "poisson":
+            return random.expovariate(self.rate)
+        return 1 / self.rate
+
+    def run(self) -> dict:
+        """Run the warmup and the measured period, then return the summary"""
+        self.records = []
+        self.started_at = datetime.now().isoformat()
+        self._start = time.perf_counter()
+        end = self._start + self.warmup + self.duration
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="benchmark") as executor:
+            if self.rate:
+                due = self._start
+                while due < end:
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    executor.submit(self._request, self._next_question(), due)
+                    due += self._interval()
+            else:
+                for _ in range(self.concurrency):
+                    executor.submit(self._closed_worker, end)
+        return self.summary()
+
+    def summary(self) -> dict:
+        """Latency and TTFT percentiles, throughput and error rate of the measured requests.
+
+        by_source splits them by what answered (provider, router, cache, semantic_cache),
+        since router and cache answers take microseconds and would hide provider latency.
+        """
+        measured = [record for record in self.records if not record["warmup"]]
+        successes = [record for record in measured if record["success"]]
+        # From the end of warmup until the last measured request finished
+        elapsed = max((record["finished"] for record in measured), default=self.warmup) - self.warmup
+        ttfts = [record["ttft"] for record in successes if record["ttft"] is not None]
+        by_source = {}
+        for source in sorted({record["source"] for record in successes}):
+            answered = [record for record in successes if record["source"] == source]
+            by_source[source] = {
+                "successes": len(answered),
+                "throughput": len(answered) / elapsed if elapsed > 0 else 0.0,
+                "latency": distribution([record["latency"] for record in answered]),
+                "ttft": distribution([record["ttft"] for record in answered if record["ttft"] is not None])
+            }
+        return {
+            "started_at": self.started_at,
+            "provider": self.rag.provider_type,
+            "model": self.rag.provider.model_name,
+            "mode": self.mode,
+            "concurrency": self.concurrency,
+            "rate": self.rate or None,
+            "arrival": self.arrival if self.rate else None,
+            "duration": self.duration,
+            "warmup": self.warmup,
+            "stream": self.stream,
+            "requests": len(measured),
+            "successes": len(successes),
+            "errors": len(measured) - len(successes),
+            "error_rate": (len(measured) - len(successes)) / len(measured) if measured else 0.0,
+            "throughput": len(successes) / elapsed if elapsed > 0 else 0.0,
+            "cache_hits": sum(1 for record in measured if record["cache_hit"]),
+            "latency": distribution([record["latency"] for record in successes]),
+            "ttft": distribution(ttfts),
+            "by_source": by_source
+        }
+
+    def save_json(self, filename: str) -> str:
+        """Write the summary and every request to a JSON file"""
+        with open(filename, "w") as f:
+            json.dump({"summary": self.summary(), "requests": self.records}, f, indent=2)
+        return filename
+
+    def save_csv(self, filename: str) -> str:
+        """Write one row per request to a CSV file"""
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows(self.records)
+        return filename
@@ -0,0 +1,243 @@
+"""
+Compare saved test and benchmark results and flag latency regressions.
+
+Reads files written by TestResults.save_to_file and ProviderTester.run_benchmark, aligns
+them per (provider, question), and reports how each latency metric changed with a
+bootstrap confidence interval. A metric regresses when it got slower by more than the
+threshold and the interval excludes no change. A question that succeeded in the baseline
+but never in the candidate, or an error rate that rose by more than
+--max-error-rate-increase points, is a regression too; any regression makes the exit
+status 1. Error rates leave out the failing questions, so each failure counts once.
+
+The bootstrap needs at least two samples on each side. A TestResults file asks each
+question once, so with a single baseline and candidate file the per-question rows have no
+interval and never flag a regression; only each provider's "(all questions)" row can.
+Pass several runs per side (--candidate-runs) or benchmark files for per-question verdicts.
+
+    python compare_results.py baseline.json candidate.json
+    python compare_results.py base1.json base2.json cand1.json cand2.json --candidate-runs 2
+"""
+
+import argparse
+import json
+import random
+import sys
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from benchmark import percentile
+
+METRICS = ("mean", "p50", "p90", "p99")
+# Row key standing for every aligned question of a provider
+ALL_QUESTIONS = "(all questions)"
+
+
+def load_results(filename: str, field: str = "latency") -> List[dict]:
+    """Read the requests of a TestResults or benchmark JSON file as {provider, question, value, success}"""
+    with open(filename) as f:
+        data = json.load(f)
+    if "requests" in data:
+        # Benchmark output; warmup requests were not part of the measurement
+        records = [record for record in data["requests"] if not record.get("warmup")]
+    else:
+        records = [dict(record, provider=provider)
+                   for provider, results in data.get("results", {}).items() for record in results]
+    return [
+        {"provider": record["provider"], "question": record["question"],
+         "value": record.get(field), "success": record.get("success", True)}
+        for record in records
+    ]
+
+
+def group_results(filenames: List[str], field: str = "latency") -> Tuple[Dict, Dict]:
+    """Successful values and request counts per (provider, question), pooled over several files.
+
+    Every requested key is present in values, with an empty list when none succeeded.
+    """
+    values = defaultdict(list)
+    counts = defaultdict(lambda: [0, 0])
+    for filename in filenames:
+        for record in load_results(filename, field):
+            key = (record["provider"], record["question"])
+            counts[key][0] += 1
+            samples = values[key]
+            if record["success"] and record["value"] is not None:
+                samples.append(record["value"])
+            else:
+                counts[key][1] += 1
+    return values, counts
+
+
+def metric(values: List[float], name: str) -> float:
+    if name == "mean":
+        return sum(values) / len(values)
+    return percentile(values, float(name[1:]))
+
+
+def bootstrap_interval(baseline: List[float], candidate: List[float], name: str, resamples: int,
+                       confidence: float, rng: random.Random) -> Optional[Tuple[float, float]]:
+    """Bootstrap confidence interval of metric(candidate) - metric(baseline); None with too few samples"""
+    if len(baseline) < 2 or len(candidate) < 2:
+        return None
+    deltas = sorted(
+        metric(rng.choices(candidate, k=len(candidate)), name) - metric(rng.choices(baseline, k=len(baseline)), name)
+        for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2 * 100
+    return percentile(deltas, tail), percentile(deltas, 100 - tail)
+
+
+def compare(baseline_files: List[str], candidate_files: List[str], field: str = "latency",
+            threshold: float = 10.0, confidence: float = 0.95, resamples: int = 2000,
+            seed: Optional[int] = 0, max_error_rate_increase: float = 1.0) -> dict:
+    """Compare candidate runs against baseline runs question by question and per provider.
+
+    max_error_rate_increase is in percentage points.
+    """
+    baseline, baseline_counts = group_results(baseline_files, field)
+    candidate, candidate_counts = group_results(candidate_files, field)
+    rng = random.Random(seed)
+
+    aligned = sorted(set(baseline) & set(candidate))
+    rows = []
+    # Questions the baseline answered that the candidate never did have no latency to compare
+    failing = []
+    pooled = defaultdict(lambda: ([], []))
+    for provider, question in aligned:
+        if not baseline[(provider, question)]:
+            continue
+        if not candidate[(provider, question)]:
+            failing.append((provider, question))
+            continue
+        pooled[provider][0].extend(baseline[(provider, question)])
+        pooled[provider][1].extend(candidate[(provider, question)])
+        rows.append(((provider, question), baseline[(provider, question)], candidate[(provider, question)]))
+    for provider, (baseline_values, candidate_values) in sorted(pooled.items()):
+        rows.append(((provider, ALL_QUESTIONS), baseline_values, candidate_values))
+
+    comparisons = []
+    for (provider, question), baseline_values, candidate_values in rows:
+        for name in METRICS:
+            before = metric(baseline_values, name)
+            after = metric(candidate_values, name)
+            interval = bootstrap_interval(baseline_values, candidate_values, name, resamples, confidence, rng)
+            change = (after - before) / before * 100 if before else 0.0
+            comparisons.append({
+                "provider": provider,
+                "question": question,
+                "metric": name,
+                "baseline": before,
+                "candidate": after,
+                "delta": after - before,
+                "change_percent": change,
+                "ci_low": interval[0] if interval else None,
+                "ci_high": interval[1] if interval else None,
+                "baseline_samples": len(baseline_values),
+                "candidate_samples": len(candidate_values),
+                # Significant: slower beyond the threshold and the interval lies above zero
+                "regression": bool(interval) and change > threshold and interval[0] > 0,
+                "improvement": bool(interval) and change < -threshold and interval[1] < 0
+            })
+
+    # Over every request except the failing questions, which are already counted above
+    failing_keys = set(failing)
+    error_rates = {}
+    for provider in sorted({key[0] for key in baseline_counts} | {key[0] for key in candidate_counts}):
+        rates = []
+        for counts in (baseline_counts, candidate_counts):
+            counted = [count for key, count in counts.items() if key[0] == provider and key not in failing_keys]
+            total = sum(count[0] for count in counted)
+            failed = sum(count[1] for count in counted)
+            rates.append(failed / total if total else 0.0)
+        error_rates[provider] = {
+            "baseline": rates[0],
+            "candidate": rates[1],
+            "regression": (rates[1] - rates[0]) * 100 > max_error_rate_increase
+        }
+
+    return {
+        "field": field,
+        "threshold_percent": threshold,
+        "max_error_rate_increase": max_error_rate_increase,
+        "confidence": confidence,
+        "baseline_files": baseline_files,
+        "candidate_files": candidate_files,
+        "aligned": len(aligned),
+        "unmatched": sorted(f"{provider}: {question}" for provider, question in set(baseline) ^ set(candidate)),
+        "error_rates": error_rates,
+        "comparisons": comparisons,
+        "failing": sorted(f"{provider}: {question}" for provider, question in failing),
+        "regressions": (sum(1 for comparison in comparisons if comparison["regression"]) + len(failing)
+                        + sum(1 for rates in error_rates.values() if rates["regression"]))
+    }
+
+
+def print_report(report: dict):
+    def ms(value):
+        return f"{value*1000:.0f}ms" if value is not None else "-"
+
+    print("\n" + "="*100)
+    print(f"📈 {report['field'].upper()} COMPARISON: {len(report['baseline_files'])} baseline vs "
+          f"{len(report['candidate_files'])} candidate run(s), {report['aligned']} aligned questions")
+    print("="*100)
+    interval_label = f"{report['confidence']*100:.0f}% CI"
+    print(f"{'Provider':10} {'Question':40} {'Metric':6} {'Baseline':>9} {'Candidate':>10} "
+          f"{'Change':>8} {interval_label:>20}")
+    for comparison in report["comparisons"]:
+        interval = ("-" if comparison["ci_low"] is None
+                    else f"[{comparison['ci_low']*1000:+.0f}, {comparison['ci_high']*1000:+.0f}]ms")
+        flag = "❌" if comparison["regression"] else "✅" if comparison["improvement"] else ""
+        print(f"{comparison['provider']:10} {comparison['question'][:40]:40} {comparison['metric']:6} "
+              f"{ms(comparison['baseline']):>9} {ms(comparison['candidate']):>10} "
+              f"{comparison['change_percent']:>+7.1f}% {interval:>20} {flag}")
+
+    for provider, rates in report["error_rates"].items():
+        flag = " ❌" if rates["regression"] else ""
+        print(f"\n{provider.upper()} error rate (excluding failing questions): "
+              f"{rates['baseline']*100:.1f}% → {rates['candidate']*100:.1f}%{flag}")
+    if report["failing"]:
+        print(f"\n❌ {len(report['failing'])} question(s) succeeded in the baseline but never in the candidate:")
+        for key in report["failing"]:
+            print(f"   {key}")
+    if report["unmatched"]:
+        print(f"\n⚠️  {len(report['unmatched'])} question(s) only in one side were skipped")
+
+    if report["regressions"]:
+        print(f"\n❌ {report['regressions']} regression(s): latency over {report['threshold_percent']:g}%, "
+              f"failing questions or error rate up over {report['max_error_rate_increase']:g} points")
+    else:
+        print(f"\n✅ No significant regressions over {report['threshold_percent']:g}%")
+
+
+def main(args: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare saved RAG test/benchmark results for regressions")
+    parser.add_argument("files", nargs="+", help="result files: baseline run(s) first, candidate run(s) last")
+    parser.add_argument("--candidate-runs", type=int, default=1, help="how many trailing files are the candidate")
+    parser.add_argument("--field", choices=("latency", "ttft"), default="latency")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown that counts as a regression")
+    parser.add_argument("--max-error-rate-increase", type=float, default=1.0,
+                        help="percentage points the error rate may rise before it counts as a regression")
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--resamples", type=int, default=2000, help="bootstrap resamples")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    options = parser.parse_args(args)
+
+    if options.candidate_runs < 1:
+        parser.error("--candidate-runs must be at least 1")
+    if len(options.files) <= options.candidate_runs:
+        parser.error("need at least one baseline file before the candidate file(s)")
+    baseline_files = options.files[:-options.candidate_runs]
+    candidate_files = options.files[-options.candidate_runs:]
+
+    report = compare(baseline_files, candidate_files, options.field, options.threshold,
+                     options.confidence, options.resamples, options.seed, options.max_error_rate_increase)
+    print_report(report)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Report saved to: {options.output}")
+    return 1 if report["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -10,6 +11,145 @@ class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
     OLLAMA_DEFAULT_MODEL = os.getenv("OLLAMA_MODEL", "mistral")
+    # Comma-separated Ollama servers to spread requests over (default: OLLAMA_BASE_URL alone)
+    OLLAMA_BASE_URLS = [url.strip() for url in os.getenv("OLLAMA_BASE_URLS", OLLAMA_BASE_URL).split(",") if url.strip()]
+    # "least-outstanding" (fewest requests in flight) or "latency" (in-flight requests x recent latency)
+    OLLAMA_BALANCE_STRATEGY = os.getenv("OLLAMA_BALANCE_STRATEGY", "least-outstanding")
+    # Favour servers that already have the requested model loaded (from /api/ps)
+    OLLAMA_PREFER_LOADED_MODEL = os.getenv("OLLAMA_PREFER_LOADED_MODEL", "true").lower() == "true"
+    # Seconds between /api/tags health probes; 0 disables background health checks
+    OLLAMA_HEALTH_CHECK_INTERVAL = float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", "10"))
+    # A server failing this many requests in a row is skipped for OLLAMA_EJECT_SECONDS
+    OLLAMA_EJECT_AFTER_FAILURES = int(os.getenv("OLLAMA_EJECT_AFTER_FAILURES", "2"))
+    OLLAMA_EJECT_SECONDS = float(os.getenv("OLLAMA_EJECT_SECONDS", "30"))
+    # Keep-alive connections kept open per Ollama server
+    OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+    # Retries for refused connections and 429/502/503/504, with exponential backoff
+    OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+    OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3.05"))
+    # Longest wait for the next bytes of a response; generation on CPU can be slow
+    OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "300"))
+    # How long Ollama keeps the model (and its cached prompt prefix) loaded after a request
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+    
+    # Gemini context caching: store long system prompts server-side instead of resending them.
+    # Only effective with RETRIEVAL_MODE=full, where every question sends the same database
+    # context; keyword/vector retrieval sends a short, per-question context that is never cached
+    GEMINI_CONTEXT_CACHE_ENABLED = os.getenv("GEMINI_CONTEXT_CACHE_ENABLED", "true").lower() == "true"
+    # Shorter prompts are sent inline; the API rejects caches below a model-specific minimum size
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096"))
+    GEMINI_CONTEXT_CACHE_TTL = float(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+    # Cached prompts kept per provider; the least recently used is deleted beyond this
+    GEMINI_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CONTEXT_CACHE_MAX_ENTRIES", "8"))
+    # Seconds a prompt is sent inline after creating its cache failed for a transient reason
+    GEMINI_CONTEXT_CACHE_RETRY_SECONDS = float(os.getenv("GEMINI_CONTEXT_CACHE_RETRY_SECONDS", "60"))
+    
+    # Provider rate limits shared by every query in the process; 0 disables the limit
+    GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+    OLLAMA_REQUESTS_PER_MINUTE = float(os.getenv("OLLAMA_REQUESTS_PER_MINUTE", "0"))
+    # Calls allowed at once before the per-minute rate applies; 0 means one second's worth
+    GEMINI_RATE_LIMIT_BURST = int(os.getenv("GEMINI_RATE_LIMIT_BURST", "0"))
+    OLLAMA_RATE_LIMIT_BURST = int(os.getenv("OLLAMA_RATE_LIMIT_BURST", "0"))
+    # Questions answered concurrently by RAGEngine.query_batch
+    BATCH_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", "8"))
+    
+    # Benchmark Settings (python rag_application.py --benchmark)
+    # Requests in flight at once; in closed-loop mode each sends its next question when answered
+    BENCHMARK_CONCURRENCY = int(os.getenv("BENCHMARK_CONCURRENCY", "8"))
+    # Requests per second sent regardless of completions (open loop); 0 runs closed loop
+    BENCHMARK_RATE = float(os.getenv("BENCHMARK_RATE", "0"))
+    # Seconds measured, after BENCHMARK_WARMUP seconds whose requests are not counted
+    BENCHMARK_DURATION = float(os.getenv("BENCHMARK_DURATION", "30"))
+    BENCHMARK_WARMUP = float(os.getenv("BENCHMARK_WARMUP", "5"))
+    
+    # Failover Settings: a second provider answering when RAGEngine's provider fails or is slow
+    # Provider type to fall back to ("gemini" or "ollama"); empty disables failover
+    FALLBACK_PROVIDER = os.getenv("FALLBACK_PROVIDER", "")
+    # "failover" tries providers in order; "hedge" also asks the fallback once the primary is slow
+    FAILOVER_MODE = os.getenv("FAILOVER_MODE", "failover")
+    # Seconds before a provider counts as timed out in failover mode; 0 waits indefinitely
+    FAILOVER_TIMEOUT = float(os.getenv("FAILOVER_TIMEOUT", "60"))
+    # Hedge delay used until enough latencies are recorded to use the primary's p95
+    HEDGE_DELAY = float(os.getenv("HEDGE_DELAY", "5"))
+    
+    # Concurrent identical questions share one in-flight provider call instead of each making one
+    SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    
+    # Seconds the Streamlit UI reuses provider availability and Ollama model lists before probing again
+    PROVIDER_DISCOVERY_TTL = float(os.getenv("PROVIDER_DISCOVERY_TTL", "30"))
+    
+    # Async Settings (RAGEngine.aquery / astream_query)
+    # Provider calls in flight at once per event loop; further calls wait their turn
+    ASYNC_MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", "256"))
+    # Size of the shared HTTP connection pool used by async Ollama calls
+    ASYNC_MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", "256"))
+    
+    # Database Settings
+    # "memory" serves the records below, "sqlite" serves DATABASE_URL via SQLAlchemy
+    DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "memory")
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///students.db")
+    DATABASE_STREAM_BATCH_SIZE = int(os.getenv("DATABASE_STREAM_BATCH_SIZE", "1000"))
+    SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+    # Rows validated and inserted per transaction by ingest.py
+    INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "5000"))
+    
+    # Retrieval Settings
+    # "keyword" or "vector" send only the top-k matching chunks, "full" sends the whole database
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "keyword")
+    RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
+    RETRIEVAL_MAX_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_MAX_CONTEXT_TOKENS", "2000"))
+    
+    # Answer pure lookup questions directly from the database instead of calling the LLM
+    QUERY_ROUTER_ENABLED = os.getenv("QUERY_ROUTER_ENABLED", "true").lower() == "true"
+    
+    # Token Budget Settings
+    # Most prompt tokens (instructions + database context + question) sent to each model.
+    # Ollama truncates prompts beyond the model's num_ctx (2048-4096 by default), and on
+    # hosted models every prompt token is billed. Override with "model=tokens,model=tokens".
+    MODEL_TOKEN_BUDGETS = {
+        "gemini-3-flash-preview": 32000,
+        "mistral": 3000,
+        "llama2": 3000,
+        "llama3": 6000,
+        "phi": 1500,
+        **{name.strip(): int(tokens) for name, tokens in
+           (pair.split("=", 1) for pair in os.getenv("MODEL_TOKEN_BUDGETS", "").split(",") if "=" in pair)}
+    }
+    DEFAULT_TOKEN_BUDGET = int(os.getenv("DEFAULT_TOKEN_BUDGET", "3000"))
+    
+    # Embedding & Vector Index Settings (used when RETRIEVAL_MODE is "vector")
+    # "sentence-transformers" or "hashing" (offline, NumPy-only)
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    HASHING_EMBEDDING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "512"))
+    # Directory for the memory-mapped embedding store; empty disables persistence
+    EMBEDDING_STORE_DIR = os.getenv("EMBEDDING_STORE_DIR", ".embedding_store")
+    # "numpy" (exact brute force), "faiss-ivf" or "faiss-hnsw"
+    VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "numpy")
+    FAISS_IVF_NLIST = int(os.getenv("FAISS_IVF_NLIST", "1024"))
+    FAISS_IVF_NPROBE = int(os.getenv("FAISS_IVF_NPROBE", "16"))
+    FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+    FAISS_HNSW_EF_SEARCH = int(os.getenv("FAISS_HNSW_EF_SEARCH", "64"))
+    
+    # Response Cache Settings
+    # "memory" (per process), "sqlite" (shared across processes via RESPONSE_CACHE_PATH) or "none"
+    RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.db")
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+    RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    
+    # Semantic Cache Settings: reuse answers to similarly worded questions
+    SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+    # Minimum cosine similarity between questions for a cached answer to be reused
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+    # A sentence model; "hashing" compares spelling, not meaning, and is only fit for offline tests
+    SEMANTIC_CACHE_EMBEDDING_BACKEND = os.getenv("SEMANTIC_CACHE_EMBEDDING_BACKEND", "sentence-transformers")
+    
+    # Logging level of the CLI and Streamlit app; DEBUG adds each prompt's token breakdown
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
     
     # Student Database
     STUDENT_DATABASE = {
@@ -65,3 +205,8 @@ class Config:
             "description": "Core concepts of machine learning and deep learning"
         }
     }
+
+
+def configure_logging():
+    """Log to stderr at LOG_LEVEL; a no-op once the root logger has a handler, e.g. on Streamlit reruns"""
+    logging.basicConfig(level=Config.LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
@@ -1,12 +1,216 @@
+import heapq
 import json
+import re
+import threading
+from collections import defaultdict
+from json.encoder import encode_basestring_ascii
+from typing import Optional
 from config import Config
 
+NAME_WORD_PATTERN = re.compile(r"[a-z0-9+\-]+")
+
+# Changes remembered by Database.changed_since; consumers further behind rebuild in full
+MAX_CHANGE_LOG = 10000
+
+
+def normalize_name(text: str) -> str:
+    """Normalize a name for lookups: lowercase words separated by single spaces"""
+    return " ".join(NAME_WORD_PATTERN.findall(text.lower()))
+
+
+def format_grades(grades: dict) -> str:
+    """Same text as json.dumps(grades, indent=2), several times faster for flat dicts.
+
+    json.dumps falls back to its pure-Python encoder whenever indent is set, which
+    dominated rendering every record on startup.
+    """
+    lines = []
+    for course, grade in grades.items():
+        if not isinstance(course, str) or isinstance(grade, (dict, list)):
+            return json.dumps(grades, indent=2)
+        value = encode_basestring_ascii(grade) if isinstance(grade, str) else json.dumps(grade)
+        lines.append(f"  {encode_basestring_ascii(course)}: {value}")
+    return "{\n" + ",\n".join(lines) + "\n}" if lines else "{}"
+
+
 class Database:
     """Handle student and course database operations"""
     
+    # Cache rendered Markdown per record, keyed by the record's version
+    cache_fragments = True
+    
     def __init__(self):
-        self.students = Config.STUDENT_DATABASE
-        self.courses = Config.COURSE_DATABASE
+        # Each Database owns its records so its indexes cannot be bypassed
+        self.students = {student_id: dict(info) for student_id, info in Config.STUDENT_DATABASE.items()}
+        self.courses = {course_id: dict(info) for course_id, info in Config.COURSE_DATABASE.items()}
+        # Bumped on every change; record_versions tracks individual records
+        self.version = 0
+        self.record_versions = defaultdict(int)
+        self._lock = threading.RLock()
+        self._fragment_cache = {}
+        # IDs of changed records in version order; version == _change_log_start + len(_change_log)
+        self._change_log = []
+        self._change_log_start = 0
+        self._build_indexes()
+    
+    def _build_indexes(self):
+        """Build secondary indexes over the loaded records"""
+        self.students_by_course = defaultdict(set)
+        self.students_by_major = defaultdict(set)
+        self.students_by_name = defaultdict(set)
+        self.students_by_first_name = defaultdict(set)
+        self.grade_index = defaultdict(set)
+        self.courses_by_instructor = defaultdict(set)
+        self.courses_by_name = defaultdict(set)
+        for student_id, info in self.students.items():
+            self._index_student(student_id, info)
+        for course_id, info in self.courses.items():
+            self._index_course(course_id, info)
+    
+    def _index_student(self, student_id: str, info: dict):
+        name = normalize_name(info["name"])
+        self.students_by_name[name].add(student_id)
+        if name:
+            self.students_by_first_name[name.split()[0]].add(student_id)
+        self.students_by_major[normalize_name(info["major"])].add(student_id)
+        for course_id in info["courses"]:
+            self.students_by_course[course_id].add(student_id)
+        for course_id, grade in info["grades"].items():
+            self.grade_index[grade].add((student_id, course_id))
+    
+    def _unindex_student(self, student_id: str, info: dict):
+        name = normalize_name(info["name"])
+        self._discard(self.students_by_name, name, student_id)
+        if name:
+            self._discard(self.students_by_first_name, name.split()[0], student_id)
+        self._discard(self.students_by_major, normalize_name(info["major"]), student_id)
+        for course_id in info["courses"]:
+            self._discard(self.students_by_course, course_id, student_id)
+        for course_id, grade in info["grades"].items():
+            self._discard(self.grade_index, grade, (student_id, course_id))
+    
+    def _index_course(self, course_id: str, info: dict):
+        self.courses_by_instructor[normalize_name(info["instructor"])].add(course_id)
+        self.courses_by_name[normalize_name(info["name"])].add(course_id)
+    
+    def _unindex_course(self, course_id: str, info: dict):
+        self._discard(self.courses_by_instructor, normalize_name(info["instructor"]), course_id)
+        self._discard(self.courses_by_name, normalize_name(info["name"]), course_id)
+    
+    @staticmethod
+    def _discard(index: dict, key, value):
+        """Remove value from an index bucket, dropping the bucket when it empties"""
+        bucket = index.get(key)
+        if bucket is not None:
+            bucket.discard(value)
+            if not bucket:
+                del index[key]
+    
+    def _touch(self, record_id: str):
+        self.version += 1
+        self.record_versions[record_id] += 1
+        self._change_log.append(record_id)
+        if len(self._change_log) > MAX_CHANGE_LOG:
+            dropped = len(self._change_log) - MAX_CHANGE_LOG // 2
+            del self._change_log[:dropped]
+            self._change_log_start += dropped
+    
+    def changed_since(self, version: int) -> Optional[set]:
+        """IDs of records changed after a database version, or None when that cannot be told.
+        
+        None means the version is too long ago to tell, or the backend does not track changes
+        (SQLDatabase always returns it); callers such as Retriever.refresh then rebuild in full.
+        """
+        with self._lock:
+            offset = version - self._change_log_start
+            if offset < 0 or offset > len(self._change_log):
+                return None
+            return set(self._change_log[offset:])
+    
+    def add_student(self, student_id: str, info: dict):
+        """Insert a new student and index it"""
+        with self._lock:
+            if student_id in self.students:
+                raise ValueError(f"Student already exists: {student_id}")
+            info = dict(info)
+            self.students[student_id] = info
+            self._index_student(student_id, info)
+            self._touch(student_id)
+    
+    def update_student(self, student_id: str, updates: dict):
+        """Update fields of an existing student and re-index it"""
+        with self._lock:
+            old = self.students.get(student_id)
+            if old is None:
+                raise KeyError(f"Unknown student: {student_id}")
+            new = {**old, **updates}
+            self._unindex_student(student_id, old)
+            self.students[student_id] = new
+            self._index_student(student_id, new)
+            self._touch(student_id)
+    
+    def add_course(self, course_id: str, info: dict):
+        """Insert a new course and index it"""
+        with self._lock:
+            if course_id in self.courses:
+                raise ValueError(f"Course already exists: {course_id}")
+            info = dict(info)
+            self.courses[course_id] = info
+            self._index_course(course_id, info)
+            self._touch(course_id)
+    
+    def update_course(self, course_id: str, updates: dict):
+        """Update fields of an existing course and re-index it"""
+        with self._lock:
+            old = self.courses.get(course_id)
+            if old is None:
+                raise KeyError(f"Unknown course: {course_id}")
+            new = {**old, **updates}
+            self._unindex_course(course_id, old)
+            self.courses[course_id] = new
+            self._index_course(course_id, new)
+            self._touch(course_id)
+    
+    def find_students_by_course(self, course_id: str) -> list:
+        """Get IDs of students enrolled in a course"""
+        with self._lock:
+            return sorted(self.students_by_course.get(course_id, ()))
+    
+    def find_students_by_major(self, major: str) -> list:
+        """Get IDs of students in a major"""
+        with self._lock:
+            return sorted(self.students_by_major.get(normalize_name(major), ()))
+    
+    def find_students_by_name(self, name: str) -> list:
+        """Get IDs of students matching a full name, or a first name if no full name matches"""
+        name = normalize_name(name)
+        with self._lock:
+            return sorted(self.students_by_name.get(name) or self.students_by_first_name.get(name, ()))
+    
+    def find_grades(self, grade: str) -> list:
+        """Get (student_id, course_id) pairs with a given grade"""
+        with self._lock:
+            return sorted(self.grade_index.get(grade.upper(), ()))
+    
+    def find_courses_by_instructor(self, instructor: str) -> list:
+        """Get IDs of courses taught by an instructor"""
+        with self._lock:
+            return sorted(self.courses_by_instructor.get(normalize_name(instructor), ()))
+    
+    def find_courses_by_name(self, name: str) -> list:
+        """Get IDs of courses with a given name"""
+        with self._lock:
+            return sorted(self.courses_by_name.get(normalize_name(name), ()))
+    
+    def find_top_students_by_gpa(self, limit: int = 1, highest: bool = True) -> list:
+        """Get IDs of the students with the highest (or lowest) GPA"""
+        pick = heapq.nlargest if highest else heapq.nsmallest
+        with self._lock:
+            return pick(limit, self.students, key=lambda student_id: self.students[student_id]["gpa"])
+    
+    def get_record_version(self, record_id: str) -> int:
+        """Get how many times a student or course record has changed"""
+        return self.record_versions.get(record_id, 0)
     
     def get_student_info(self, student_id: str) -> dict:
         """Get specific student information"""
@@ -24,24 +228,106 @@ class Database:
         """Get all courses"""
         return self.courses
     
+    def format_student_context(self, student_id: str, info: dict) -> str:
+        """Format a single student record as a Markdown fragment"""
+        return (
+            f"\n### {info['name']} ({student_id})\n"
+            f"- Email: {info['email']}\n"
+            f"- Major: {info['major']}\n"
+            f"- GPA: {info['gpa']}\n"
+            f"- Enrolled Courses: {', '.join(info['courses'])}\n"
+            f"- Grades: {format_grades(info['grades'])}\n"
+        )
+    
+    def format_course_context(self, course_id: str, info: dict) -> str:
+        """Format a single course record as a Markdown fragment"""
+        return (
+            f"\n### {course_id}: {info['name']}\n"
+            f"- Instructor: {info['instructor']}\n"
+            f"- Credits: {info['credits']}\n"
+            f"- Description: {info['description']}\n"
+        )
+    
+    def _fragment(self, record_type: str, record_id: str, info: dict, version: int) -> str:
+        """Rendered Markdown for a record, re-rendered only when the record changes.
+        
+        version must have been read together with info, under the lock; reading it here
+        could pair an older info with a newer version and cache stale text under it.
+        """
+        render = self.format_student_context if record_type == "student" else self.format_course_context
+        if not self.cache_fragments:
+            return render(record_id, info)
+        key = (record_type, record_id)
+        cached = self._fragment_cache.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        text = render(record_id, info)
+        self._fragment_cache[key] = (version, text)
+        return text
+    
+    def _record_items(self) -> tuple:
+        """(record_id, info, version) of every student and course, copied together under the lock"""
+        with self._lock:
+            versions = self.record_versions
+            return ([(record_id, info, versions.get(record_id, 0)) for record_id, info in self.students.items()],
+                    [(record_id, info, versions.get(record_id, 0)) for record_id, info in self.courses.items()])
+    
+    def _record(self, record_id: str) -> Optional[tuple]:
+        """(record_type, info, version) of one student or course, read together under the lock"""
+        with self._lock:
+            for record_type, records in (("student", self.students), ("course", self.courses)):
+                info = records.get(record_id)
+                if info is not None:
+                    return record_type, info, self.record_versions.get(record_id, 0)
+        return None
+    
+    def iter_records(self):
+        """Yield (record_id, record_type, text) for every student and course"""
+        students, courses = self._record_items()
+        for student_id, info, version in students:
+            yield student_id, "student", self._fragment("student", student_id, info, version)
+        for course_id, info, version in courses:
+            yield course_id, "course", self._fragment("course", course_id, info, version)
+    
+    def render_record(self, record_id: str) -> Optional[tuple]:
+        """(record_type, text) of one student or course as iter_records renders it, or None"""
+        record = self._record(record_id)
+        if record is None:
+            return None
+        record_type, info, version = record
+        return record_type, self._fragment(record_type, record_id, info, version)
+    
     def format_as_context(self) -> str:
         """Format database as context for RAG"""
-        context = "# Student Records and Academics Database\n\n"
-        
-        context += "## Student Information\n"
-        for student_id, info in self.students.items():
-            context += f"\n### {info['name']} ({student_id})\n"
-            context += f"- Email: {info['email']}\n"
-            context += f"- Major: {info['major']}\n"
-            context += f"- GPA: {info['gpa']}\n"
-            context += f"- Enrolled Courses: {', '.join(info['courses'])}\n"
-            context += f"- Grades: {json.dumps(info['grades'], indent=2)}\n"
-        
-        context += "\n## Course Information\n"
-        for course_id, info in self.courses.items():
-            context += f"\n### {course_id}: {info['name']}\n"
-            context += f"- Instructor: {info['instructor']}\n"
-            context += f"- Credits: {info['credits']}\n"
-            context += f"- Description: {info['description']}\n"
+        parts = ["# Student Records and Academics Database\n\n", "## Student Information\n"]
+        students, courses = self._record_items()
+        for student_id, info, version in students:
+            parts.append(self._fragment("student", student_id, info, version))
         
-        return context
+        parts.append("\n## Course Information\n")
+        for course_id, info, version in courses:
+            parts.append(self._fragment("course", course_id, info, version))
+        return "".join(parts)
+
+_shared_database = None
+_shared_database_lock = threading.Lock()
+
+
+def create_database():
+    """Create the database backend configured by DATABASE_BACKEND"""
+    if Config.DATABASE_BACKEND == "memory":
+        return Database()
+    if Config.DATABASE_BACKEND == "sqlite":
+        from sql_database import SQLDatabase
+        return SQLDatabase()
+    raise ValueError(f"Unknown database backend: {Config.DATABASE_BACKEND}")
+
+
+def get_database():
+    """Get the process-wide database, so its caches survive across RAGEngine instances"""
+    global _shared_database
+    if _shared_database is None:
+        with _shared_database_lock:
+            if _shared_database is None:
+                _shared_database = create_database()
+    return _shared_database
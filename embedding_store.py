@@ -0,0 +1,206 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+from typing import Optional
+from config import Config
+
+EMBEDDINGS_FILE = "embeddings.npy"
+IDS_FILE = "ids.npy"
+HASHES_FILE = "hashes.npy"
+META_FILE = "meta.json"
+EMBEDDER_STATE_FILE = "embedder_state.npy"
+# Names the generation directory holding the current files
+CURRENT_FILE = "CURRENT"
+GENERATION_PREFIX = "gen-"
+# Generations are written under this prefix and renamed once complete
+PARTIAL_PREFIX = "tmp-"
+# Replaced generations are removed once this old; a concurrent save may be about to point CURRENT at one
+STALE_GENERATION_SECONDS = 60
+# Partial generations older than this are left over from a crashed save and removed
+STALE_PARTIAL_SECONDS = 3600
+
+
+def content_hash(text: str) -> bytes:
+    """Hex digest identifying a record's rendered content.
+
+    Hex rather than raw bytes because NumPy "S" arrays strip trailing NUL bytes.
+    """
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest().encode("ascii")
+
+
+def corpus_hash(ids: list, texts: list) -> str:
+    """Digest of every record ID and text at once; hashing one buffer is far cheaper than one per record"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update("\0".join(ids).encode("utf-8"))
+    digest.update(b"\1")
+    digest.update("\0".join(texts).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def embedder_name(embedder) -> str:
+    """Identify an embedder so vectors from different models are never mixed"""
+    return getattr(embedder, "model_name", type(embedder).__name__)
+
+
+class EmbeddingStore:
+    """On-disk, memory-mapped record embeddings with per-record content hashes.
+
+    Each save writes a complete generation directory (gen-<token>) holding:
+    - embeddings.npy: (n, dimension) float32 matrix, loaded with mmap_mode="r"
+    - ids.npy: record IDs aligned with the matrix rows
+    - hashes.npy: content hash of the text each row was embedded from
+    - meta.json: embedder name and dimension, and a digest of all IDs and texts
+    - embedder_state.npy: learned embedder state (e.g. hashing IDF weights), if any
+
+    The CURRENT file names the generation to load and is replaced in one rename once the
+    generation is complete, so a crash or a second process saving at the same time can
+    never pair one generation's matrix with another's IDs.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or Config.EMBEDDING_STORE_DIR
+        self.generation = None
+        self.embeddings = None
+        self.ids = None
+        self.hashes = None
+        self.meta = {}
+        self.last_sync = {}
+
+    def _file(self, name: str, generation: Optional[str] = None) -> str:
+        return os.path.join(self.path, generation or self.generation or "", name)
+
+    def _current_generation(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.path, CURRENT_FILE)) as f:
+                generation = f.read().strip()
+        except OSError:
+            return None
+        return generation if generation.startswith(GENERATION_PREFIX) else None
+
+    def load(self, generation: Optional[str] = None) -> bool:
+        """Memory-map the current (or given) generation of a saved store; returns False if none exists"""
+        generation = generation or self._current_generation()
+        try:
+            if generation is None:
+                raise OSError("no saved generation")
+            with open(self._file(META_FILE, generation)) as f:
+                meta = json.load(f)
+            embeddings = np.load(self._file(EMBEDDINGS_FILE, generation), mmap_mode="r")
+            ids = np.load(self._file(IDS_FILE, generation), mmap_mode="r")
+            hashes = np.load(self._file(HASHES_FILE, generation), mmap_mode="r")
+        except (OSError, ValueError):
+            self.generation = self.embeddings = self.ids = self.hashes = None
+            self.meta = {}
+            return False
+        self.generation, self.meta = generation, meta
+        self.embeddings, self.ids, self.hashes = embeddings, ids, hashes
+        return len(self.ids) == len(self.hashes) == len(self.embeddings)
+
+    def _save(self, embeddings: np.ndarray, ids: np.ndarray, hashes: np.ndarray, meta: dict,
+              embedder_state: Optional[np.ndarray] = None) -> str:
+        """Write a new generation directory, then point CURRENT at it with one atomic rename"""
+        previous = self._current_generation()
+        token = uuid.uuid4().hex
+        generation, partial = GENERATION_PREFIX + token, PARTIAL_PREFIX + token
+        os.makedirs(self._file("", partial))
+        arrays = [(EMBEDDINGS_FILE, embeddings), (IDS_FILE, ids), (HASHES_FILE, hashes)]
+        if embedder_state is not None:
+            arrays.append((EMBEDDER_STATE_FILE, embedder_state))
+        for name, array in arrays:
+            np.save(self._file(name, partial), array)
+        with open(self._file(META_FILE, partial), "w") as f:
+            json.dump(meta, f)
+        os.rename(self._file("", partial), self._file("", generation))
+
+        # A unique temporary name, so concurrent saves never write the same pointer file
+        tmp = os.path.join(self.path, f"{CURRENT_FILE}.{generation}.tmp")
+        with open(tmp, "w") as f:
+            f.write(generation)
+        os.replace(tmp, os.path.join(self.path, CURRENT_FILE))
+        self._remove_generations(keep={generation, previous})
+        return generation
+
+    def _remove_generations(self, keep: set):
+        """Delete old generations; the one just replaced is kept for processes still loading it.
+
+        Recent generations and partial ones may belong to another process's save in
+        progress, so only those older than the STALE_* limits go.
+        """
+        now = time.time()
+        for name in os.listdir(self.path):
+            path = os.path.join(self.path, name)
+            try:
+                age = now - os.path.getmtime(path)
+                remove = ((name.startswith(GENERATION_PREFIX) and name not in keep
+                           and age > STALE_GENERATION_SECONDS)
+                          or (name.startswith(PARTIAL_PREFIX) and age > STALE_PARTIAL_SECONDS))
+            except OSError:
+                continue
+            if remove:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def sync(self, records, embedder) -> tuple:
+        """Bring the store up to date with records, re-embedding only changed ones.
+
+        records is an iterable of (record_id, record_type, text), e.g. Database.iter_records().
+        Returns (ids, embeddings) with embeddings memory-mapped from disk.
+        """
+        ids, texts = [], []
+        for record_id, _record_type, text in records:
+            ids.append(record_id)
+            texts.append(text)
+        digest = corpus_hash(ids, texts)
+        meta = {"embedder": embedder_name(embedder), "dimension": embedder.dimension}
+
+        loaded = self.load() and all(self.meta.get(key) == value for key, value in meta.items())
+        if hasattr(embedder, "fit"):
+            # Freeze the fitted state with the store so reused and new rows stay comparable
+            state_file = self._file(EMBEDDER_STATE_FILE)
+            if loaded and os.path.exists(state_file):
+                embedder.set_state(np.load(state_file))
+            else:
+                embedder.fit(texts)
+                loaded = False
+        if loaded and self.meta.get("corpus") == digest:
+            # Nothing changed: skip hashing every record
+            self.last_sync = {"records": len(ids), "embedded": 0, "reused": len(ids)}
+            return ids, self.embeddings
+
+        hashes = [content_hash(text) for text in texts]
+        new_ids = np.array(ids, dtype=str)
+        new_hashes = np.array(hashes, dtype="S32")
+        meta["corpus"] = digest
+        embeddings = np.empty((len(new_ids), embedder.dimension), dtype=np.float32)
+        to_embed = list(range(len(new_ids)))
+        if loaded:
+            previous = {(record_id, record_hash): position
+                        for position, (record_id, record_hash) in enumerate(zip(self.ids.tolist(), self.hashes.tolist()))}
+            reuse_new, reuse_old, to_embed = [], [], []
+            for position, key in enumerate(zip(ids, hashes)):
+                old_position = previous.get(key)
+                if old_position is None:
+                    to_embed.append(position)
+                else:
+                    reuse_new.append(position)
+                    reuse_old.append(old_position)
+            if reuse_new:
+                embeddings[reuse_new] = self.embeddings[reuse_old]
+
+        batch_size = Config.EMBEDDING_BATCH_SIZE
+        for start in range(0, len(to_embed), batch_size):
+            batch = to_embed[start:start + batch_size]
+            embeddings[batch] = embedder.embed([texts[position] for position in batch])
+
+        generation = self._save(embeddings, new_ids, new_hashes, meta,
+                                embedder.get_state() if hasattr(embedder, "get_state") else None)
+        # Load the generation just written even if another process has saved a newer one since
+        if not self.load(generation):
+            self.generation, self.meta = generation, meta
+            self.embeddings, self.ids, self.hashes = embeddings, new_ids, new_hashes
+        self.last_sync = {"records": len(new_ids), "embedded": len(to_embed),
+                          "reused": len(new_ids) - len(to_embed)}
+        return ids, self.embeddings
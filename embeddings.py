@@ -0,0 +1,122 @@
+import numpy as np
+from typing import Optional
+from config import Config
+
+
+class SentenceTransformerEmbedder:
+    """Embed text with a sentence-transformers model"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        # Imported lazily so the rest of the app works without the model installed
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self.model = SentenceTransformer(self.model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Embed texts into an (n, dimension) float32 matrix of unit vectors"""
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=Config.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+# FNV-1a 32-bit constants used to hash byte n-grams
+FNV_OFFSET = np.uint32(2166136261)
+FNV_PRIME = np.uint32(16777619)
+# Texts processed per vectorized block; bounds the size of the bincount buffer
+HASHING_BLOCK_SIZE = 4096
+
+
+class HashingEmbedder:
+    """Deterministic offline embedder: hashed character n-grams with TF-IDF weighting.
+
+    Needs only NumPy, so indexing and retrieval can be built, benchmarked and tested
+    without downloading a model. Call fit() on the corpus to learn IDF weights; until
+    then every n-gram bucket has weight 1.
+    """
+
+    def __init__(self, dimension: Optional[int] = None, ngram_range: tuple = (3, 4)):
+        self.dimension = dimension or Config.HASHING_EMBEDDING_DIM
+        self.ngram_range = ngram_range
+        self.model_name = f"hashing-char{ngram_range[0]}-{ngram_range[1]}-d{self.dimension}"
+        self.idf = np.ones(self.dimension, dtype=np.float32)
+        self.fitted = False
+
+    def _counts(self, texts: list) -> np.ndarray:
+        """Count hashed n-grams per text into an (n, dimension) float32 matrix"""
+        # NUL separates texts; n-grams that span a separator are discarded below
+        data = np.frombuffer(("\0".join(texts).lower() + "\0").encode("utf-8"), dtype=np.uint8)
+        separator_positions = np.flatnonzero(data == 0)
+        row_of_byte = np.zeros(len(data), dtype=np.int64)
+        row_of_byte[separator_positions[:-1] + 1] = self.dimension
+        row_offset = np.cumsum(row_of_byte)
+        values = data.astype(np.uint32)
+        size = len(texts) * self.dimension
+        # Windows containing a separator are counted into one extra trailing bin that is dropped
+        counts = np.zeros(size + 1, dtype=np.int64)
+        power_of_two = self.dimension & (self.dimension - 1) == 0
+
+        # Extend each n-gram hash by one byte per step, emitting counts for every size in range
+        hashes = np.full(len(data), FNV_OFFSET, dtype=np.uint32)
+        for n in range(1, self.ngram_range[1] + 1):
+            length = len(data) - n + 1
+            if length <= 0:
+                break
+            hashes = (hashes[:length] ^ values[n - 1:]) * FNV_PRIME
+            if n < self.ngram_range[0]:
+                continue
+            buckets = hashes & (self.dimension - 1) if power_of_two else hashes % self.dimension
+            flat = row_offset[:length] + buckets
+            crossing = (separator_positions[:, None] - np.arange(n)).ravel()
+            flat[crossing[(crossing >= 0) & (crossing < length)]] = size
+            counts += np.bincount(flat, minlength=size + 1)
+
+        return counts[:size].reshape(len(texts), self.dimension).astype(np.float32)
+
+    def fit(self, texts: list):
+        """Learn smoothed IDF weights for the n-gram buckets from a corpus"""
+        document_frequency = np.zeros(self.dimension, dtype=np.float64)
+        for start in range(0, len(texts), HASHING_BLOCK_SIZE):
+            document_frequency += (self._counts(texts[start:start + HASHING_BLOCK_SIZE]) > 0).sum(axis=0)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        self.fitted = True
+        return self
+
+    def get_state(self) -> np.ndarray:
+        """Learned state to persist alongside stored embeddings"""
+        return self.idf
+
+    def set_state(self, state: np.ndarray):
+        """Restore IDF weights saved by get_state()"""
+        self.idf = np.asarray(state, dtype=np.float32)
+        self.fitted = True
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Embed texts into an (n, dimension) float32 matrix of unit vectors"""
+        texts = list(texts)
+        vectors = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), HASHING_BLOCK_SIZE):
+            block = self._counts(texts[start:start + HASHING_BLOCK_SIZE])
+            np.log1p(block, out=block)
+            block *= self.idf
+            norms = np.sqrt(np.einsum("ij,ij->i", block, block))[:, None]
+            np.divide(block, np.maximum(norms, 1e-12), out=vectors[start:start + len(block)])
+        return vectors
+
+
+def get_embedder(backend: Optional[str] = None):
+    """Create the embedder configured by EMBEDDING_BACKEND"""
+    backend = backend or Config.EMBEDDING_BACKEND
+    if backend == "sentence-transformers":
+        return SentenceTransformerEmbedder()
+    if backend == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"Unknown embedding backend: {backend}")
@@ -0,0 +1,399 @@
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Optional
+from config import Config
+from rate_limiter import get_rate_limiter
+
+# Recent successful latencies kept per provider for the p95 hedge delay
+LATENCY_SAMPLES = 200
+# Samples needed before the measured p95 replaces HEDGE_DELAY
+MIN_HEDGE_SAMPLES = 20
+# Threads running calls to each provider; every provider has its own, so one that hangs
+# cannot take the threads another needs
+MAX_WORKERS = 64
+
+
+class ProviderStats:
+    """Outcomes and recent latencies of one provider behind a FailoverProvider"""
+
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.wins = 0
+        # Seconds calls spent held back by this provider's rate limiter
+        self.rate_limit_wait = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "wins": self.wins,
+            "rate_limit_wait": self.rate_limit_wait,
+            "p95_latency": self.p95()
+        }
+
+
+class ProviderCall:
+    """A provider call on a worker thread, timed from when it starts running rather than when it was queued.
+
+    before() runs on the worker first, e.g. waiting for the rate limiter; time spent in it
+    counts as queued.
+    """
+
+    def __init__(self, executor: ThreadPoolExecutor, fn, before=None):
+        self.started = threading.Event()
+        self.started_at = None
+        self.future = executor.submit(self._run, fn, before)
+
+    def _run(self, fn, before):
+        if before is not None:
+            before()
+        self.started_at = time.monotonic()
+        self.started.set()
+        return fn()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait until the call finishes, has run for timeout seconds, or sat queued that long; True if finished"""
+        if not self.started.wait(timeout):
+            return self.future.done()
+        wait([self.future], timeout=max(0.0, self.started_at + timeout - time.monotonic()))
+        return self.future.done()
+
+    def result(self, timeout: Optional[float] = None) -> str:
+        """The call's response, raising TimeoutError if it did not finish within timeout"""
+        if timeout and not self.wait(timeout):
+            # Only succeeds while still queued; a running call is left to finish and ignored
+            self.future.cancel()
+            raise FutureTimeoutError()
+        return self.future.result()
+
+
+class FailoverProvider:
+    """Provider that answers with the first of several providers to succeed.
+
+    In "failover" mode the providers are tried in order, moving on when one raises or
+    takes longer than `timeout` seconds. In "hedge" mode the primary is queried first and,
+    if it has not answered within its p95 latency, the secondary is queried as well and
+    whichever answers first wins; each call sent is given `timeout` seconds, and the query
+    gives up once the last one has had them. Wrapped providers must be created with
+    raise_errors=True.
+    
+    Each call waits for its own provider's rate limiter (get_rate_limiter(name) unless
+    rate_limiters maps the name to another), so calls failing over to a rate-limited
+    secondary are throttled by its limit rather than the primary's. In failover mode a
+    primary held back longer than `timeout` fails over like a slow one.
+    """
+
+    def __init__(self, providers: list, mode: Optional[str] = None, timeout: Optional[float] = None,
+                 hedge_delay: Optional[float] = None, rate_limiters: Optional[dict] = None):
+        if len(providers) < 2:
+            raise ValueError("FailoverProvider needs at least two providers")
+        self.providers = providers
+        self.mode = mode or Config.FAILOVER_MODE
+        if self.mode not in ("failover", "hedge"):
+            raise ValueError(f"Unknown failover mode: {self.mode}")
+        self.timeout = Config.FAILOVER_TIMEOUT if timeout is None else timeout
+        self.hedge_delay = Config.HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.provider_stats = {name: ProviderStats() for name, _ in providers}
+        rate_limiters = rate_limiters or {}
+        self.rate_limiters = {name: rate_limiters.get(name) or get_rate_limiter(name) for name, _ in providers}
+        self.decisions = Counter()
+        self._lock = threading.Lock()
+        self._executors = {name: ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix=f"failover-{name}")
+                           for name, _ in providers}
+
+    @property
+    def model_name(self) -> str:
+        return "|".join(provider.model_name for _, provider in self.providers)
+
+    def _delay(self) -> float:
+        """How long to wait for the primary before hedging: its p95 latency once known"""
+        name = self.providers[0][0]
+        with self._lock:
+            p95 = self.provider_stats[name].p95()
+        return self.hedge_delay if p95 is None else p95
+
+    def _record(self, name: str, outcome: str, latency: float = None):
+        with self._lock:
+            stats = self.provider_stats[name]
+            if outcome == "start":
+                stats.requests += 1
+            elif outcome == "success":
+                stats.successes += 1
+                stats.latencies.append(latency)
+            elif outcome == "error":
+                stats.errors += 1
+            elif outcome == "timeout":
+                stats.timeouts += 1
+            elif outcome == "win":
+                stats.wins += 1
+
+    def _limit(self, name: str):
+        """Wait for a provider's rate limiter"""
+        wait = self.rate_limiters[name].acquire()
+        self._record_wait(name, wait)
+
+    async def _alimit(self, name: str):
+        wait = await self.rate_limiters[name].aacquire()
+        self._record_wait(name, wait)
+
+    def _record_wait(self, name: str, wait: float):
+        if wait:
+            with self._lock:
+                self.provider_stats[name].rate_limit_wait += wait
+
+    def _decide(self, decision: str):
+        with self._lock:
+            self.decisions[decision] += 1
+
+    def _deadline(self, deadline: Optional[float] = None) -> Optional[float]:
+        """A hedged query's deadline once another call is sent: timeout seconds from now, if later"""
+        if not self.timeout:
+            return None
+        return max(deadline or 0.0, time.monotonic() + self.timeout)
+
+    @staticmethod
+    def _remaining(deadline: Optional[float]) -> Optional[float]:
+        return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+    def _timed_out(self, names: list, errors: list):
+        for name in names:
+            self._record(name, "timeout")
+            errors.append(f"{name}: timed out after {self.timeout}s")
+
+    @staticmethod
+    def _hedge_decision(primary_won: bool, hedged: bool, failed_over: bool) -> str:
+        if primary_won:
+            return "hedge_won_primary" if hedged else "primary"
+        return "failover" if failed_over else "hedge_won_secondary"
+
+    def _call(self, name: str, provider, query: str, context: str) -> str:
+        self._record(name, "start")
+        start = time.perf_counter()
+        try:
+            response = provider.query(query, context)
+        except Exception:
+            self._record(name, "error")
+            raise
+        self._record(name, "success", time.perf_counter() - start)
+        return response
+
+    def _submit(self, name: str, provider, query: str, context: str) -> ProviderCall:
+        return ProviderCall(self._executors[name], lambda: self._call(name, provider, query, context),
+                            lambda: self._limit(name))
+
+    async def _acall(self, name: str, provider, query: str, context: str) -> str:
+        await self._alimit(name)
+        self._record(name, "start")
+        start = time.perf_counter()
+        try:
+            response = await provider.aquery(query, context)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._record(name, "error")
+            raise
+        self._record(name, "success", time.perf_counter() - start)
+        return response
+
+    def query(self, query: str, context: str = "") -> str:
+        """Query the providers, failing over or hedging according to mode"""
+        if self.mode == "hedge":
+            return self._hedged_query(query, context)
+        errors = []
+        for position, (name, provider) in enumerate(self.providers):
+            try:
+                response = self._submit(name, provider, query, context).result(self.timeout or None)
+            except FutureTimeoutError:
+                # The call keeps running in the background; its result is ignored
+                self._record(name, "timeout")
+                errors.append(f"{name}: timed out after {self.timeout}s")
+                continue
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                continue
+            self._record(name, "win")
+            self._decide("primary" if position == 0 else "failover")
+            return response
+        self._decide("all_failed")
+        return f"Error querying providers: {'; '.join(errors)}"
+
+    def _hedged_query(self, query: str, context: str) -> str:
+        (primary_name, primary), (secondary_name, secondary) = self.providers[:2]
+        deadline = self._deadline()
+        call = self._submit(primary_name, primary, query, context)
+        futures = {call.future: primary_name}
+        # A primary still queued after the delay is as slow as one still running
+        hedged = not call.wait(self._delay())
+        failed_over = False
+        if hedged:
+            deadline = self._deadline(deadline)
+            futures[self._submit(secondary_name, secondary, query, context).future] = secondary_name
+
+        errors = []
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                # Calls still running are left to finish in the background and ignored
+                for future in pending:
+                    future.cancel()
+                self._timed_out([name for future, name in futures.items() if future in pending], errors)
+                break
+            for future in done:
+                name = futures[future]
+                try:
+                    response = future.result()
+                except Exception as e:
+                    errors.append(f"{name}: {e}")
+                    # The primary failed before the hedge fired; ask the secondary now
+                    if not hedged and name == primary_name:
+                        hedged = failed_over = True
+                        deadline = self._deadline(deadline)
+                        retry = self._submit(secondary_name, secondary, query, context).future
+                        futures[retry] = secondary_name
+                        pending.add(retry)
+                    continue
+                self._record(name, "win")
+                self._decide(self._hedge_decision(name == primary_name, hedged and not failed_over, failed_over))
+                return response
+        self._decide("all_failed")
+        return f"Error querying providers: {'; '.join(errors)}"
+
+    async def aquery(self, query: str, context: str = "") -> str:
+        """Async query, failing over or hedging according to mode"""
+        if self.mode == "hedge":
+            return await self._hedged_aquery(query, context)
+        errors = []
+        for position, (name, provider) in enumerate(self.providers):
+            try:
+                response = await asyncio.wait_for(self._acall(name, provider, query, context), self.timeout or None)
+            except asyncio.TimeoutError:
+                self._record(name, "timeout")
+                errors.append(f"{name}: timed out after {self.timeout}s")
+                continue
+            except Exception as e:
+                errors.append(f"{name}: {e}")
+                continue
+            self._record(name, "win")
+            self._decide("primary" if position == 0 else "failover")
+            return response
+        self._decide("all_failed")
+        return f"Error querying providers: {'; '.join(errors)}"
+
+    async def _hedged_aquery(self, query: str, context: str) -> str:
+        (primary_name, primary), (secondary_name, secondary) = self.providers[:2]
+        deadline = self._deadline()
+        tasks = {asyncio.ensure_future(self._acall(primary_name, primary, query, context)): primary_name}
+        done, _ = await asyncio.wait(tasks, timeout=self._delay())
+        hedged = not done
+        failed_over = False
+        if hedged:
+            deadline = self._deadline(deadline)
+            tasks[asyncio.ensure_future(self._acall(secondary_name, secondary, query, context))] = secondary_name
+
+        errors = []
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=self._remaining(deadline),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._timed_out([name for task, name in tasks.items() if task in pending], errors)
+                    break
+                for task in done:
+                    name = tasks[task]
+                    if task.exception() is not None:
+                        errors.append(f"{name}: {task.exception()}")
+                        if not hedged and name == primary_name:
+                            hedged = failed_over = True
+                            deadline = self._deadline(deadline)
+                            retry = asyncio.ensure_future(self._acall(secondary_name, secondary, query, context))
+                            tasks[retry] = secondary_name
+                            pending.add(retry)
+                        continue
+                    self._record(name, "win")
+                    self._decide(self._hedge_decision(name == primary_name, hedged and not failed_over, failed_over))
+                    return task.result()
+        finally:
+            # Unlike threads, the losing request can be cancelled
+            for task in pending:
+                task.cancel()
+        self._decide("all_failed")
+        return f"Error querying providers: {'; '.join(errors)}"
+
+    def stream_query(self, query: str, context: str = ""):
+        """Stream from the first provider that starts answering; no failover once tokens were sent"""
+        errors = []
+        for position, (name, provider) in enumerate(self.providers):
+            self._limit(name)
+            self._record(name, "start")
+            start = time.perf_counter()
+            started = False
+            try:
+                for token in provider.stream_query(query, context):
+                    started = True
+                    yield token
+            except Exception as e:
+                self._record(name, "error")
+                if started:
+                    yield f"Error querying {name}: {e}"
+                    return
+                errors.append(f"{name}: {e}")
+                continue
+            self._record(name, "success", time.perf_counter() - start)
+            self._record(name, "win")
+            self._decide("primary" if position == 0 else "failover")
+            return
+        self._decide("all_failed")
+        yield f"Error querying providers: {'; '.join(errors)}"
+
+    async def astream_query(self, query: str, context: str = ""):
+        """Async stream_query"""
+        errors = []
+        for position, (name, provider) in enumerate(self.providers):
+            await self._alimit(name)
+            self._record(name, "start")
+            start = time.perf_counter()
+            started = False
+            try:
+                async for token in provider.astream_query(query, context):
+                    started = True
+                    yield token
+            except Exception as e:
+                self._record(name, "error")
+                if started:
+                    yield f"Error querying {name}: {e}"
+                    return
+                errors.append(f"{name}: {e}")
+                continue
+            self._record(name, "success", time.perf_counter() - start)
+            self._record(name, "win")
+            self._decide("primary" if position == 0 else "failover")
+            return
+        self._decide("all_failed")
+        yield f"Error querying providers: {'; '.join(errors)}"
+
+    def stats(self) -> dict:
+        """Per-provider outcomes and how each query was decided"""
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "providers": {name: stats.to_dict() for name, stats in self.provider_stats.items()},
+                "decisions": dict(self.decisions)
+            }
@@ -0,0 +1,398 @@
+"""
+Stand-in LLM backends for offline, deterministic performance testing.
+
+FakeLLMServer speaks enough of the Ollama HTTP API (/api/tags, /api/ps, /api/generate
+and /api/chat, with NDJSON streaming) for OllamaProvider to run against it, and
+FakeGeminiClient can be passed to GeminiProvider(client=...) in place of the real API.
+Both share FakeBehaviour: a latency distribution for the first token, a token rate for
+the rest, error injection, and echo or canned responses.
+
+Run a server:  python fake_llm_server.py --port 11434 --latency lognormal --latency-ms 200
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+from token_budget import count_tokens
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+# Words with their trailing whitespace, so streamed tokens join back into the response
+TOKEN_PATTERN = re.compile(r"\S+\s*")
+
+
+class FakeBehaviour:
+    """How a fake backend answers: timing, failures and response text.
+
+    The delay before the first token is drawn from `latency` ("fixed", "uniform",
+    "normal", "lognormal" or "exponential") around latency_ms, spread by jitter (a
+    fraction of latency_ms, or sigma for lognormal). The remaining tokens follow at
+    tokens_per_second (0 sends them at once). A fraction error_rate of requests fail
+    with error_status. Responses echo the question, or cycle through canned_responses.
+    A fixed seed makes the sequence of delays and failures repeatable.
+    """
+
+    def __init__(self, latency: str = "fixed", latency_ms: float = 0, jitter: float = 0.25,
+                 tokens_per_second: float = 0, error_rate: float = 0, error_status: int = 500,
+                 response: str = "echo", canned_responses: Optional[List[str]] = None,
+                 seed: Optional[int] = None):
+        if latency not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution: {latency}")
+        if response not in ("echo", "canned"):
+            raise ValueError(f"Unknown response mode: {response}")
+        self.latency = latency
+        self.latency_ms = latency_ms
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.response = response
+        self.canned_responses = canned_responses or ["This is a canned response from the fake LLM."]
+        self._canned = itertools.cycle(self.canned_responses)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def first_token_delay(self) -> float:
+        """Seconds before the first token"""
+        mean = self.latency_ms / 1000
+        with self._lock:
+            if self.latency == "uniform":
+                delay = self._random.uniform(mean * (1 - self.jitter), mean * (1 + self.jitter))
+            elif self.latency == "normal":
+                delay = self._random.gauss(mean, mean * self.jitter)
+            elif self.latency == "lognormal":
+                # Median latency_ms; jitter is sigma of the underlying normal, giving a long tail
+                delay = self._random.lognormvariate(math.log(mean), self.jitter) if mean > 0 else 0.0
+            elif self.latency == "exponential":
+                delay = self._random.expovariate(1 / mean) if mean > 0 else 0.0
+            else:
+                delay = mean
+        return max(0.0, delay)
+
+    def token_delay(self) -> float:
+        """Seconds between consecutive tokens"""
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def answer(self, question: str) -> str:
+        if self.response == "canned":
+            with self._lock:
+                return next(self._canned)
+        return f"Echo: {question}"
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        return TOKEN_PATTERN.findall(text) or [text]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    """Ollama API endpoints backed by the server's FakeBehaviour"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data: dict, status: int = 200):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data: dict):
+        line = (json.dumps(data) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self):
+        server = self.server
+        if self.path == "/api/tags":
+            self._send_json({"models": [
+                {"name": name, "model": name, "size": 0, "details": {"family": "fake"}}
+                for name in server.models
+            ]})
+        elif self.path == "/api/ps":
+            with server.lock:
+                loaded = sorted(server.loaded)
+            self._send_json({"models": [{"name": name, "model": name, "size_vram": 0} for name in loaded]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        if self.path not in ("/api/generate", "/api/chat"):
+            self._send_json({"error": "not found"}, 404)
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        model = server.resolve_model(request.get("model", ""))
+        if model is None:
+            self._send_json({"error": f"model '{request.get('model')}' not found"}, 404)
+            return
+        with server.lock:
+            server.requests += 1
+        behaviour = server.behaviour
+        if behaviour.should_fail():
+            with server.lock:
+                server.errors += 1
+            self._send_json({"error": "injected failure"}, behaviour.error_status)
+            return
+
+        chat = self.path == "/api/chat"
+        if chat:
+            messages = request.get("messages", [])
+            prompt = "\n".join(message.get("content", "") for message in messages)
+            question = next((message.get("content", "") for message in reversed(messages)
+                             if message.get("role") == "user"), "")
+        else:
+            prompt = request.get("system", "") + request.get("prompt", "")
+            question = request.get("prompt", "")
+        tokens = behaviour.tokens(behaviour.answer(question))
+        start = time.perf_counter()
+        first_token_delay = behaviour.first_token_delay()
+        with server.lock:
+            server.loaded.add(model)
+
+        def message(text: str, done: bool, **extra) -> dict:
+            data = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+            if chat:
+                data["message"] = {"role": "assistant", "content": text}
+            else:
+                data["response"] = text
+            data.update(extra)
+            return data
+
+        def stats() -> dict:
+            # Ollama reports durations in nanoseconds
+            return {
+                "done_reason": "stop",
+                "total_duration": int((time.perf_counter() - start) * 1e9),
+                "load_duration": 0,
+                "prompt_eval_count": count_tokens(prompt),
+                "prompt_eval_duration": int(first_token_delay * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int(len(tokens) * behaviour.token_delay() * 1e9)
+            }
+
+        time.sleep(first_token_delay)
+        if not request.get("stream", True):
+            time.sleep(behaviour.token_delay() * (len(tokens) - 1))
+            self._send_json(message("".join(tokens), True, **stats()))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for position, token in enumerate(tokens):
+                if position:
+                    time.sleep(behaviour.token_delay())
+                self._send_chunk(message(token, False))
+            self._send_chunk(message("", True, **stats()))
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading
+            pass
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    """A fake Ollama server on a background thread; port 0 picks a free port.
+
+    Use as a context manager, or call start() and stop(). Point OllamaProvider at it with
+    OllamaProvider(model, base_urls=[server.url]).
+    """
+
+    daemon_threads = True
+    # The default listen backlog of 5 refuses connections under load tests with hundreds in flight
+    request_queue_size = 1024
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, models: Optional[List[str]] = None,
+                 behaviour: Optional[FakeBehaviour] = None):
+        super().__init__((host, port), FakeOllamaHandler)
+        self.models = models or ["mistral:latest", "llama2:latest", "phi:latest"]
+        self.behaviour = behaviour or FakeBehaviour()
+        self.lock = threading.Lock()
+        self.loaded = set()
+        self.requests = 0
+        self.errors = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def resolve_model(self, name: str) -> Optional[str]:
+        """The served model a request names ("mistral" means "mistral:latest"); None if unknown"""
+        for model in self.models:
+            if name in (model, model.split(":")[0]):
+                return model
+        return None
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True, name="fake-llm-server")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class FakeGeminiResponse:
+    """A generate_content response or stream chunk, with the attributes GeminiProvider reads"""
+
+    def __init__(self, text: str):
+        self.text = text
+        part = type("Part", (), {"text": text})()
+        content = type("Content", (), {"parts": [part]})()
+        self.candidates = [type("Candidate", (), {"content": content})()]
+
+
+class FakeGeminiError(RuntimeError):
+    """An API error carrying its HTTP status as `code`, like google.api_core's exceptions"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeGeminiModel:
+    """Stand-in for genai.GenerativeModel, optionally bound to a cached system instruction"""
+
+    def __init__(self, client: "FakeGeminiClient", system_instruction: str = "", cache: Optional[str] = None):
+        self.client = client
+        self.system_instruction = system_instruction
+        self.cache = cache
+
+    def _answer(self, prompt: str) -> List[str]:
+        behaviour = self.client.behaviour
+        with self.client.lock:
+            self.client.requests += 1
+            self.client.prompts.append(prompt)
+            # A cache deleted or expired server-side is not found, as with the real API
+            if self.cache is not None and self.cache not in self.client.caches:
+                raise FakeGeminiError(404, f"CachedContent not found: {self.cache}")
+        if behaviour.should_fail():
+            with self.client.lock:
+                self.client.errors += 1
+            raise FakeGeminiError(behaviour.error_status, "injected failure")
+        # The question is the text after the last "Question:" marker, if any
+        return behaviour.tokens(behaviour.answer(prompt.rsplit("Question: ", 1)[-1]))
+
+    def generate_content(self, prompt: str, stream: bool = False):
+        tokens = self._answer(prompt)
+        behaviour = self.client.behaviour
+        time.sleep(behaviour.first_token_delay())
+        if not stream:
+            time.sleep(behaviour.token_delay() * (len(tokens) - 1))
+            return FakeGeminiResponse("".join(tokens))
+
+        def chunks():
+            for position, token in enumerate(tokens):
+                if position:
+                    time.sleep(behaviour.token_delay())
+                yield FakeGeminiResponse(token)
+        return chunks()
+
+    async def generate_content_async(self, prompt: str, stream: bool = False):
+        tokens = self._answer(prompt)
+        behaviour = self.client.behaviour
+        await asyncio.sleep(behaviour.first_token_delay())
+        if not stream:
+            await asyncio.sleep(behaviour.token_delay() * (len(tokens) - 1))
+            return FakeGeminiResponse("".join(tokens))
+
+        async def chunks():
+            for position, token in enumerate(tokens):
+                if position:
+                    await asyncio.sleep(behaviour.token_delay())
+                yield FakeGeminiResponse(token)
+        return chunks()
+
+
+class FakeGeminiClient:
+    """In-process replacement for GenaiClient: GeminiProvider(client=FakeGeminiClient())"""
+
+    def __init__(self, behaviour: Optional[FakeBehaviour] = None, cache_min_tokens: int = 0):
+        self.behaviour = behaviour or FakeBehaviour()
+        # Caches of fewer tokens are refused, like the real API's minimum size
+        self.cache_min_tokens = cache_min_tokens
+        self.lock = threading.Lock()
+        self.caches = {}
+        self.prompts = []
+        self.requests = 0
+        self.errors = 0
+        self._cache_ids = itertools.count(1)
+
+    def model(self, model_name: str) -> FakeGeminiModel:
+        return FakeGeminiModel(self)
+
+    def create_cache(self, model_name: str, system_instruction: str, ttl: float) -> str:
+        if count_tokens(system_instruction) < self.cache_min_tokens:
+            raise FakeGeminiError(400, "Cached content is too small")
+        with self.lock:
+            name = f"cachedContents/fake-{next(self._cache_ids)}"
+            self.caches[name] = system_instruction
+        return name
+
+    def model_from_cache(self, cache: str) -> FakeGeminiModel:
+        return FakeGeminiModel(self, self.caches[cache], cache)
+
+    def delete_cache(self, cache: str):
+        with self.lock:
+            self.caches.pop(cache, None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for offline performance testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--models", default="mistral:latest,llama2:latest,phi:latest",
+                        help="comma-separated model names to serve")
+    parser.add_argument("--latency", choices=DISTRIBUTIONS, default="fixed",
+                        help="distribution of the delay before the first token")
+    parser.add_argument("--latency-ms", type=float, default=0, help="mean (median for lognormal) first-token delay")
+    parser.add_argument("--jitter", type=float, default=0.25,
+                        help="spread as a fraction of latency-ms (sigma for lognormal)")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="0 sends the whole response at once")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--response", choices=("echo", "canned"), default="echo")
+    parser.add_argument("--canned", action="append", help="canned response (repeat for several)")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    behaviour = FakeBehaviour(args.latency, args.latency_ms, args.jitter, args.tokens_per_second,
+                              args.error_rate, args.error_status, args.response, args.canned, args.seed)
+    server = FakeLLMServer(args.host, args.port, args.models.split(","), behaviour)
+    print(f"🤖 Fake Ollama server listening on {server.url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
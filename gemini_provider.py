@@ -1,28 +1,320 @@
+import asyncio
+import datetime
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
 import google.generativeai as genai
 from config import Config
+from single_flight import SingleFlight
+from token_budget import count_tokens
+
+# System prompts remembered as refused by the caching API before the list is reset
+MAX_UNCACHEABLE = 1000
+# HTTP statuses of a request through a cache whose handle is gone (expired, deleted or not visible)
+INVALID_CACHE_STATUSES = (403, 404)
+
+
+def _status(error: Exception) -> Optional[int]:
+    """HTTP status of a google.api_core error (its code), or None for other errors"""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) else None
+
+
+class GenaiClient:
+    """The google.generativeai calls GeminiProvider makes; pass a fake to GeminiProvider in tests"""
+    
+    def __init__(self, api_key: str):
+        genai.configure(api_key=api_key)
+    
+    def model(self, model_name: str):
+        return genai.GenerativeModel(model_name)
+    
+    def create_cache(self, model_name: str, system_instruction: str, ttl: float):
+        """Create server-side cached content holding a system instruction"""
+        from google.generativeai import caching
+        return caching.CachedContent.create(
+            model=model_name,
+            display_name="rag-system-prompt",
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=ttl)
+        )
+    
+    def model_from_cache(self, cache):
+        return genai.GenerativeModel.from_cached_content(cached_content=cache)
+    
+    def delete_cache(self, cache):
+        cache.delete()
+
+
+class ContextCacheEntry:
+    """A cached system prompt and the model bound to it"""
+    
+    def __init__(self, cache, model, expires: float):
+        self.cache = cache
+        self.model = model
+        self.expires = expires
+
 
 class GeminiProvider:
-    """Gemini API provider for RAG"""
+    """Gemini API provider for RAG.
+    
+    System prompts of at least GEMINI_CONTEXT_CACHE_MIN_TOKENS are stored as server-side
+    cached content, keyed by a hash of their text, so repeated questions only send the
+    question. A database change changes the prompt and therefore the cache used. When
+    caching is disabled, the prompt is too short, or creating a cache fails, the prompt
+    is sent inline as before: for good if the API refused it, otherwise for
+    GEMINI_CONTEXT_CACHE_RETRY_SECONDS. A request through a cache that is no longer
+    found is resent inline and the cache recreated on the next question; other errors
+    are reported like any failed request and leave the cache in use.
+    
+    A cache only pays off when questions share a system prompt, which RAGEngine sends in
+    RETRIEVAL_MODE "full" with a database that fits the model's token budget. Keyword and
+    vector retrieval build a different, short context per question, so it goes inline.
+    """
+    
+    def __init__(self, raise_errors: bool = False, client=None):
+        if client is None:
+            if not Config.GEMINI_API_KEY:
+                raise ValueError("GEMINI_API_KEY not configured")
+            client = GenaiClient(Config.GEMINI_API_KEY)
+        self.client = client
+        self.model_name = "gemini-3-flash-preview"
+        self.model = client.model(self.model_name)
+        # Raise instead of returning "Error ..." strings (used by FailoverProvider)
+        self.raise_errors = raise_errors
+        self.context_caching = Config.GEMINI_CONTEXT_CACHE_ENABLED
+        self._context_caches = OrderedDict()
+        # Prompts sent inline instead of cached, mapped to when caching may be tried again
+        self._uncacheable = {}
+        self._cache_lock = threading.Lock()
+        self._creations = SingleFlight()
+        self.cache_stats = {"created": 0, "reused": 0, "inline": 0, "failures": 0}
+    
+    @staticmethod
+    def _prompt(query: str, context: str) -> str:
+        return f"{context}\n\nQuestion: {query}" if context else query
+    
+    @staticmethod
+    def _chunk_text(chunk) -> str:
+        # Chunks without candidates (e.g. safety metadata) have no text
+        return chunk.text if chunk.candidates and chunk.candidates[0].content.parts else ""
+    
+    @staticmethod
+    def _context_key(context: str) -> str:
+        return hashlib.sha256(context.encode("utf-8")).hexdigest()
     
-    def __init__(self):
-        if not Config.GEMINI_API_KEY:
-            raise ValueError("GEMINI_API_KEY not configured")
-        genai.configure(api_key=Config.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-3-flash-preview')
+    def _count(self, stat: str):
+        with self._cache_lock:
+            self.cache_stats[stat] += 1
+    
+    def _cacheable(self, context: str) -> bool:
+        return (self.context_caching and bool(context)
+                and count_tokens(context) >= Config.GEMINI_CONTEXT_CACHE_MIN_TOKENS)
+    
+    def _cached_entry(self, context: str):
+        """Get (creating if needed) the context cache entry for a system prompt, or None to send it inline"""
+        if not self._cacheable(context):
+            self._count("inline")
+            return None
+        key = self._context_key(context)
+        with self._cache_lock:
+            entry = self._live_entry(key)
+            if entry is not None or self._refused(key):
+                self.cache_stats["reused" if entry is not None else "inline"] += 1
+                return entry
+        # Created outside the lock so other prompts are not held up; concurrent first
+        # questions with this prompt wait for one creation and share it
+        created = []
+        
+        def create():
+            created.append(key)
+            return self._create_entry(key, context)
+        
+        entry = self._creations.do(key, create)
+        if not created:
+            self._count("reused" if entry is not None else "inline")
+        return entry
+    
+    def _live_entry(self, key: str):
+        # Called with the lock held
+        entry = self._context_caches.get(key)
+        if entry is None or entry.expires <= time.monotonic():
+            return None
+        self._context_caches.move_to_end(key)
+        return entry
+    
+    def _create_entry(self, key: str, context: str):
+        with self._cache_lock:
+            # Another creation may have finished since the caller looked
+            entry = self._live_entry(key)
+            if entry is not None:
+                self.cache_stats["reused"] += 1
+                return entry
+        try:
+            cache = self.client.create_cache(self.model_name, context, Config.GEMINI_CONTEXT_CACHE_TTL)
+            model = self.client.model_from_cache(cache)
+        except Exception as e:
+            # A 4xx (e.g. too small to cache) will be refused again; anything else may pass later
+            status = _status(e)
+            permanent = status is not None and 400 <= status < 500 and status != 429
+            with self._cache_lock:
+                self._mark_uncacheable(key, math.inf if permanent else Config.GEMINI_CONTEXT_CACHE_RETRY_SECONDS)
+                self.cache_stats["failures"] += 1
+                self.cache_stats["inline"] += 1
+            return None
+        # Treat the cache as expired a little early so it is never used as it lapses
+        expires = time.monotonic() + Config.GEMINI_CONTEXT_CACHE_TTL * 0.9
+        with self._cache_lock:
+            entry = self._context_caches[key] = ContextCacheEntry(cache, model, expires)
+            self.cache_stats["created"] += 1
+            evicted = []
+            while len(self._context_caches) > Config.GEMINI_CONTEXT_CACHE_MAX_ENTRIES:
+                evicted.append(self._context_caches.popitem(last=False)[1])
+        for old in evicted:
+            self._delete(old)
+        return entry
+    
+    def _mark_uncacheable(self, key: str, seconds: float):
+        # Called with the lock held; bounded so retrieval modes with many contexts cannot grow it forever
+        if len(self._uncacheable) >= MAX_UNCACHEABLE:
+            self._uncacheable.clear()
+        self._uncacheable[key] = time.monotonic() + seconds
+    
+    def _refused(self, key: str) -> bool:
+        # Called with the lock held
+        retry_at = self._uncacheable.get(key)
+        if retry_at is None:
+            return False
+        if retry_at <= time.monotonic():
+            del self._uncacheable[key]
+            return False
+        return True
+    
+    def _delete(self, entry: ContextCacheEntry):
+        try:
+            self.client.delete_cache(entry.cache)
+        except Exception:
+            pass
+    
+    def _forget(self, context: str, error: Exception) -> bool:
+        """Drop a system prompt's cache if a request through it failed because the handle is gone.
+        
+        Returns whether it was dropped, in which case the request should be resent inline;
+        the next question creates a new cache. Other errors, e.g. a transient 5xx, leave
+        the cache in use and fail the request like any other error.
+        """
+        if _status(error) not in INVALID_CACHE_STATUSES:
+            return False
+        key = self._context_key(context)
+        with self._cache_lock:
+            entry = self._context_caches.pop(key, None)
+            self.cache_stats["failures"] += 1
+        if entry is not None:
+            self._delete(entry)
+        return True
     
     def query(self, query: str, context: str = "") -> str:
         """Query Gemini with optional context"""
         try:
-            if context:
-                prompt = f"{context}\n\nQuestion: {query}"
-            else:
-                prompt = query
-            
-            response = self.model.generate_content(prompt)
+            entry = self._cached_entry(context)
+            if entry is not None:
+                try:
+                    return entry.model.generate_content(f"Question: {query}").text
+                except Exception as e:
+                    if not self._forget(context, e):
+                        raise
+            response = self.model.generate_content(self._prompt(query, context))
+            return response.text
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            return f"Error querying Gemini: {str(e)}"
+    
+    def stream_query(self, query: str, context: str = ""):
+        """Query Gemini, yielding response text as it is generated"""
+        try:
+            entry = self._cached_entry(context)
+            if entry is not None:
+                started = False
+                try:
+                    for chunk in entry.model.generate_content(f"Question: {query}", stream=True):
+                        text = self._chunk_text(chunk)
+                        if text:
+                            started = True
+                            yield text
+                    return
+                except Exception as e:
+                    # Text already sent cannot be taken back, so only retry inline before it
+                    if started or not self._forget(context, e):
+                        raise
+            for chunk in self.model.generate_content(self._prompt(query, context), stream=True):
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            yield f"Error querying Gemini: {str(e)}"
+    
+    async def _acached_entry(self, context: str):
+        # Creating a cache is a blocking API call; keep it off the event loop
+        if not self._cacheable(context):
+            self._count("inline")
+            return None
+        return await asyncio.to_thread(self._cached_entry, context)
+    
+    async def aquery(self, query: str, context: str = "") -> str:
+        """Query Gemini without blocking the event loop"""
+        try:
+            entry = await self._acached_entry(context)
+            if entry is not None:
+                try:
+                    return (await entry.model.generate_content_async(f"Question: {query}")).text
+                except Exception as e:
+                    if not self._forget(context, e):
+                        raise
+            response = await self.model.generate_content_async(self._prompt(query, context))
             return response.text
         except Exception as e:
+            if self.raise_errors:
+                raise
             return f"Error querying Gemini: {str(e)}"
     
+    async def astream_query(self, query: str, context: str = ""):
+        """Query Gemini without blocking the event loop, yielding text as it is generated"""
+        try:
+            entry = await self._acached_entry(context)
+            if entry is not None:
+                started = False
+                try:
+                    response = await entry.model.generate_content_async(f"Question: {query}", stream=True)
+                    async for chunk in response:
+                        text = self._chunk_text(chunk)
+                        if text:
+                            started = True
+                            yield text
+                    return
+                except Exception as e:
+                    if started or not self._forget(context, e):
+                        raise
+            response = await self.model.generate_content_async(self._prompt(query, context), stream=True)
+            async for chunk in response:
+                text = self._chunk_text(chunk)
+                if text:
+                    yield text
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            yield f"Error querying Gemini: {str(e)}"
+    
+    def context_cache_stats(self) -> dict:
+        """Context caches created and reused, and prompts sent inline"""
+        with self._cache_lock:
+            return {**self.cache_stats, "entries": len(self._context_caches)}
+    
     @staticmethod
     def is_available() -> bool:
         """Check if Gemini is available"""
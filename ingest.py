@@ -0,0 +1,247 @@
+"""
+Bulk loader for student, course and grade exports (CSV or JSONL)
+
+Streams the input in fixed-size chunks, validates every row against the record
+schema used by Database, bulk-inserts valid rows into the SQL database and writes
+rejected rows to a side file, so memory use stays constant regardless of file size.
+
+Usage:
+    python ingest.py students students.csv
+    python ingest.py courses courses.jsonl --database-url sqlite:///students.db
+    python ingest.py grades grades.csv --rejects bad_grades.jsonl
+
+CSV columns:
+    students: id, name, email, major, gpa, courses ("CS101;CS201"), grades ("CS101:A;CS201:B+")
+    courses:  id, name, instructor, credits, description
+    grades:   student_id, course_id, grade
+JSONL rows use the same field names, with courses as a list and grades as an object.
+"""
+
+import argparse
+import csv
+import json
+import re
+import sys
+import time
+from itertools import islice
+from config import Config
+
+VALID_GRADES = frozenset(letter + suffix for letter in "ABCD" for suffix in ("", "+", "-")) | {"F"}
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+# ============================================
+# ROW VALIDATION
+# ============================================
+
+def _required(row: dict, field: str):
+    value = row.get(field)
+    if isinstance(value, str):
+        value = value.strip()
+    if value is None or value == "":
+        raise ValueError(f"missing field: {field}")
+    return value
+
+
+def _text(row: dict, field: str) -> str:
+    value = _required(row, field)
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string: {value!r}")
+    return value
+
+
+def _grade(value) -> str:
+    grade = str(value).strip().upper()
+    if grade not in VALID_GRADES:
+        raise ValueError(f"invalid grade: {value!r}")
+    return grade
+
+
+def _split_list(value) -> list:
+    """Courses arrive as a JSON list or a ';'-separated CSV cell"""
+    if isinstance(value, list):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value or "").split(";") if item.strip()]
+
+
+def _parse_grades(value) -> dict:
+    """Grades arrive as a JSON object or a 'CS101:A;CS201:B+' CSV cell"""
+    if isinstance(value, dict):
+        pairs = value.items()
+    else:
+        pairs = []
+        for item in _split_list(value):
+            if ":" not in item:
+                raise ValueError(f"invalid grade entry: {item!r}")
+            pairs.append(item.split(":", 1))
+    return {str(course_id).strip(): _grade(grade) for course_id, grade in pairs}
+
+
+def validate_student(row: dict) -> tuple:
+    """Validate a student row; returns (student_id, info) shaped like Config.STUDENT_DATABASE"""
+    student_id = str(_required(row, "id"))
+    email = _text(row, "email")
+    if not EMAIL_PATTERN.match(email):
+        raise ValueError(f"invalid email: {email!r}")
+    try:
+        gpa = float(_required(row, "gpa"))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid gpa: {row.get('gpa')!r}")
+    if not 0.0 <= gpa <= 4.0:
+        raise ValueError(f"gpa out of range: {gpa}")
+    grades = _parse_grades(row.get("grades"))
+    courses = _split_list(row.get("courses"))
+    return student_id, {
+        "name": _text(row, "name"),
+        "email": email,
+        "major": _text(row, "major"),
+        "gpa": gpa,
+        "courses": courses,
+        "grades": grades
+    }
+
+
+def validate_course(row: dict) -> tuple:
+    """Validate a course row; returns (course_id, info) shaped like Config.COURSE_DATABASE"""
+    course_id = str(_required(row, "id"))
+    try:
+        credits = int(_required(row, "credits"))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid credits: {row.get('credits')!r}")
+    if credits <= 0:
+        raise ValueError(f"credits must be positive: {credits}")
+    return course_id, {
+        "name": _text(row, "name"),
+        "instructor": _text(row, "instructor"),
+        "credits": credits,
+        "description": _text(row, "description") if row.get("description") else ""
+    }
+
+
+def validate_grade(row: dict) -> tuple:
+    """Validate a grade row; returns (student_id, course_id, grade)"""
+    return (str(_required(row, "student_id")), str(_required(row, "course_id")),
+            _grade(_required(row, "grade")))
+
+
+VALIDATORS = {
+    "students": validate_student,
+    "courses": validate_course,
+    "grades": validate_grade
+}
+
+
+# ============================================
+# STREAMING INGESTION
+# ============================================
+
+def read_rows(path: str, file_format: str):
+    """Stream (line_number, row) pairs from a CSV or JSONL file"""
+    with open(path, newline="", encoding="utf-8") as f:
+        if file_format == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    row = {"_raw": line.rstrip("\n"), "_error": f"invalid JSON: {e}"}
+                if not isinstance(row, dict):
+                    row = {"_raw": line.rstrip("\n"), "_error": "row is not a JSON object"}
+                yield line_number, row
+
+
+def ingest(kind: str, path: str, db, file_format: str = None, rejects_path: str = None,
+           chunk_size: int = None, progress=print) -> dict:
+    """Validate and bulk-insert a file of students, courses or grades; returns run statistics"""
+    file_format = file_format or ("jsonl" if path.endswith((".jsonl", ".json", ".ndjson")) else "csv")
+    rejects_path = rejects_path or f"{path}.rejects.jsonl"
+    chunk_size = chunk_size or Config.INGEST_CHUNK_SIZE
+    validate = VALIDATORS[kind]
+    write_chunk = {
+        "students": db.bulk_insert_students,
+        "courses": db.bulk_insert_courses,
+        "grades": db.bulk_upsert_grades
+    }[kind]
+
+    stats = {"rows": 0, "inserted": 0, "rejected": 0}
+    start = time.perf_counter()
+    rows = read_rows(path, file_format)
+
+    with open(rejects_path, "w", encoding="utf-8") as rejects:
+        def reject(line_number, row, error):
+            stats["rejected"] += 1
+            rejects.write(json.dumps({"line": line_number, "error": error, "row": row}) + "\n")
+
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            stats["rows"] += len(chunk)
+
+            valid, lines = [], {}
+            for line_number, row in chunk:
+                if "_error" in row:
+                    reject(line_number, row.get("_raw"), row["_error"])
+                    continue
+                try:
+                    record = validate(row)
+                except ValueError as e:
+                    reject(line_number, row, str(e))
+                    continue
+                key = record[:2] if kind == "grades" else record[0]
+                if key in lines:
+                    reject(line_number, row, f"duplicate of line {lines[key][0]} in this chunk")
+                    continue
+                lines[key] = (line_number, row)
+                valid.append(record)
+
+            if valid:
+                failed = write_chunk(valid)
+                for key, error in failed:
+                    reject(*lines[key], error)
+                stats["inserted"] += len(valid) - len(failed)
+
+            elapsed = time.perf_counter() - start
+            progress(f"{stats['rows']:>10,} rows  {stats['inserted']:>10,} inserted  "
+                     f"{stats['rejected']:>8,} rejected  {stats['rows'] / elapsed:>10,.0f} rows/sec")
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] else 0.0
+    stats["rejects_file"] = rejects_path
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk-load student, course and grade exports")
+    parser.add_argument("kind", choices=sorted(VALIDATORS), help="Type of records in the file")
+    parser.add_argument("path", help="CSV or JSONL file to load")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="File format (default: from extension)")
+    parser.add_argument("--database-url", default=Config.DATABASE_URL, help="SQLAlchemy database URL")
+    parser.add_argument("--rejects", help="File for rejected rows (default: <path>.rejects.jsonl)")
+    parser.add_argument("--chunk-size", type=int, default=Config.INGEST_CHUNK_SIZE,
+                        help="Rows validated and inserted per transaction")
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="Maintain secondary indexes during the load (slower; use on a live database)")
+    args = parser.parse_args(argv)
+
+    from contextlib import nullcontext
+    from sql_database import SQLDatabase
+
+    db = SQLDatabase(args.database_url, seed=False)
+    with nullcontext() if args.keep_indexes else db.deferred_indexes():
+        stats = ingest(args.kind, args.path, db, args.format, args.rejects, args.chunk_size)
+
+    print(f"\n✅ Loaded {stats['inserted']:,} of {stats['rows']:,} {args.kind} rows "
+          f"in {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} rows/sec)")
+    if stats["rejected"]:
+        print(f"⚠️  {stats['rejected']:,} rows rejected, see {stats['rejects_file']}")
+    return 0 if stats["inserted"] or not stats["rows"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from config import Config
+from ollama_provider import fetch_json, get_session
+
+# Weight of the newest request in an endpoint's moving-average latency
+LATENCY_SMOOTHING = 0.2
+# With prefer_loaded, a server without the model counts as this many requests busier,
+# so a warm server is preferred until it is clearly more loaded than a cold one
+COLD_MODEL_PENALTY = 4
+
+
+def model_names(name: str) -> set:
+    """Names a model can be requested by: "mistral:latest" is also "mistral" """
+    return {name, name.split(":")[0]}
+
+
+class Endpoint:
+    """One Ollama server and the load and health observed on it"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.session = get_session(self.url)
+        self.outstanding = 0
+        self.latency = None
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.loaded_models = set()
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "latency": self.latency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "loaded_models": sorted(self.loaded_models)
+        }
+
+
+class Lease:
+    """An endpoint checked out for one request; set ok to False if the server misbehaved"""
+
+    def __init__(self, endpoint: Endpoint):
+        self.endpoint = endpoint
+        self.url = endpoint.url
+        self.session = endpoint.session
+        self.ok = True
+
+
+class EndpointPool:
+    """Spread Ollama requests over several servers.
+
+    "least-outstanding" sends each request to the server with the fewest requests in
+    flight; "latency" weights that count by each server's recent latency. Servers that
+    fail repeatedly are ejected for a while, and a background health check using the
+    /api/tags probe brings them back. With prefer_loaded, servers that already have the
+    requested model in memory (from /api/ps) are favoured over ones that would load it.
+    """
+
+    def __init__(self, urls: list, strategy: Optional[str] = None, prefer_loaded: Optional[bool] = None,
+                 health_check_interval: Optional[float] = None, eject_seconds: Optional[float] = None,
+                 eject_after_failures: Optional[int] = None):
+        if not urls:
+            raise ValueError("At least one Ollama endpoint is required")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy or Config.OLLAMA_BALANCE_STRATEGY
+        if self.strategy not in ("least-outstanding", "latency"):
+            raise ValueError(f"Unknown balancing strategy: {self.strategy}")
+        self.prefer_loaded = Config.OLLAMA_PREFER_LOADED_MODEL if prefer_loaded is None else prefer_loaded
+        self.health_check_interval = (Config.OLLAMA_HEALTH_CHECK_INTERVAL if health_check_interval is None
+                                      else health_check_interval)
+        self.eject_seconds = Config.OLLAMA_EJECT_SECONDS if eject_seconds is None else eject_seconds
+        self.eject_after_failures = eject_after_failures or Config.OLLAMA_EJECT_AFTER_FAILURES
+        self._lock = threading.Lock()
+        self._next = 0
+        self._health_thread = None
+
+    def select(self, model: Optional[str] = None) -> Endpoint:
+        """Pick the endpoint for the next request and count it as outstanding"""
+        self._start_health_checks()
+        with self._lock:
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy]
+            if not candidates:
+                # Everything is ejected; fail open on the server due back soonest
+                candidates = [min(self.endpoints, key=lambda endpoint: endpoint.ejected_until)]
+            # Rotate the starting point so ties are spread round-robin
+            self._next = (self._next + 1) % len(candidates)
+            ordered = candidates[self._next:] + candidates[:self._next]
+            endpoint = min(ordered, key=lambda endpoint: self._load(endpoint, model))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def _load(self, endpoint: Endpoint, model: Optional[str]) -> float:
+        queued = endpoint.outstanding
+        if self.prefer_loaded and model and model not in endpoint.loaded_models:
+            queued += COLD_MODEL_PENALTY
+        if self.strategy == "latency":
+            # Expected wait: requests ahead of this one times how long each takes here
+            return (queued + 1) * (endpoint.latency or 0.0)
+        return queued
+
+    def release(self, endpoint: Endpoint, latency: float, ok: bool, model: Optional[str] = None):
+        """Record the outcome of a request sent to an endpoint"""
+        with self._lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.failures = 0
+                endpoint.latency = (latency if endpoint.latency is None
+                                    else LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * endpoint.latency)
+                if model:
+                    endpoint.loaded_models |= model_names(model)
+            else:
+                endpoint.errors += 1
+                endpoint.failures += 1
+                if endpoint.failures >= self.eject_after_failures:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+
+    @contextmanager
+    def lease(self, model: Optional[str] = None):
+        """Check out an endpoint for one request; errors (not cancellation or a closed stream) count as failures"""
+        lease = Lease(self.select(model))
+        start = time.monotonic()
+        try:
+            yield lease
+        except Exception:
+            lease.ok = False
+            raise
+        finally:
+            self.release(lease.endpoint, time.monotonic() - start, lease.ok, model)
+
+    def check_health(self):
+        """Probe every endpoint: eject unreachable ones, restore recovered ones, refresh loaded models"""
+        for endpoint in self.endpoints:
+            healthy = fetch_json(endpoint.url, "/api/tags") is not None
+            running = fetch_json(endpoint.url, "/api/ps") if healthy else None
+            with self._lock:
+                if not healthy:
+                    endpoint.ejected_until = time.monotonic() + self.eject_seconds
+                    continue
+                endpoint.failures = 0
+                endpoint.ejected_until = 0.0
+                if running is not None:
+                    endpoint.loaded_models = set().union(
+                        *(model_names(model["name"]) for model in running.get("models", []))
+                    )
+
+    def _start_health_checks(self):
+        if self._health_thread is not None or not self.health_check_interval:
+            return
+        with self._lock:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, daemon=True,
+                                                       name="ollama-health-check")
+                self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            try:
+                self.check_health()
+            except Exception:
+                pass
+            time.sleep(self.health_check_interval)
+
+    def stats(self) -> list:
+        with self._lock:
+            return [endpoint.stats() for endpoint in self.endpoints]
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(urls: Optional[list] = None) -> EndpointPool:
+    """Get the process-wide pool for a set of Ollama servers (default: OLLAMA_BASE_URLS)"""
+    key = tuple(urls or Config.OLLAMA_BASE_URLS)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = EndpointPool(list(key))
+    return pool
@@ -1,63 +1,280 @@
+import asyncio
+import itertools
+import json
+import logging
+import threading
+import weakref
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional
+from urllib3.util.retry import Retry
 from config import Config
 
+logger = logging.getLogger(__name__)
+
+# Statuses Ollama (or a proxy in front of it) returns while a model is loading or overloaded
+RETRY_STATUSES = (429, 502, 503, 504)
+# Availability probes fail fast instead of retrying, so a stopped server is reported quickly
+PROBE_READ_TIMEOUT = 2
+
+# Pooled keep-alive sessions shared by every OllamaProvider, keyed by (base URL, retrying)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url: str, retry: bool = True) -> requests.Session:
+    """Get the shared HTTP session for an Ollama server"""
+    key = (base_url, retry)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                retries = Retry(
+                    total=Config.OLLAMA_MAX_RETRIES if retry else 0,
+                    # Never replay a request the server may already be generating for
+                    read=0,
+                    backoff_factor=Config.OLLAMA_RETRY_BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset({"GET", "POST"}),
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.OLLAMA_POOL_SIZE, max_retries=retries)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _sessions[key] = session
+    return session
+
+
+def fetch_json(base_url: str, path: str) -> Optional[dict]:
+    """GET a JSON endpoint of an Ollama server without retrying; None if it is unreachable"""
+    try:
+        response = get_session(base_url, retry=False).get(
+            f"{base_url}{path}",
+            timeout=(Config.OLLAMA_CONNECT_TIMEOUT, PROBE_READ_TIMEOUT)
+        )
+        return response.json() if response.status_code == 200 else None
+    except:
+        return None
+
+
+def get_timeout() -> tuple:
+    """(connect, read) timeout for generation requests"""
+    return (Config.OLLAMA_CONNECT_TIMEOUT, Config.OLLAMA_READ_TIMEOUT)
+
+# httpcore scans every pooled connection on each request, so one large pool gets
+# quadratically slower; the shared pool is split across clients of this size instead
+CONNECTIONS_PER_CLIENT = 16
+
+# One set of pooled httpx.AsyncClients per event loop, shared by every OllamaProvider
+_async_pools = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """Get a client from the shared async HTTP connection pool of the running event loop"""
+    import httpx
+    loop = asyncio.get_running_loop()
+    pool = _async_pools.get(loop)
+    if pool is None:
+        count = max(1, -(-Config.ASYNC_MAX_CONNECTIONS // CONNECTIONS_PER_CLIENT))
+        size = min(CONNECTIONS_PER_CLIENT, Config.ASYNC_MAX_CONNECTIONS)
+        timeout = httpx.Timeout(Config.OLLAMA_READ_TIMEOUT, connect=Config.OLLAMA_CONNECT_TIMEOUT)
+        clients = [
+            httpx.AsyncClient(
+                transport=httpx.AsyncHTTPTransport(
+                    limits=httpx.Limits(max_connections=size, max_keepalive_connections=size),
+                    retries=Config.OLLAMA_MAX_RETRIES
+                ),
+                timeout=timeout
+            )
+            for _ in range(count)
+        ]
+        pool = _async_pools[loop] = (clients, itertools.cycle(clients))
+    return next(pool[1])
+
+
+async def close_async_client():
+    """Close the shared async HTTP clients of the running event loop"""
+    pool = _async_pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        for client in pool[0]:
+            await client.aclose()
+
+
 class OllamaProvider:
     """Ollama API provider for RAG"""
     
-    def __init__(self, model: Optional[str] = None):
-        self.base_url = Config.OLLAMA_BASE_URL
+    def __init__(self, model: Optional[str] = None, base_urls: Optional[list] = None,
+                 raise_errors: bool = False):
+        from ollama_balancer import get_endpoint_pool
         self.model = model or Config.OLLAMA_DEFAULT_MODEL
+        # Requests are spread over every configured Ollama server
+        self.pool = get_endpoint_pool(base_urls)
+        # Raise instead of returning "Error ..." strings (used by FailoverProvider)
+        self.raise_errors = raise_errors
+        self.eval_stats = {"requests": 0, "prompt_tokens": 0, "prompt_eval_seconds": 0.0, "load_seconds": 0.0}
+        self._stats_lock = threading.Lock()
+    
+    @property
+    def model_name(self) -> str:
+        """Name of the model answering queries"""
+        return self.model
+    
+    def _payload(self, query: str, context: str, stream: bool) -> dict:
+        # The system prompt is sent as its own message ahead of the question, so it forms
+        # an identical prefix across questions that Ollama keeps evaluated while the model
+        # stays loaded. The returned "context" tokens are not reused: they would carry the
+        # previous question and answer into the next prompt.
+        messages = [{"role": "user", "content": f"Question: {query}" if context else query}]
+        if context:
+            messages.insert(0, {"role": "system", "content": context})
+        return {
+            "model": self.model,
+            "messages": messages,
+            "stream": stream,
+            "keep_alive": Config.OLLAMA_KEEP_ALIVE
+        }
+    
+    def _fail(self, message: str) -> str:
+        if self.raise_errors:
+            raise RuntimeError(message)
+        return message
+    
+    def _record_eval(self, result: dict):
+        """Record the prompt evaluation timings Ollama reports with a finished response"""
+        # Durations are in nanoseconds; a reused prefix is not counted in prompt_eval_count
+        prompt_tokens = result.get("prompt_eval_count", 0)
+        prompt_eval_seconds = result.get("prompt_eval_duration", 0) / 1e9
+        with self._stats_lock:
+            self.eval_stats["requests"] += 1
+            self.eval_stats["prompt_tokens"] += prompt_tokens
+            self.eval_stats["prompt_eval_seconds"] += prompt_eval_seconds
+            self.eval_stats["load_seconds"] += result.get("load_duration", 0) / 1e9
+        logger.debug("%s evaluated %d prompt tokens in %.3fs", self.model, prompt_tokens, prompt_eval_seconds)
+    
+    def prompt_eval_stats(self) -> dict:
+        """Prompt tokens evaluated and time spent on them, in total and per request"""
+        with self._stats_lock:
+            stats = dict(self.eval_stats)
+        requests = stats["requests"] or 1
+        stats["avg_prompt_tokens"] = stats["prompt_tokens"] / requests
+        stats["avg_prompt_eval_seconds"] = stats["prompt_eval_seconds"] / requests
+        return stats
+    
+    def _parse_response(self, response) -> str:
+        if response.status_code == 200:
+            result = response.json()
+            self._record_eval(result)
+            return result.get("message", {}).get("content") or "No response generated"
+        return self._fail(f"Error: Ollama returned status {response.status_code}")
+    
+    def _parse_stream_line(self, line) -> tuple:
+        """Parse one NDJSON line of a streaming response into (token, finished)"""
+        chunk = json.loads(line)
+        if chunk.get("error"):
+            return self._fail(f"Error querying Ollama: {chunk['error']}"), True
+        if chunk.get("done"):
+            self._record_eval(chunk)
+        return chunk.get("message", {}).get("content", ""), bool(chunk.get("done"))
     
     def query(self, query: str, context: str = "") -> str:
         """Query Ollama with optional context"""
         try:
-            if context:
-                prompt = f"{context}\n\nQuestion: {query}"
-            else:
-                prompt = query
-            
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=300
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result.get("response", "No response generated")
-            else:
-                return f"Error: Ollama returned status {response.status_code}"
+            with self.pool.lease(self.model) as lease:
+                response = lease.session.post(
+                    f"{lease.url}/api/chat",
+                    json=self._payload(query, context, False),
+                    timeout=get_timeout()
+                )
+                lease.ok = response.status_code < 500
+            return self._parse_response(response)
         except Exception as e:
+            if self.raise_errors:
+                raise
             return f"Error querying Ollama: {str(e)}"
     
+    def stream_query(self, query: str, context: str = ""):
+        """Query Ollama, yielding response tokens as they are generated"""
+        try:
+            with self.pool.lease(self.model) as lease, lease.session.post(
+                f"{lease.url}/api/chat",
+                json=self._payload(query, context, True),
+                stream=True,
+                timeout=get_timeout()
+            ) as response:
+                lease.ok = response.status_code < 500
+                if response.status_code == 200:
+                    # Ollama streams one JSON object per line until "done" is set
+                    for line in response.iter_lines(chunk_size=None):
+                        if not line:
+                            continue
+                        token, finished = self._parse_stream_line(line)
+                        if token:
+                            yield token
+                        if finished:
+                            return
+            if response.status_code != 200:
+                yield self._fail(f"Error: Ollama returned status {response.status_code}")
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            yield f"Error querying Ollama: {str(e)}"
+    
+    async def aquery(self, query: str, context: str = "") -> str:
+        """Query Ollama without blocking the event loop"""
+        try:
+            with self.pool.lease(self.model) as lease:
+                response = await get_async_client().post(
+                    f"{lease.url}/api/chat",
+                    json=self._payload(query, context, False)
+                )
+                lease.ok = response.status_code < 500
+            return self._parse_response(response)
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            return f"Error querying Ollama: {str(e)}"
+    
+    async def astream_query(self, query: str, context: str = ""):
+        """Query Ollama without blocking the event loop, yielding tokens as they are generated"""
+        try:
+            with self.pool.lease(self.model) as lease:
+                async with get_async_client().stream(
+                    "POST",
+                    f"{lease.url}/api/chat",
+                    json=self._payload(query, context, True)
+                ) as response:
+                    lease.ok = response.status_code < 500
+                    if response.status_code == 200:
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            token, finished = self._parse_stream_line(line)
+                            if token:
+                                yield token
+                            if finished:
+                                return
+            if response.status_code != 200:
+                yield self._fail(f"Error: Ollama returned status {response.status_code}")
+        except Exception as e:
+            if self.raise_errors:
+                raise
+            yield f"Error querying Ollama: {str(e)}"
+    
     @staticmethod
     def is_available() -> bool:
-        """Check if Ollama is available"""
-        try:
-            response = requests.get(
-                f"{Config.OLLAMA_BASE_URL}/api/tags",
-                timeout=2
-            )
-            return response.status_code == 200
-        except:
-            return False
+        """Check if any configured Ollama server is available"""
+        return any(fetch_json(url, "/api/tags") is not None for url in Config.OLLAMA_BASE_URLS)
     
     @staticmethod
     def get_available_models() -> list:
-        """Get available models from Ollama"""
-        try:
-            response = requests.get(
-                f"{Config.OLLAMA_BASE_URL}/api/tags",
-                timeout=2
-            )
-            if response.status_code == 200:
-                models = response.json().get("models", [])
-                return [model["name"].split(":")[0] for model in models]
-            return []
-        except:
-            return []
+        """Get available models from the configured Ollama servers"""
+        models = []
+        for url in Config.OLLAMA_BASE_URLS:
+            tags = fetch_json(url, "/api/tags")
+            for model in (tags or {}).get("models", []):
+                name = model["name"].split(":")[0]
+                if name not in models:
+                    models.append(name)
+        return models
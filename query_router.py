@@ -0,0 +1,289 @@
+import re
+import threading
+from collections import Counter
+from typing import Optional
+from database import NAME_WORD_PATTERN
+
+# Longest student or course name (in words) looked for in a question
+MAX_PHRASE_WORDS = 6
+
+# Questions asking for judgement rather than a stored fact always go to the LLM
+ANALYSIS_WORDS = frozenset({
+    "advice", "analyse", "analysis", "analyze", "better", "compare", "comparison", "explain",
+    "improve", "insight", "insights", "need", "needs", "performance", "plan", "predict",
+    "prerequisite", "prerequisites", "recommend", "should", "suggest", "why", "worse"
+})
+
+# Negations, aggregates, filters and hypotheticals change what a lookup would return
+NEGATION_WORDS = frozenset({
+    "cannot", "dont", "doesnt", "except", "excluding", "isnt", "neither", "never", "no",
+    "nobody", "none", "nor", "not", "t", "without"
+})
+AGGREGATE_WORDS = frozenset({
+    "above", "among", "average", "below", "between", "both", "each", "either", "every",
+    "fewer", "greater", "least", "less", "mean", "median", "more", "most", "only", "over",
+    "per", "rank", "ranked", "ranking", "sum", "than", "total", "under"
+})
+CONDITIONAL_WORDS = frozenset({
+    "assume", "assuming", "could", "hypothetically", "if", "might", "suppose", "supposing",
+    "unless", "will", "would"
+})
+FALLBACK_WORDS = ANALYSIS_WORDS | NEGATION_WORDS | AGGREGATE_WORDS | CONDITIONAL_WORDS
+
+# Words that only frame a question. Every other word must be part of a matched name or
+# of the one intent answered, so a question asking for anything more goes to the LLM.
+# "a" is missing on purpose: it may be a grade.
+FILLER_WORDS = frozenset({
+    "an", "and", "are", "can", "class", "course", "did", "do", "does", "for", "get", "give",
+    "has", "have", "her", "his", "i", "in", "is", "list", "me", "of", "please", "show",
+    "tell", "the", "their", "to", "what", "which", "who", "you"
+})
+
+STUDENT_FIELD_WORDS = {
+    "gpa": ("gpa",),
+    "major": ("major", "majoring", "studying"),
+    "email": ("email", "e-mail", "contact", "address"),
+    "grades": ("grade", "grades", "scored", "score", "scores"),
+    "courses": ("course", "courses", "class", "classes", "enrolled", "take", "takes", "taking")
+}
+
+# Course intents in priority order: (words that select the intent, other words it allows)
+COURSE_INTENT_WORDS = {
+    "course_instructor": ({"teach", "teaches", "teaching", "instructor", "professor", "taught"}, {"by"}),
+    "course_enrollment": ({"students", "student", "enrolled", "enrollment", "taking"}, {"how", "many"}),
+    "course_credits": ({"credit", "credits"}, {"how", "many", "worth"}),
+    "course_info": ({"about", "describe", "description", "info", "information"}, set())
+}
+GRADE_LISTING_WORDS = frozenset({"all", "got", "grade", "grades", "list", "received", "student", "students", "which", "who"})
+GPA_EXTREME_WORDS = frozenset({"best", "gpa", "highest", "lowest", "student", "top"})
+
+GRADE_PATTERN = re.compile(r"[abcdf][+-]?")
+
+# Words that flip or bound an answer; otherwise near-identical questions differing in them
+# ("enrolled" / "not enrolled", "highest" / "lowest") must not share one
+CONTRAST_WORDS = NEGATION_WORDS | frozenset({
+    "above", "after", "before", "below", "best", "bottom", "fewer", "first", "greater",
+    "highest", "last", "least", "less", "lowest", "max", "maximum", "min", "minimum", "more",
+    "most", "over", "top", "under", "worst"
+})
+# Capital grade letters as written in a question ("an A in CS101"), and standalone numbers
+GRADE_MENTION_PATTERN = re.compile(r"(?<![\w+-])[ABCDF][+-]?(?![\w+-])")
+NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+
+def normalize(text: str) -> list:
+    """Lowercase a question and split it into words, dropping possessive 's"""
+    text = text.lower().replace("’", "'").replace("'s", "")
+    return NAME_WORD_PATTERN.findall(text)
+
+
+class QueryRouter:
+    """Answer pure lookup questions directly from the database, bypassing the LLM"""
+
+    def __init__(self, db):
+        self.db = db
+        self.hits = 0
+        self.misses = 0
+        self.hits_by_intent = Counter()
+        self._lock = threading.Lock()
+
+    def _find_student(self, phrase: str) -> Optional[str]:
+        """Resolve a phrase to a student only when the name is unambiguous"""
+        student_ids = self.db.find_students_by_name(phrase)
+        return student_ids[0] if len(student_ids) == 1 else None
+
+    def _find_course(self, phrase: str) -> Optional[str]:
+        if " " not in phrase and self.db.get_course_info(phrase.upper()) is not None:
+            return phrase.upper()
+        course_ids = self.db.find_courses_by_name(phrase)
+        return course_ids[0] if len(course_ids) == 1 else None
+
+    def _match(self, words: list, resolve, used: Optional[set] = None) -> list:
+        """Find phrases resolving to records in the question, longest first, without overlaps.
+
+        Positions of the matched words are added to used.
+        """
+        matches = []
+        used = set() if used is None else used
+        for size in range(min(MAX_PHRASE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                span = set(range(start, start + size))
+                if span & used:
+                    continue
+                record_id = resolve(" ".join(words[start:start + size]))
+                if record_id is not None and record_id not in matches:
+                    matches.append(record_id)
+                    used |= span
+        return matches
+
+    def extract_entities(self, question: str) -> tuple:
+        """Return (student_ids, course_ids) mentioned in a question"""
+        words = normalize(question)
+        return self._match(words, self._find_student), self._match(words, self._find_course)
+
+    @staticmethod
+    def key_terms(question: str) -> frozenset:
+        """Negations, comparisons, grade letters and numbers in a question"""
+        words = normalize(question)
+        terms = {word for word in words if word in CONTRAST_WORDS}
+        terms.update(GRADE_MENTION_PATTERN.findall(question))
+        # Lowercase letters count as grades only right before "grade(s)", e.g. "b grades"
+        terms.update(word.upper() for word, after in zip(words, words[1:])
+                     if GRADE_PATTERN.fullmatch(word) and after in ("grade", "grades"))
+        terms.update(f"#{number}" for number in NUMBER_PATTERN.findall(question))
+        return frozenset(terms)
+
+    def route(self, question: str) -> Optional[str]:
+        """Answer a lookup question from the database, or return None to fall back to the LLM"""
+        intent, answer = self._answer(question)
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.hits_by_intent[intent] += 1
+        return answer
+
+    def stats(self) -> dict:
+        """Hit/miss counts showing how much LLM traffic the router saves"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "hits_by_intent": dict(self.hits_by_intent)
+            }
+
+    @staticmethod
+    def _fully_consumed(words: list, used: set, allowed: set) -> bool:
+        """True when every word is part of a matched name, filler, or allowed by the intent"""
+        return all(position in used or word in FILLER_WORDS or word in allowed
+                   for position, word in enumerate(words))
+
+    def _answer(self, question: str) -> tuple:
+        words = normalize(question)
+        word_set = set(words)
+        if word_set & FALLBACK_WORDS:
+            return None, None
+
+        used = set()
+        student_ids = self._match(words, self._find_student, used)
+        course_ids = self._match(words, self._find_course, used)
+
+        if not student_ids and not course_ids:
+            # A grade letter right before "grade(s)", e.g. "Which students got B+ grades?"
+            grades = {position for position, word in enumerate(words[:-1])
+                      if GRADE_PATTERN.fullmatch(word) and words[position + 1] in ("grade", "grades")}
+            if (len(grades) == 1 and ({"list", "all", "which", "who"} & word_set)
+                    and self._fully_consumed(words, grades, GRADE_LISTING_WORDS)):
+                return "grade_listing", self._answer_grade_listing(words[grades.pop()].upper())
+            if ("gpa" in word_set and ({"highest", "lowest", "best", "top"} & word_set)
+                    and not {"highest", "lowest"} <= word_set
+                    and self._fully_consumed(words, used, GPA_EXTREME_WORDS)):
+                return "gpa_extreme", self._answer_gpa_extreme("lowest" not in word_set)
+            return None, None
+
+        if len(student_ids) == 1 and len(course_ids) <= 1:
+            fields = [field for field, keywords in STUDENT_FIELD_WORDS.items()
+                      if word_set.intersection(keywords)]
+            # Grades already name the courses, and a named course is context, not a request
+            if "courses" in fields and ("grades" in fields or course_ids):
+                fields.remove("courses")
+            allowed = {word for keywords in STUDENT_FIELD_WORDS.values() for word in keywords}
+            if fields and self._fully_consumed(words, used, allowed):
+                return "student_lookup", self._answer_student(student_ids[0], fields, course_ids)
+            return None, None
+
+        if len(course_ids) == 1 and not student_ids:
+            for intent, (triggers, extras) in COURSE_INTENT_WORDS.items():
+                if not triggers & word_set:
+                    continue
+                # Only the first matching intent is answered; words of another one fall back
+                if not self._fully_consumed(words, used, triggers | extras):
+                    return None, None
+                course_id = course_ids[0]
+                if intent == "course_instructor":
+                    return intent, self._answer_course(course_id, ["instructor"])
+                if intent == "course_enrollment":
+                    return intent, self._answer_enrollment(course_id, "many" in word_set)
+                if intent == "course_credits":
+                    return intent, self._answer_course(course_id, ["credits"])
+                return intent, self._answer_course(course_id, ["instructor", "credits", "description"])
+
+        return None, None
+
+    def _answer_student(self, student_id: str, fields: list, course_ids: list) -> str:
+        info = self.db.get_student_info(student_id)
+        lines = [f"{info['name']} ({student_id}):"]
+        for field in fields:
+            if field == "gpa":
+                lines.append(f"- GPA: {info['gpa']}")
+            elif field == "major":
+                lines.append(f"- Major: {info['major']}")
+            elif field == "email":
+                lines.append(f"- Email: {info['email']}")
+            elif field == "courses":
+                lines.append(f"- Enrolled Courses: {', '.join(info['courses'])}")
+            elif field == "grades":
+                grades = info["grades"]
+                if course_ids:
+                    grade = grades.get(course_ids[0])
+                    lines.append(f"- Grade in {course_ids[0]}: {grade}" if grade
+                                 else f"- Not enrolled in {course_ids[0]}")
+                else:
+                    lines.append("- Grades: " + ", ".join(f"{course}: {grade}" for course, grade in grades.items()))
+        return "\n".join(lines)
+
+    def _answer_course(self, course_id: str, fields: list) -> str:
+        info = self.db.get_course_info(course_id)
+        lines = [f"{course_id}: {info['name']}"]
+        for field in fields:
+            lines.append(f"- {field.capitalize()}: {info[field]}")
+        return "\n".join(lines)
+
+    def _answer_enrollment(self, course_id: str, count_only: bool) -> str:
+        info = self.db.get_course_info(course_id)
+        enrolled = [(student_id, self.db.get_student_info(student_id)["name"])
+                    for student_id in self.db.find_students_by_course(course_id)]
+        if count_only:
+            return f"{len(enrolled)} students are enrolled in {course_id} ({info['name']})."
+        if not enrolled:
+            return f"No students are enrolled in {course_id} ({info['name']})."
+        lines = [f"Students enrolled in {course_id} ({info['name']}):"]
+        lines.extend(f"- {name} ({student_id})" for student_id, name in enrolled)
+        return "\n".join(lines)
+
+    def _answer_grade_listing(self, grade: str) -> str:
+        matches = [(self.db.get_student_info(student_id)["name"], student_id, course_id)
+                   for student_id, course_id in self.db.find_grades(grade)]
+        if not matches:
+            return f"There are no {grade} grades in the database."
+        lines = [f"{grade} grades in the database:"]
+        lines.extend(f"- {name} ({student_id}): {course_id}" for name, student_id, course_id in matches)
+        return "\n".join(lines)
+
+    def _answer_gpa_extreme(self, highest: bool) -> str:
+        students = self._gpa_extreme(highest)
+        if not students:
+            return "There are no students in the database."
+        label = "highest" if highest else "lowest"
+        names = [f"{info['name']} ({student_id})" for student_id, info in students]
+        gpa = students[0][1]["gpa"]
+        if len(names) == 1:
+            return f"{names[0]} has the {label} GPA: {gpa}."
+        # A tie names everyone on it, not whichever student the ranking listed first
+        return f"{', '.join(names[:-1])} and {names[-1]} share the {label} GPA: {gpa}."
+
+    def _gpa_extreme(self, highest: bool) -> list:
+        """(student_id, info) of every student tied on the highest or lowest GPA, in ID order"""
+        limit = 2
+        while True:
+            students = [(student_id, self.db.get_student_info(student_id))
+                        for student_id in self.db.find_top_students_by_gpa(limit, highest)]
+            # A full page ending on the extreme GPA may have more ties past it
+            if len(students) < limit or students[-1][1]["gpa"] != students[0][1]["gpa"]:
+                break
+            limit *= 2
+        return sorted(((student_id, info) for student_id, info in students
+                       if info["gpa"] == students[0][1]["gpa"]), key=lambda student: student[0])
@@ -11,7 +11,12 @@ from typing import Dict, List, Tuple
 from rag_engine import RAGEngine
 from gemini_provider import GeminiProvider
 from ollama_provider import OllamaProvider
-from database import Database
+from failover_provider import FailoverProvider
+from database import get_database
+from benchmark import LoadBenchmark
+from fake_llm_server import FakeBehaviour, FakeGeminiClient, FakeLLMServer
+from rate_limiter import Unlimited
+from config import configure_logging
 
 # ============================================
 # COMMON TEST QUESTIONS
@@ -46,13 +51,15 @@ class TestResults:
         }
 
     def add_result(self, provider: str, question: str, response: str,
-                   latency: float, success: bool):
-        """Add a test result"""
+                   latency: float, success: bool, cache_hit: bool = False, rate_limit_wait: float = 0.0):
+        """Add a test result; latency excludes rate_limit_wait, the time held back by the rate limiter"""
         self.results[provider].append({
             "question": question,
             "response": response,
             "latency": latency,
+            "rate_limit_wait": rate_limit_wait,
             "success": success,
+            "cache_hit": cache_hit,
             "timestamp": datetime.now().isoformat()
         })
 
@@ -73,6 +80,7 @@ class TestResults:
             "success_rate": f"{(successful/len(results)*100):.1f}%",
             "total_latency": f"{total_latency:.2f}s",
             "avg_latency": f"{avg_latency:.2f}s",
+            "cache_hits": sum(1 for r in results if r.get("cache_hit")),
             "total_response_length": sum(len(r["response"]) for r in results)
         }
 
@@ -103,7 +111,7 @@ class ProviderTester:
     """Test and compare AI providers"""
 
     def __init__(self):
-        self.db = Database()
+        self.db = get_database()
         self.results = TestResults()
         self.available_providers = RAGEngine.get_available_providers()
 
@@ -130,8 +138,8 @@ class ProviderTester:
         return availability
 
     def test_single_provider(self, provider: str, questions: List[str] = None,
-                            ollama_model: str = None) -> Dict:
-        """Test a single provider with questions"""
+                            ollama_model: str = None, max_workers: int = None) -> Dict:
+        """Test a single provider with questions, answering up to max_workers concurrently"""
 
         if questions is None:
             questions = TEST_QUESTIONS
@@ -149,29 +157,67 @@ class ProviderTester:
             # Initialize RAG engine
             rag = RAGEngine(provider_type=provider, ollama_model=ollama_model)
 
-            # Test each question
-            for i, question in enumerate(questions, 1):
-                print(f"\n[{i}/{len(questions)}] Question: {question}")
-                print("-" * 70)
-
-                start_time = time.time()
+            # Answer all questions concurrently; results come back in question order
+            start_time = time.time()
+            results = rag.query_batch(questions, max_workers)
+            wall_time = time.time() - start_time
 
-                try:
-                    response = rag.query(question)
-                    latency = time.time() - start_time
-                    success = True
+            for i, result in enumerate(results, 1):
+                print(f"\n[{i}/{len(questions)}] Question: {result['question']}")
+                print("-" * 70)
 
+                response = result["response"]
+                latency = result["latency"]
+                wait = result["rate_limit_wait"]
+                details = f", {result['prompt_tokens']} prompt tokens" if result["prompt_tokens"] is not None else ""
+                if wait >= 0.005:
+                    details += f", {wait:.2f}s rate-limited"
+                if result["success"]:
                     # Show response
-                    print(f"Response ({latency:.2f}s):")
+                    source = {"cache": " from cache", "semantic_cache": " from semantic cache"}.get(result["source"], "")
+                    print(f"Response ({latency:.2f}s{source}{details}):")
                     print(response[:300] + "..." if len(response) > 300 else response)
-
-                    self.results.add_result(provider, question, response, latency, success)
-
-                except Exception as e:
-                    latency = time.time() - start_time
-                    error_msg = str(e)
-                    print(f"❌ ERROR ({latency:.2f}s): {error_msg}")
-                    self.results.add_result(provider, question, error_msg, latency, False)
+                    self.results.add_result(provider, result["question"], response, latency, True,
+                                            result["cache_hit"], wait)
+                else:
+                    print(f"❌ ERROR ({latency:.2f}s{details}): {result['error']}")
+                    self.results.add_result(provider, result["question"], result["error"], latency, False,
+                                            rate_limit_wait=wait)
+
+            print(f"\n⏱️  {len(questions)} questions answered in {wall_time:.2f}s")
+
+            if rag.router:
+                stats = rag.router.stats()
+                print(f"\n🧭 Query router: {stats['hits']} answered directly, "
+                      f"{stats['misses']} sent to the LLM ({stats['hit_rate']*100:.1f}% saved)")
+            if isinstance(rag.provider, FailoverProvider):
+                stats = rag.provider.stats()
+                print(f"\n🔀 {stats['mode'].capitalize()} decisions: {stats['decisions']}")
+                for name, provider_stats in stats["providers"].items():
+                    print(f"   {name}: {provider_stats}")
+            if isinstance(rag.provider, OllamaProvider):
+                stats = rag.provider.prompt_eval_stats()
+                print(f"\n🦙 Ollama prompt eval: {stats['avg_prompt_tokens']:.0f} tokens and "
+                      f"{stats['avg_prompt_eval_seconds']*1000:.0f}ms per request "
+                      f"over {stats['requests']} requests")
+            if isinstance(rag.provider, GeminiProvider):
+                stats = rag.provider.context_cache_stats()
+                print(f"\n📌 Gemini context cache: {stats['created']} created, {stats['reused']} reused, "
+                      f"{stats['inline']} sent inline, {stats['failures']} failures")
+            if rag.single_flight:
+                stats = rag.single_flight.stats()
+                print(f"🤝 Single-flight: {stats['calls']} provider calls, {stats['coalesced']} coalesced "
+                      f"({stats['coalesced_rate']*100:.1f}% of requests)")
+            if rag.cache:
+                stats = rag.cache.stats()
+                print(f"💾 Response cache: {stats['hits']} hits, {stats['misses']} misses "
+                      f"({stats['hit_rate']*100:.1f}% hit rate, {stats['entries']} entries)")
+            if rag.semantic_cache:
+                stats = rag.semantic_cache.stats()
+                print(f"🧠 Semantic cache: {stats['hits']} hits, {stats['misses']} misses "
+                      f"({stats['hit_rate']*100:.1f}% hit rate, {stats['invalidations']} invalidated)")
+                for bucket, count in stats["similarity_histogram"].items():
+                    print(f"   similarity {bucket}: {count}")
 
             return self.results.get_summary(provider)
 
@@ -179,6 +225,71 @@ class ProviderTester:
             print(f"\n❌ PROVIDER INITIALIZATION ERROR: {str(e)}")
             return {"error": str(e)}
 
+    def run_benchmark(self, provider: str, questions: List[str] = None, ollama_model: str = None,
+                      concurrency: int = None, rate: float = None, duration: float = None,
+                      warmup: float = None, stream: bool = True, use_cache: bool = True,
+                      output: str = None, fake_behaviour: FakeBehaviour = None) -> Dict:
+        """Load-test one provider and save the results as JSON and CSV.
+
+        With fake_behaviour the provider talks to a local fake backend instead of the real
+        service, which measures the pipeline's own overhead without network or API keys.
+        """
+        if questions is None:
+            questions = TEST_QUESTIONS
+
+        fake_server = None
+        fake_provider = None
+        if fake_behaviour is not None:
+            if provider == "ollama":
+                fake_server = FakeLLMServer(behaviour=fake_behaviour).start()
+                fake_provider = OllamaProvider(ollama_model, base_urls=[fake_server.url])
+            else:
+                fake_provider = GeminiProvider(client=FakeGeminiClient(fake_behaviour))
+        rag = RAGEngine(provider_type=provider, ollama_model=ollama_model, provider=fake_provider)
+        if fake_provider is not None:
+            # The real service's rate limit would hide the overhead being measured
+            rag.rate_limiter = Unlimited()
+        if not use_cache:
+            # Measure the provider itself rather than cache lookups and routed answers
+            rag.cache = None
+            rag.semantic_cache = None
+            rag.router = None
+        benchmark = LoadBenchmark(rag, questions, concurrency, rate, duration, warmup, stream)
+
+        print("\n" + "="*70)
+        print(f"🏋️  BENCHMARKING {provider.upper()} ({rag.provider.model_name})")
+        print("="*70)
+        print(f"Mode: {benchmark.mode} loop • concurrency {benchmark.concurrency}"
+              + (f" • {benchmark.rate:g} req/s" if benchmark.rate else "")
+              + f" • warmup {benchmark.warmup:g}s • duration {benchmark.duration:g}s")
+
+        try:
+            summary = benchmark.run()
+        finally:
+            if fake_server is not None:
+                fake_server.stop()
+
+        def ms(value):
+            return f"{value*1000:.0f}ms" if value is not None else "-"
+
+        print(f"\nRequests: {summary['requests']} ({summary['errors']} errors, "
+              f"{summary['error_rate']*100:.1f}% error rate, {summary['cache_hits']} cache hits)")
+        print(f"Throughput: {summary['throughput']:.2f} req/s")
+        for name in ("latency", "ttft"):
+            stats = summary[name]
+            print(f"{name.upper():8} p50 {ms(stats['p50'])} • p90 {ms(stats['p90'])} • "
+                  f"p99 {ms(stats['p99'])} • max {ms(stats['max'])}")
+        if len(summary["by_source"]) > 1:
+            print("By source:")
+            for source, stats in summary["by_source"].items():
+                latency = stats["latency"]
+                print(f"  {source:15} {stats['successes']:6} ok • {stats['throughput']:8.2f} req/s • "
+                      f"latency p50 {ms(latency['p50'])} • p90 {ms(latency['p90'])} • p99 {ms(latency['p99'])}")
+
+        output = output or f"benchmark_{provider}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        print(f"\n💾 Results saved to: {benchmark.save_json(output + '.json')} and {benchmark.save_csv(output + '.csv')}")
+        return summary
+
     def test_all_providers(self, questions: List[str] = None) -> Dict:
         """Test all available providers"""
 
@@ -243,6 +354,12 @@ class ProviderTester:
                 ollama_summary["avg_latency"]
             ))
 
+            print("{:<20} {:<20} {:<20}".format(
+                "Cache Hits",
+                gemini_summary["cache_hits"],
+                ollama_summary["cache_hits"]
+            ))
+
             print("{:<20} {:<20} {:<20}".format(
                 "Total Latency",
                 gemini_summary["total_latency"],
@@ -478,6 +595,51 @@ def quick_test():
     except Exception as e:
         print(f"❌ Ollama Error: {e}")
 
+# ============================================
+# BENCHMARK (COMMAND LINE)
+# ============================================
+
+def benchmark_cli(args: List[str]):
+    """Run ProviderTester.run_benchmark with options from the command line"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="rag_application.py --benchmark",
+                                     description="Load-test a provider through RAGEngine")
+    parser.add_argument("provider", nargs="?", help="gemini or ollama (default: first available)")
+    parser.add_argument("--model", help="Ollama model")
+    parser.add_argument("--concurrency", type=int, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, help="requests per second (open loop); omit for closed loop")
+    parser.add_argument("--duration", type=float, help="seconds measured")
+    parser.add_argument("--warmup", type=float, help="seconds run before measuring")
+    parser.add_argument("--no-stream", action="store_true", help="use query instead of stream_query (no TTFT)")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response and semantic caches and the query router")
+    parser.add_argument("--questions", help="file with one question per line (default: TEST_QUESTIONS)")
+    parser.add_argument("--output", help="output path without extension")
+    parser.add_argument("--fake", action="store_true", help="answer from a local fake backend (no API key or Ollama)")
+    parser.add_argument("--fake-latency-ms", type=float, default=200, help="fake median first-token latency")
+    parser.add_argument("--fake-tokens-per-second", type=float, default=50, help="fake generation speed")
+    parser.add_argument("--fake-error-rate", type=float, default=0, help="fraction of fake requests that fail")
+    options = parser.parse_args(args)
+
+    tester = ProviderTester()
+    fake_behaviour = None
+    if options.fake:
+        fake_behaviour = FakeBehaviour("lognormal", options.fake_latency_ms, 0.5, options.fake_tokens_per_second,
+                                       options.fake_error_rate, seed=0)
+        tester.available_providers = ["gemini", "ollama"]
+    provider = options.provider or (tester.available_providers[0] if tester.available_providers else None)
+    if provider not in tester.available_providers:
+        print(f"❌ Provider not available: {provider}")
+        return
+    questions = None
+    if options.questions:
+        with open(options.questions) as f:
+            questions = [line.strip() for line in f if line.strip()]
+
+    tester.run_benchmark(provider, questions, options.model, options.concurrency, options.rate,
+                         options.duration, options.warmup, not options.no_stream, not options.no_cache,
+                         options.output, fake_behaviour)
+
 # ============================================
 # ENTRY POINT
 # ============================================
@@ -485,6 +647,8 @@ def quick_test():
 if __name__ == "__main__":
     import sys
 
+    configure_logging()
+
     # Check for command line arguments
     if len(sys.argv) > 1:
         if sys.argv[1] == "--quick":
@@ -498,8 +662,13 @@ if __name__ == "__main__":
             print(f"\n💾 Results saved to: {filename}")
         elif sys.argv[1] == "--interactive":
             interactive_test()
+        elif sys.argv[1] == "--benchmark":
+            benchmark_cli(sys.argv[2:])
+        elif sys.argv[1] == "--compare-results":
+            from compare_results import main as compare_results
+            sys.exit(compare_results(sys.argv[2:]))
         else:
-            print("Unknown option. Use --quick, --compare, or --interactive")
+            print("Unknown option. Use --quick, --compare, --interactive, --benchmark or --compare-results")
     else:
         # Run main interactive menu
         main()
\ No newline at end of file
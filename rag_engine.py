@@ -1,27 +1,333 @@
-from database import Database
+import asyncio
+import logging
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from database import get_database
 from prompts import Prompts
+from retriever import Retriever
+from query_router import QueryRouter
+from response_cache import get_response_cache, make_cache_key
+from rate_limiter import Unlimited, get_rate_limiter
+from single_flight import get_single_flight
+from token_budget import count_tokens, get_token_budget
+from config import Config
 from gemini_provider import GeminiProvider
 from ollama_provider import OllamaProvider
+from failover_provider import FailoverProvider
+
+logger = logging.getLogger(__name__)
+
+# Providers report failures as response text; these are never cached
+ERROR_PREFIXES = ("Error querying", "Error: ")
+
+
+def is_error_response(response: str) -> bool:
+    """Check whether a provider response is an error message rather than an answer"""
+    return response.startswith(ERROR_PREFIXES)
+
+
+# One semaphore per event loop caps the provider calls in flight
+_async_limiters = weakref.WeakKeyDictionary()
+
+
+def get_async_limiter() -> asyncio.Semaphore:
+    """Get the concurrency limiter for the running event loop"""
+    loop = asyncio.get_running_loop()
+    limiter = _async_limiters.get(loop)
+    if limiter is None:
+        limiter = _async_limiters[loop] = asyncio.Semaphore(Config.ASYNC_MAX_CONCURRENCY)
+    return limiter
+
+
+class TokenStream:
+    """Response tokens from RAGEngine.stream_query, timing the first token separately from the whole response"""
+    
+    def __init__(self, tokens, source: str = "provider", on_complete=None, start: float = None):
+        self.source = source
+        self.cache_hit = source in ("cache", "semantic_cache")
+        self.ttft = None
+        self.latency = None
+        self.rate_limit_wait = 0.0
+        self.failed = False
+        self.parts = []
+        self._tokens = tokens
+        self._on_complete = on_complete
+        self._start = time.perf_counter() if start is None else start
+    
+    def __iter__(self):
+        for token in self._tokens:
+            if self._accept(token):
+                yield token
+        self._finish()
+    
+    async def __aiter__(self):
+        if hasattr(self._tokens, "__aiter__"):
+            async for token in self._tokens:
+                if self._accept(token):
+                    yield token
+        else:
+            for token in self._tokens:
+                if self._accept(token):
+                    yield token
+        self._finish()
+    
+    def exclude_wait(self, seconds: float):
+        """Leave time held back by the rate limiter out of ttft and latency"""
+        self.rate_limit_wait += seconds
+        self._start += seconds
+    
+    def _accept(self, token: str) -> bool:
+        if not token:
+            return False
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._start
+        # Providers yield an error message as its own token when generation fails
+        if is_error_response(token):
+            self.failed = True
+        self.parts.append(token)
+        return True
+    
+    def _finish(self):
+        self.latency = time.perf_counter() - self._start
+        if self._on_complete and not self.failed:
+            self._on_complete(self.text)
+    
+    @property
+    def text(self) -> str:
+        """Response received so far"""
+        return "".join(self.parts)
+
+
+def create_provider(provider_type: str, ollama_model: str = None, raise_errors: bool = False):
+    """Create a provider by type"""
+    if provider_type == "gemini":
+        return GeminiProvider(raise_errors=raise_errors)
+    if provider_type == "ollama":
+        return OllamaProvider(ollama_model, raise_errors=raise_errors)
+    raise ValueError(f"Unknown provider: {provider_type}")
+
 
 class RAGEngine:
     """Main RAG engine that coordinates providers and database"""
     
-    def __init__(self, provider_type: str = "gemini", ollama_model: str = None):
-        self.db = Database()
-        self.db_context = self.db.format_as_context()
-        self.system_prompt = Prompts.get_system_prompt(self.db_context)
+    def __init__(self, provider_type: str = "gemini", ollama_model: str = None, fallback_provider: str = None,
+                 provider=None):
+        self.db = get_database()
+        self.retriever = Retriever(self.db)
+        self.router = QueryRouter(self.db) if Config.QUERY_ROUTER_ENABLED else None
+        self.cache = get_response_cache()
+        self.semantic_cache = None
+        if Config.SEMANTIC_CACHE_ENABLED:
+            # Imported lazily so the engine works without numpy while the semantic cache is off
+            from semantic_cache import get_semantic_cache
+
+            self.semantic_cache = get_semantic_cache(self.db)
         self.provider_type = provider_type
+        # Identical questions asked concurrently share one provider call
+        self.single_flight = get_single_flight()
         
-        if provider_type == "gemini":
-            self.provider = GeminiProvider()
-        elif provider_type == "ollama":
-            self.provider = OllamaProvider(ollama_model)
+        fallback_provider = Config.FALLBACK_PROVIDER if fallback_provider is None else fallback_provider
+        if provider is not None:
+            # A ready-made provider, e.g. one backed by fake_llm_server for offline testing
+            self.provider = provider
+        elif fallback_provider and fallback_provider != provider_type:
+            self.provider = FailoverProvider([
+                (provider_type, create_provider(provider_type, ollama_model, raise_errors=True)),
+                (fallback_provider, create_provider(fallback_provider, ollama_model, raise_errors=True))
+            ])
         else:
-            raise ValueError(f"Unknown provider: {provider_type}")
+            self.provider = create_provider(provider_type, ollama_model)
+        # A FailoverProvider applies each wrapped provider's own limiter to the calls it makes
+        self.rate_limiter = (Unlimited() if isinstance(self.provider, FailoverProvider)
+                             else get_rate_limiter(provider_type))
+        # Prompt tokens spent on everything but the retrieved records
+        self.instruction_tokens = count_tokens(Prompts.get_system_prompt(self.retriever.format_context([])))
+    
+    def build_system_prompt(self, question: str, chunks: list = None) -> str:
+        """Build the system prompt from the chunks retrieved for a question"""
+        if chunks is None:
+            chunks = self.retriever.retrieve(question, self.context_budget(question))
+        return Prompts.get_system_prompt(self.retriever.format_context(chunks))
+    
+    def context_budget(self, question: str) -> int:
+        """Tokens left for database records once instructions and the question fit the model's budget"""
+        # Providers send "Question: <question>" after the system prompt
+        question_tokens = count_tokens(f"Question: {question}")
+        return max(0, get_token_budget(self.provider.model_name) - self.instruction_tokens - question_tokens)
     
     def query(self, question: str) -> str:
         """Query the RAG system"""
-        return self.provider.query(question, self.system_prompt)
+        return self.query_detailed(question)["response"]
+    
+    def query_detailed(self, question: str) -> dict:
+        """Query the RAG system, reporting whether the router, the cache or the provider answered.
+        
+        Provider answers also report rate_limit_wait, the seconds spent held back by the rate limiter.
+        """
+        start = time.perf_counter()
+        result = self._lookup(question)
+        if result["response"] is not None:
+            return result
+        
+        def call():
+            wait = self.rate_limiter.acquire()
+            released = time.perf_counter()
+            response = self.provider.query(question, result["system_prompt"])
+            # Cached before the flight ends so later callers find it in the cache
+            self._remember(question, result, response)
+            return response, released - wait, released
+        
+        if self.single_flight:
+            response, held_from, released = self.single_flight.do(result["flight_key"], call)
+        else:
+            response, held_from, released = call()
+        return {"response": response, "source": "provider", "cache_hit": False,
+                "prompt_tokens": result["prompt_tokens"],
+                "rate_limit_wait": self._waited(start, held_from, released)}
+    
+    @staticmethod
+    def _waited(start: float, held_from: float, released: float) -> float:
+        # A caller that joined a coalesced call was only held back after it arrived
+        return max(0.0, released - max(start, held_from))
+    
+    def stream_query(self, question: str) -> TokenStream:
+        """Query the RAG system, returning a TokenStream that yields the response as it is generated"""
+        start = time.perf_counter()
+        result = self._lookup(question)
+        if result["response"] is not None:
+            return TokenStream(iter([result["response"]]), result["source"], start=start)
+        wait = self.rate_limiter.acquire()
+        tokens = self.provider.stream_query(question, result["system_prompt"])
+        stream = TokenStream(tokens, "provider", lambda response: self._remember(question, result, response), start)
+        stream.exclude_wait(wait)
+        return stream
+    
+    def query_batch(self, questions: list, max_workers: int = None) -> list:
+        """Answer questions concurrently, returning one result per question in input order.
+        
+        Each result holds the question, response, source, cache_hit, latency, rate_limit_wait,
+        prompt_tokens, success and error; failures are reported in the result instead of raised. Latency
+        leaves out rate_limit_wait, so it measures answering rather than queueing.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers or Config.BATCH_MAX_WORKERS) as executor:
+            return list(executor.map(self._query_item, questions))
+    
+    def _query_item(self, question: str) -> dict:
+        start = time.perf_counter()
+        try:
+            result = self.query_detailed(question)
+        except Exception as e:
+            result = {"response": "", "source": "error", "cache_hit": False, "error": str(e)}
+        else:
+            result["error"] = result["response"] if is_error_response(result["response"]) else None
+        wait = result.get("rate_limit_wait", 0.0)
+        return {
+            "question": question,
+            "response": result["response"],
+            "source": result["source"],
+            "cache_hit": result["cache_hit"],
+            "latency": time.perf_counter() - start - wait,
+            "rate_limit_wait": wait,
+            # Only provider calls send a prompt
+            "prompt_tokens": result.get("prompt_tokens"),
+            "success": result["error"] is None,
+            "error": result["error"]
+        }
+    
+    async def aquery(self, question: str) -> str:
+        """Query the RAG system without blocking the event loop"""
+        return (await self.aquery_detailed(question))["response"]
+    
+    async def aquery_detailed(self, question: str) -> dict:
+        """Async query_detailed; at most ASYNC_MAX_CONCURRENCY provider calls run at once"""
+        start = time.perf_counter()
+        # Routing, cache lookups (SQLite with that backend), embedding and retrieval all block
+        result = await asyncio.to_thread(self._lookup, question)
+        if result["response"] is not None:
+            return result
+        
+        async def call():
+            async with get_async_limiter():
+                wait = await self.rate_limiter.aacquire()
+                released = time.perf_counter()
+                response = await self.provider.aquery(question, result["system_prompt"])
+            self._remember(question, result, response)
+            return response, released - wait, released
+        
+        if self.single_flight:
+            response, held_from, released = await self.single_flight.ado(result["flight_key"], call)
+        else:
+            response, held_from, released = await call()
+        return {"response": response, "source": "provider", "cache_hit": False,
+                "prompt_tokens": result["prompt_tokens"],
+                "rate_limit_wait": self._waited(start, held_from, released)}
+    
+    async def astream_query(self, question: str) -> TokenStream:
+        """Async stream_query; iterate the awaited TokenStream with `async for`"""
+        start = time.perf_counter()
+        result = await asyncio.to_thread(self._lookup, question)
+        if result["response"] is not None:
+            return TokenStream(iter([result["response"]]), result["source"], start=start)
+        stream = TokenStream(None, "provider", lambda response: self._remember(question, result, response), start)
+        # Rate limited when first iterated, so the wait is excluded from the timings then
+        stream._tokens = self._limited(self.provider.astream_query(question, result["system_prompt"]),
+                                       self.rate_limiter, stream.exclude_wait)
+        return stream
+    
+    @staticmethod
+    async def _limited(tokens, rate_limiter, on_wait):
+        """Hold a concurrency slot for the whole of a streamed response"""
+        async with get_async_limiter():
+            on_wait(await rate_limiter.aacquire())
+            async for token in tokens:
+                yield token
+    
+    def _lookup(self, question: str) -> dict:
+        """Answer from the router or the caches; otherwise return the prompt to send to the provider"""
+        if self.router:
+            answer = self.router.route(question)
+            if answer is not None:
+                return {"response": answer, "source": "router", "cache_hit": False}
+        
+        budget = self.context_budget(question)
+        chunks = self.retriever.retrieve(question, budget)
+        system_prompt = self.build_system_prompt(question, chunks)
+        # Identifies the provider call, for the response cache and for single-flight coalescing
+        key = make_cache_key(self.provider_type, self.provider.model_name, question,
+                             system_prompt, self.db.version)
+        if self.cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return {"response": cached, "source": "cache", "cache_hit": True}
+        
+        if self.semantic_cache:
+            match = self.semantic_cache.lookup(self._provider_key(), question)
+            if match is not None:
+                return {"response": match[0], "source": "semantic_cache", "cache_hit": True,
+                        "similarity": match[1]}
+        
+        context_tokens = sum(chunk["tokens"] for chunk in chunks)
+        question_tokens = count_tokens(f"Question: {question}")
+        prompt_tokens = self.instruction_tokens + context_tokens + question_tokens
+        logger.debug("%s/%s prompt: %d tokens (instructions %d, context %d from %d of %d records, "
+                     "question %d), context budget %d",
+                     self.provider_type, self.provider.model_name, prompt_tokens, self.instruction_tokens,
+                     context_tokens, len(chunks), len(self.retriever.chunks), question_tokens, budget)
+        return {"response": None, "system_prompt": system_prompt, "chunks": chunks,
+                "cache_key": key if self.cache else None, "flight_key": key, "prompt_tokens": prompt_tokens}
+    
+    def _remember(self, question: str, lookup: dict, response: str):
+        """Store a provider response in the caches unless it is an error message"""
+        if is_error_response(response):
+            return
+        if lookup["cache_key"] is not None:
+            self.cache.set(lookup["cache_key"], response)
+        if self.semantic_cache:
+            self.semantic_cache.store(self._provider_key(), question, response, lookup["chunks"])
+    
+    def _provider_key(self) -> tuple:
+        return (self.provider_type, self.provider.model_name)
     
     def get_example_prompts(self) -> list:
         """Get example prompts for workshop"""
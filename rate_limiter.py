@@ -0,0 +1,71 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+from config import Config
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` calls per second with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token, returning how long to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Going negative queues callers behind the ones already waiting
+            self.tokens -= 1
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self) -> float:
+        """Block until a call is allowed, returning the seconds waited"""
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self) -> float:
+        """Wait without blocking the event loop until a call is allowed, returning the seconds waited"""
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class Unlimited:
+    """Rate limiter that never waits"""
+
+    def acquire(self) -> float:
+        return 0.0
+
+    async def aacquire(self) -> float:
+        return 0.0
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider_type: str):
+    """Get the process-wide rate limiter for a provider.
+
+    Configured by <PROVIDER>_REQUESTS_PER_MINUTE and <PROVIDER>_RATE_LIMIT_BURST.
+    """
+    limiter = _limiters.get(provider_type)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider_type)
+            if limiter is None:
+                per_minute = getattr(Config, f"{provider_type.upper()}_REQUESTS_PER_MINUTE", 0)
+                burst = getattr(Config, f"{provider_type.upper()}_RATE_LIMIT_BURST", 0)
+                limiter = TokenBucket(per_minute / 60, burst or None) if per_minute > 0 else Unlimited()
+                _limiters[provider_type] = limiter
+    return limiter
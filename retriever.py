@@ -0,0 +1,294 @@
+import copy
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Optional
+from config import Config
+from token_budget import count_tokens
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOP_WORDS = frozenset({
+    "a", "an", "and", "are", "all", "at", "by", "do", "doe", "for", "from", "how", "in",
+    "is", "it", "me", "of", "on", "or", "s", "tell", "that", "the", "their", "to",
+    "what", "which", "who", "with"
+})
+
+# BM25 tuning constants
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Past this share of changed records a refresh rebuilds everything instead of patching
+MAX_INCREMENTAL_FRACTION = 0.25
+
+
+def tokenize(text: str) -> list:
+    """Lowercase text and split it into alphanumeric terms with plurals folded"""
+    terms = (term[:-1] if len(term) > 3 and term.endswith("s") else term
+             for term in TOKEN_PATTERN.findall(text.lower()))
+    return [term for term in terms if term not in STOP_WORDS]
+
+
+class RetrievalState:
+    """Chunks and index of one build, replaced as a whole so a query never sees one half-built"""
+
+    def __init__(self, version: int, chunks: list):
+        self.version = version
+        self.chunks = chunks
+        self.positions_by_id = {chunk["id"]: position for position, chunk in enumerate(chunks)}
+        self.total_tokens = None
+        # Keyword mode: term -> [(chunk position, term frequency)] and each chunk's length
+        self.postings = None
+        self.doc_lengths = None
+        self.total_length = 0
+        self.avg_doc_length = 0.0
+        # Vector mode
+        self.record_index = None
+
+    def copy(self, version: int) -> "RetrievalState":
+        """A copy to apply changes to; postings lists are shared and must be replaced, not mutated"""
+        state = RetrievalState.__new__(RetrievalState)
+        state.__dict__.update(self.__dict__)
+        state.version = version
+        state.chunks = list(self.chunks)
+        state.positions_by_id = dict(self.positions_by_id)
+        if self.postings is not None:
+            state.postings = dict(self.postings)
+            state.doc_lengths = list(self.doc_lengths)
+        return state
+
+
+class Retriever:
+    """Split the database into chunks and select the most relevant ones for a question"""
+
+    def __init__(self, db, mode: Optional[str] = None, top_k: Optional[int] = None,
+                 max_context_tokens: Optional[int] = None):
+        self.db = db
+        self.mode = mode or Config.RETRIEVAL_MODE
+        self.top_k = top_k if top_k is not None else Config.RETRIEVAL_TOP_K
+        self.max_context_tokens = (max_context_tokens if max_context_tokens is not None
+                                   else Config.RETRIEVAL_MAX_CONTEXT_TOKENS)
+        if self.mode not in ("keyword", "vector", "full"):
+            raise ValueError(f"Unknown retrieval mode: {self.mode}")
+        self.embedder = None
+        self.state = None
+        self._build_lock = threading.Lock()
+        self.build()
+
+    @property
+    def chunks(self) -> list:
+        return self.state.chunks
+
+    @property
+    def built_version(self) -> int:
+        return self.state.version
+
+    @property
+    def record_index(self):
+        return self.state.record_index
+
+    def _chunk_tokens(self, chunk: dict) -> int:
+        """Token count of a chunk, counted the first time it is needed"""
+        tokens = chunk.get("tokens")
+        if tokens is None:
+            tokens = chunk["tokens"] = count_tokens(chunk["text"])
+        return tokens
+
+    def build(self):
+        """Build per-student and per-course chunks and the keyword or vector index.
+
+        Everything is built aside and swapped in with one assignment, so queries running
+        meanwhile keep using the previous build.
+        """
+        version = getattr(self.db, "version", 0)
+        # Token counts are filled in lazily; only "full" mode needs them all up front
+        state = RetrievalState(version, [
+            {"id": record_id, "type": record_type, "text": text, "tokens": None}
+            for record_id, record_type, text in self.db.iter_records()
+        ])
+        if self.mode == "full":
+            state.total_tokens = sum(self._chunk_tokens(chunk) for chunk in state.chunks)
+
+        if self.mode == "vector":
+            # Imported lazily so keyword retrieval works without numpy/faiss installed
+            from embeddings import get_embedder
+            from vector_index import RecordIndex
+
+            # Loading a model is slow, so one embedder serves every rebuild
+            if self.embedder is None:
+                self.embedder = get_embedder()
+            # Fitting learns from the corpus; the previous build keeps the copy it was fitted with
+            embedder = copy.copy(self.embedder) if hasattr(self.embedder, "fit") else self.embedder
+            previous = self.state.record_index if self.state is not None else None
+            state.record_index = RecordIndex(embedder, store=previous.store if previous else None)
+            state.record_index.build((chunk["id"], chunk["type"], chunk["text"]) for chunk in state.chunks)
+            self.state = state
+            return
+
+        state.postings = defaultdict(list)
+        state.doc_lengths = []
+        for position, chunk in enumerate(state.chunks):
+            terms = Counter(tokenize(chunk["text"]))
+            state.doc_lengths.append(sum(terms.values()))
+            for term, frequency in terms.items():
+                state.postings[term].append((position, frequency))
+        state.postings = dict(state.postings)
+        state.total_length = sum(state.doc_lengths)
+        state.avg_doc_length = state.total_length / len(state.doc_lengths) if state.doc_lengths else 0.0
+        self.state = state
+
+    @staticmethod
+    def _update_postings(state: RetrievalState, position: int, old_text: Optional[str], text: str):
+        """Re-index one chunk's terms in a copied state; old_text is None for a new chunk.
+
+        A changed term's postings list is replaced rather than mutated, since the lists
+        are shared with the state queries are still using.
+        """
+        old_terms = Counter(tokenize(old_text)) if old_text is not None else Counter()
+        new_terms = Counter(tokenize(text))
+        length = sum(new_terms.values())
+        if old_text is None:
+            state.doc_lengths.append(length)
+        else:
+            state.total_length -= state.doc_lengths[position]
+            state.doc_lengths[position] = length
+        state.total_length += length
+        state.avg_doc_length = state.total_length / len(state.doc_lengths)
+        for term in old_terms.keys() | new_terms.keys():
+            if old_terms[term] == new_terms[term]:
+                continue
+            postings = [posting for posting in state.postings.get(term, ()) if posting[0] != position]
+            if new_terms[term]:
+                postings.append((position, new_terms[term]))
+            if postings:
+                state.postings[term] = postings
+            else:
+                state.postings.pop(term, None)
+
+    def _update(self, record_ids: set, version: int):
+        """Re-render only the changed records, apply them to a copy of the state and swap it in"""
+        records = []
+        for record_id in sorted(record_ids):
+            record = self.db.render_record(record_id)
+            if record is not None:
+                records.append((record_id, *record))
+
+        state = self.state.copy(version)
+        for record_id, record_type, text in records:
+            chunk = {"id": record_id, "type": record_type, "text": text, "tokens": None}
+            position = state.positions_by_id.get(record_id)
+            old = state.chunks[position] if position is not None else None
+            if state.total_tokens is not None:
+                state.total_tokens += self._chunk_tokens(chunk) - (self._chunk_tokens(old) if old else 0)
+            if old is None:
+                position = len(state.chunks)
+                state.chunks.append(chunk)
+                state.positions_by_id[record_id] = position
+            else:
+                state.chunks[position] = chunk
+            if self.mode != "vector":
+                self._update_postings(state, position, old["text"] if old else None, text)
+
+        if self.mode == "vector":
+            # The vector index is updated in place; searches on the previous state skip
+            # records it does not have a chunk for yet
+            state.record_index.update(records)
+        self.state = state
+
+    def score(self, question: str, state: Optional[RetrievalState] = None) -> dict:
+        """Score chunks against a question with BM25, returning {position: score}"""
+        state = state or self.state
+        scores = defaultdict(float)
+        doc_count = len(state.chunks)
+        for term in set(tokenize(question)):
+            postings = state.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * state.doc_lengths[position] / state.avg_doc_length)
+                scores[position] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def refresh(self):
+        """Bring the chunks up to date if the database changed since they were built.
+
+        Only the changed records are re-rendered and re-indexed when the database can
+        say which ones they are; otherwise everything is rebuilt.
+        """
+        if self.built_version == getattr(self.db, "version", 0):
+            return
+        with self._build_lock:
+            version = getattr(self.db, "version", 0)
+            if self.built_version == version:
+                return
+            # Changes landing after version was read are applied too, and again next refresh
+            changed = self.db.changed_since(self.built_version) if hasattr(self.db, "changed_since") else None
+            if (changed is None or len(changed) > len(self.chunks) * MAX_INCREMENTAL_FRACTION
+                    or (self.mode == "vector" and not self.record_index.updatable)):
+                self.build()
+                return
+            self._update(changed, version)
+
+    def rank(self, question: str, state: Optional[RetrievalState] = None) -> list:
+        """Return chunk positions ordered from most to least relevant"""
+        state = state or self.state
+        if self.mode == "vector":
+            # Over-fetch so chunks skipped by the token budget can be replaced
+            matches = state.record_index.search(question, self.top_k * 2)
+            positions = state.positions_by_id
+            return [positions[record_id] for record_id, _score in matches if record_id in positions]
+
+        scores = self.score(question, state)
+        if scores:
+            return sorted(scores, key=lambda position: (-scores[position], position))
+        # Nothing matched; fall back to the first chunks so the model still has data
+        return list(range(len(state.chunks)))
+
+    def retrieve(self, question: str, max_tokens: Optional[int] = None) -> list:
+        """Return the top-k chunks for a question that fit the token budget.
+
+        max_tokens is a hard limit on context tokens (from the model's budget). It also
+        applies in "full" mode: when the whole database does not fit, the most relevant
+        records that do are kept.
+        """
+        self.refresh()
+        # One state throughout, however many rebuilds are swapped in meanwhile
+        state = self.state
+        if self.mode == "full":
+            if max_tokens is None or state.total_tokens <= max_tokens:
+                return list(state.chunks)
+            ranked = self.rank(question, state)
+            ranked_set = set(ranked)
+            ranked += [position for position in range(len(state.chunks)) if position not in ranked_set]
+            top_k, limit = len(state.chunks), max_tokens
+        else:
+            ranked = self.rank(question, state)
+            top_k = self.top_k
+            limit = self.max_context_tokens if max_tokens is None else min(self.max_context_tokens, max_tokens)
+
+        selected = []
+        used_tokens = 0
+        for position in ranked:
+            if len(selected) >= top_k:
+                break
+            chunk = state.chunks[position]
+            tokens = self._chunk_tokens(chunk)
+            # Without a hard limit the best chunk is always sent, even if it is oversized
+            if used_tokens + tokens > limit and (selected or max_tokens is not None):
+                continue
+            selected.append(chunk)
+            used_tokens += tokens
+        return selected
+
+    def format_context(self, chunks: list) -> str:
+        """Assemble retrieved chunks into the database context Markdown"""
+        students = [chunk["text"] for chunk in chunks if chunk["type"] == "student"]
+        courses = [chunk["text"] for chunk in chunks if chunk["type"] == "course"]
+
+        parts = ["# Student Records and Academics Database\n\n", "## Student Information\n"]
+        parts.extend(students)
+        parts.append("\n## Course Information\n")
+        parts.extend(courses)
+        return "".join(parts)
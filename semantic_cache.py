@@ -0,0 +1,175 @@
+import threading
+from collections import Counter, deque
+from typing import Optional
+import numpy as np
+from config import Config
+from embeddings import get_embedder
+from query_router import QueryRouter
+from response_cache import normalize_question
+
+# Answers grounded on more records than this depend on the whole database version
+MAX_TRACKED_RECORDS = 64
+# Width of the buckets in the similarity histogram
+HISTOGRAM_BUCKET = 0.05
+# Best-match similarities kept for the histogram
+SIMILARITY_SAMPLES = 10000
+
+
+class SemanticCache:
+    """Reuse answers to questions that are worded differently but ask the same thing.
+
+    A cached answer is returned when the new question's embedding has cosine
+    similarity of at least `threshold` with a cached question from the same
+    provider and model, both questions mention the same students and courses and
+    the same negations, comparisons, grade letters and numbers, and none of the
+    records the answer depended on has changed since.
+    """
+
+    def __init__(self, db, embedder=None, threshold: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        self.db = db
+        self.embedder = embedder or get_embedder(Config.SEMANTIC_CACHE_EMBEDDING_BACKEND)
+        self.threshold = Config.SEMANTIC_CACHE_THRESHOLD if threshold is None else threshold
+        self.max_entries = max_entries or Config.SEMANTIC_CACHE_MAX_ENTRIES
+        # Only used for entity and key term extraction, so routing statistics are unaffected
+        self.entities = QueryRouter(db)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.similarities = deque(maxlen=SIMILARITY_SAMPLES)
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._owners = np.full(self.max_entries, -1, dtype=np.int32)
+        self._last_used = np.zeros(self.max_entries, dtype=np.int64)
+        self._entries = [None] * self.max_entries
+        self._owner_ids = {}
+        self._clock = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        return self.embedder.embed([normalize_question(question)])[0]
+
+    def _extract(self, question: str) -> tuple:
+        """(entities, key terms) that must be identical for two questions to share an answer"""
+        student_ids, course_ids = self.entities.extract_entities(question)
+        return frozenset(student_ids) | frozenset(course_ids), self.entities.key_terms(question)
+
+    def _fingerprint(self, dependency: tuple):
+        """Current state of a dependency; a cached answer is stale once this changes"""
+        record_type, record_id = dependency
+        if record_type == "database":
+            return self.db.version
+        if record_type == "course":
+            # Enrollment lives on student records, so track it for courses explicitly
+            return (self.db.get_record_version(record_id), tuple(self.db.find_students_by_course(record_id)))
+        return self.db.get_record_version(record_id)
+
+    def _dependencies(self, entities: frozenset, chunks: list) -> dict:
+        """Records an answer was grounded on, mapped to their current fingerprints"""
+        dependencies = {(chunk["type"], chunk["id"]) for chunk in chunks}
+        for record_id in entities:
+            record_type = "course" if self.db.get_course_info(record_id) is not None else "student"
+            dependencies.add((record_type, record_id))
+        # Questions naming no record (rankings, comparisons) can change with any record
+        if not entities or len(dependencies) > MAX_TRACKED_RECORDS:
+            dependencies = {("database", None)}
+        return {dependency: self._fingerprint(dependency) for dependency in dependencies}
+
+    def _is_fresh(self, entry: dict) -> bool:
+        return all(self._fingerprint(dependency) == fingerprint
+                   for dependency, fingerprint in entry["dependencies"].items())
+
+    def _drop(self, slot: int):
+        self._owners[slot] = -1
+        self._entries[slot] = None
+
+    def lookup(self, provider_key: tuple, question: str) -> Optional[tuple]:
+        """Return (answer, similarity) for a similar cached question, or None"""
+        vector = self._embed(question)
+        entities, terms = self._extract(question)
+        with self._lock:
+            owner = self._owner_ids.get(provider_key)
+            candidates = np.flatnonzero(self._owners == owner) if owner is not None else []
+            if len(candidates) == 0:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors[candidates] @ vector
+            self.similarities.append(float(similarities.max()))
+            for position in np.argsort(-similarities):
+                similarity = float(similarities[position])
+                if similarity < self.threshold:
+                    break
+                slot = candidates[position]
+                entry = self._entries[slot]
+                if entry["entities"] != entities or entry["terms"] != terms:
+                    continue
+                if not self._is_fresh(entry):
+                    self._drop(slot)
+                    self.invalidations += 1
+                    continue
+                self._clock += 1
+                self._last_used[slot] = self._clock
+                self.hits += 1
+                return entry["answer"], similarity
+
+            self.misses += 1
+            return None
+
+    def store(self, provider_key: tuple, question: str, answer: str, chunks: list = ()):
+        """Cache an answer along with the records (retrieved chunks and mentioned entities) it used"""
+        vector = self._embed(question)
+        entities, terms = self._extract(question)
+        dependencies = self._dependencies(entities, chunks)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            owner = self._owner_ids.setdefault(provider_key, len(self._owner_ids))
+            free = np.flatnonzero(self._owners == -1)
+            # Reuse a free slot, otherwise evict the least recently used entry
+            slot = free[0] if len(free) else int(np.argmin(self._last_used))
+            self._clock += 1
+            self._vectors[slot] = vector
+            self._owners[slot] = owner
+            self._last_used[slot] = self._clock
+            self._entries[slot] = {
+                "question": question,
+                "answer": answer,
+                "entities": entities,
+                "terms": terms,
+                "dependencies": dependencies
+            }
+
+    def stats(self) -> dict:
+        """Hit rate and the distribution of best-match similarities, for tuning the threshold"""
+        with self._lock:
+            total = self.hits + self.misses
+            histogram = Counter(min(int(similarity / HISTOGRAM_BUCKET), int(1 / HISTOGRAM_BUCKET) - 1)
+                                for similarity in self.similarities if similarity > 0)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "entries": int((self._owners != -1).sum()),
+                "threshold": self.threshold,
+                "similarity_histogram": {
+                    f"{bucket * HISTOGRAM_BUCKET:.2f}-{(bucket + 1) * HISTOGRAM_BUCKET:.2f}": histogram[bucket]
+                    for bucket in sorted(histogram)
+                }
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_semantic_cache(db) -> Optional[SemanticCache]:
+    """Get the process-wide semantic cache, or None when SEMANTIC_CACHE_ENABLED is off"""
+    global _shared_cache
+    if not Config.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = SemanticCache(db)
+    return _shared_cache
@@ -0,0 +1,51 @@
+import threading
+import time
+from typing import Optional
+from config import Config
+from ollama_provider import OllamaProvider
+from rag_engine import RAGEngine
+
+# RAGEngines shared by every session of a long-running UI process, keyed by (provider, model)
+_engines = {}
+_engines_lock = threading.Lock()
+
+# Provider discovery results as (expires_at, value), keyed by probe name
+_discovery = {}
+
+
+def get_rag_engine(provider_type: str, ollama_model: Optional[str] = None) -> RAGEngine:
+    """One RAGEngine per provider and model, built the first time it is asked for"""
+    key = (provider_type, ollama_model)
+    engine = _engines.get(key)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(key)
+            if engine is None:
+                engine = _engines[key] = RAGEngine(provider_type=provider_type, ollama_model=ollama_model)
+    return engine
+
+
+def _discover(name: str, probe):
+    """Run a discovery probe at most once per PROVIDER_DISCOVERY_TTL"""
+    now = time.monotonic()
+    cached = _discovery.get(name)
+    if cached is not None and now < cached[0]:
+        return cached[1]
+    value = probe()
+    _discovery[name] = (now + Config.PROVIDER_DISCOVERY_TTL, value)
+    return value
+
+
+def get_available_providers() -> list:
+    """Available providers, probed at most once per PROVIDER_DISCOVERY_TTL"""
+    return list(_discover("providers", RAGEngine.get_available_providers))
+
+
+def is_ollama_available() -> bool:
+    """Whether the Ollama server answers, probed at most once per PROVIDER_DISCOVERY_TTL"""
+    return _discover("ollama", OllamaProvider.is_available)
+
+
+def get_ollama_models() -> list:
+    """Models installed on the Ollama server, listed at most once per PROVIDER_DISCOVERY_TTL"""
+    return list(_discover("ollama_models", OllamaProvider.get_available_models))
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+from typing import Optional
+from config import Config
+
+
+class Call:
+    """A call in flight in a thread, awaited by the callers that joined it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one.
+
+    The first caller for a key runs the call; callers arriving with the same key while
+    it is in flight wait for it and receive its result (or exception) instead of
+    making their own. Once a call finishes the key is free again.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._tasks = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        """Run fn() for key, or wait for the identical call already running in another thread"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    async def ado(self, key, coroutine_fn):
+        """Await coroutine_fn() for key, or join the identical call already running on this event loop"""
+        # Tasks belong to one event loop, so concurrent loops coalesce separately
+        task_key = (asyncio.get_running_loop(), key)
+        with self._lock:
+            task = self._tasks.get(task_key)
+            if task is None:
+                task = self._tasks[task_key] = asyncio.ensure_future(coroutine_fn())
+                task.add_done_callback(lambda done: self._finish(task_key, done))
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        # Shielded so one caller being cancelled does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _finish(self, task_key, task):
+        with self._lock:
+            self._tasks.pop(task_key, None)
+        # Mark the exception retrieved in case every caller was cancelled before it arrived
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Calls made, callers that joined an in-flight call instead, and calls in flight now"""
+        with self._lock:
+            total = self.calls + self.coalesced
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "coalesced_rate": self.coalesced / total if total else 0.0,
+                "in_flight": len(self._calls) + len(self._tasks)
+            }
+
+
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Get the process-wide SingleFlight for provider calls (None when SINGLE_FLIGHT_ENABLED is off)"""
+    global _single_flight
+    if not Config.SINGLE_FLIGHT_ENABLED:
+        return None
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+    return _single_flight
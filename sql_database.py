@@ -0,0 +1,532 @@
+from collections.abc import ItemsView, Mapping, ValuesView
+from contextlib import contextmanager
+from operator import itemgetter
+from typing import Optional
+from sqlalchemy import (Column, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text,
+                        and_, bindparam, create_engine, event, func, select, tuple_, update)
+from sqlalchemy.exc import IntegrityError
+from config import Config
+from database import Database, normalize_name
+
+metadata = MetaData()
+
+students_table = Table(
+    "students", metadata,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("email", String, nullable=False),
+    Column("major", String, nullable=False),
+    Column("gpa", Float, nullable=False),
+    Column("name_key", String, nullable=False, index=True),
+    Column("first_name_key", String, nullable=False, index=True),
+    Column("major_key", String, nullable=False, index=True),
+    Column("version", Integer, nullable=False, server_default="0"),
+    Index("ix_students_gpa", "gpa"),
+    sqlite_with_rowid=False
+)
+
+courses_table = Table(
+    "courses", metadata,
+    Column("id", String, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("instructor", String, nullable=False),
+    Column("credits", Integer, nullable=False),
+    Column("description", Text, nullable=False),
+    Column("name_key", String, nullable=False, index=True),
+    Column("instructor_key", String, nullable=False, index=True),
+    Column("version", Integer, nullable=False, server_default="0"),
+    sqlite_with_rowid=False
+)
+
+# One row per enrolled course; grade is NULL until the course is graded
+enrollments_table = Table(
+    "enrollments", metadata,
+    Column("student_id", String, ForeignKey("students.id"), primary_key=True),
+    Column("course_id", String, primary_key=True),
+    Column("position", Integer, nullable=False),
+    Column("grade", String),
+    Index("ix_enrollments_course", "course_id"),
+    Index("ix_enrollments_grade", "grade"),
+    sqlite_with_rowid=False
+)
+
+# Database-wide counters, e.g. the version bumped on every change
+meta_table = Table(
+    "db_meta", metadata,
+    Column("key", String, primary_key=True),
+    Column("value", Integer, nullable=False)
+)
+
+
+class _StreamingView(Mapping):
+    """Read-only mapping over a table that streams rows instead of loading them all"""
+
+    def __init__(self, iter_items, get_item, count):
+        self._iter_items = iter_items
+        self._get_item = get_item
+        self._count = count
+
+    def __getitem__(self, key):
+        value = self._get_item(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __iter__(self):
+        for key, _value in self._iter_items():
+            yield key
+
+    def __len__(self) -> int:
+        return self._count()
+
+    def items(self):
+        return _StreamingItems(self)
+
+    def values(self):
+        return _StreamingValues(self)
+
+
+class _StreamingItems(ItemsView):
+    def __iter__(self):
+        return self._mapping._iter_items()
+
+
+class _StreamingValues(ValuesView):
+    def __iter__(self):
+        for _key, value in self._mapping._iter_items():
+            yield value
+
+
+class SQLDatabase(Database):
+    """Student and course database stored in SQL (SQLite by default) via SQLAlchemy"""
+
+    # Rendering a streamed row is cheaper than querying its version to validate a cache entry
+    cache_fragments = False
+
+    def __init__(self, url: Optional[str] = None, seed: bool = True):
+        self.url = url or Config.DATABASE_URL
+        self._fragment_cache = {}
+        self.engine = create_engine(self.url)
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine, "connect", self._configure_sqlite)
+        metadata.create_all(self.engine)
+        with self.engine.begin() as conn:
+            if conn.execute(select(meta_table.c.value).where(meta_table.c.key == "version")).first() is None:
+                conn.execute(meta_table.insert().values(key="version", value=0))
+        if seed and self.count_students() == 0 and self.count_courses() == 0:
+            self.load_records(Config.STUDENT_DATABASE, Config.COURSE_DATABASE)
+
+    @staticmethod
+    def _configure_sqlite(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{Config.SQLITE_CACHE_MB * 1024}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    # ---- row conversion ----
+
+    def _insert_rows(self, conn, table: Table, rows: list):
+        """Bulk insert dict rows through DBAPI executemany, skipping per-row SQLAlchemy overhead"""
+        if not rows:
+            return
+        placeholder = {"qmark": "?", "format": "%s", "pyformat": "%s"}.get(self.engine.dialect.paramstyle)
+        if placeholder is None:
+            conn.execute(table.insert(), rows)
+            return
+        columns = list(rows[0])
+        sql = (f"INSERT INTO {table.name} ({', '.join(columns)}) "
+               f"VALUES ({', '.join([placeholder] * len(columns))})")
+        values = itemgetter(*columns)
+        conn.exec_driver_sql(sql, [values(row) for row in rows])
+
+    @staticmethod
+    def _student_row(student_id: str, info: dict) -> dict:
+        name_key = normalize_name(info["name"])
+        return {
+            "id": student_id,
+            "name": info["name"],
+            "email": info["email"],
+            "major": info["major"],
+            "gpa": info["gpa"],
+            "name_key": name_key,
+            "first_name_key": name_key.split()[0] if name_key else "",
+            "major_key": normalize_name(info["major"])
+        }
+
+    @staticmethod
+    def _enrollment_rows(student_id: str, info: dict) -> list:
+        grades = info.get("grades", {})
+        courses = list(info.get("courses", []))
+        # Graded courses missing from the course list are still enrollments
+        courses += [course_id for course_id in grades if course_id not in courses]
+        return [{"student_id": student_id, "course_id": course_id, "position": position,
+                 "grade": grades.get(course_id)} for position, course_id in enumerate(courses)]
+
+    @staticmethod
+    def _course_row(course_id: str, info: dict) -> dict:
+        return {
+            "id": course_id,
+            "name": info["name"],
+            "instructor": info["instructor"],
+            "credits": info["credits"],
+            "description": info["description"],
+            "name_key": normalize_name(info["name"]),
+            "instructor_key": normalize_name(info["instructor"])
+        }
+
+    @staticmethod
+    def _student_info(row, enrollments: list) -> dict:
+        return {
+            "name": row.name,
+            "email": row.email,
+            "major": row.major,
+            "gpa": row.gpa,
+            "courses": [enrollment.course_id for enrollment in enrollments],
+            "grades": {enrollment.course_id: enrollment.grade
+                       for enrollment in enrollments if enrollment.grade is not None}
+        }
+
+    @staticmethod
+    def _course_info(row) -> dict:
+        return {
+            "name": row.name,
+            "instructor": row.instructor,
+            "credits": row.credits,
+            "description": row.description
+        }
+
+    # ---- reads ----
+
+    def get_student_info(self, student_id: str) -> dict:
+        """Get specific student information"""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(students_table).where(students_table.c.id == student_id)).first()
+            if row is None:
+                return None
+            enrollments = conn.execute(
+                select(enrollments_table)
+                .where(enrollments_table.c.student_id == student_id)
+                .order_by(enrollments_table.c.position)
+            ).all()
+        return self._student_info(row, enrollments)
+
+    def iter_students(self):
+        """Stream (student_id, info) pairs in ID order, one page at a time"""
+        batch_size = Config.DATABASE_STREAM_BATCH_SIZE
+        last_id = None
+        while True:
+            query = select(students_table).order_by(students_table.c.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(students_table.c.id > last_id)
+            with self.engine.connect() as conn:
+                rows = conn.execute(query).all()
+                if not rows:
+                    return
+                enrollments = {}
+                for enrollment in conn.execute(
+                    select(enrollments_table)
+                    .where(enrollments_table.c.student_id.in_([row.id for row in rows]))
+                    .order_by(enrollments_table.c.student_id, enrollments_table.c.position)
+                ):
+                    enrollments.setdefault(enrollment.student_id, []).append(enrollment)
+            for row in rows:
+                yield row.id, self._student_info(row, enrollments.get(row.id, []))
+            last_id = rows[-1].id
+
+    def get_all_students(self) -> Mapping:
+        """Get all students as a lazily streamed mapping"""
+        return _StreamingView(self.iter_students, self.get_student_info, self.count_students)
+
+    def count_students(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(students_table)).scalar_one()
+
+    def get_course_info(self, course_id: str) -> dict:
+        """Get specific course information"""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(courses_table).where(courses_table.c.id == course_id)).first()
+        return self._course_info(row) if row is not None else None
+
+    def iter_courses(self):
+        """Stream (course_id, info) pairs in ID order, one page at a time"""
+        batch_size = Config.DATABASE_STREAM_BATCH_SIZE
+        last_id = None
+        while True:
+            query = select(courses_table).order_by(courses_table.c.id).limit(batch_size)
+            if last_id is not None:
+                query = query.where(courses_table.c.id > last_id)
+            with self.engine.connect() as conn:
+                rows = conn.execute(query).all()
+            if not rows:
+                return
+            for row in rows:
+                yield row.id, self._course_info(row)
+            last_id = rows[-1].id
+
+    def get_all_courses(self) -> Mapping:
+        """Get all courses as a lazily streamed mapping"""
+        return _StreamingView(self.iter_courses, self.get_course_info, self.count_courses)
+
+    def count_courses(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(courses_table)).scalar_one()
+
+    def _record_items(self) -> tuple:
+        # Each page is read by its own query, so streaming needs no lock; fragments are
+        # not cached, so no version is needed
+        return (((student_id, info, None) for student_id, info in self.iter_students()),
+                ((course_id, info, None) for course_id, info in self.iter_courses()))
+
+    def _record(self, record_id: str) -> Optional[tuple]:
+        info = self.get_student_info(record_id)
+        if info is not None:
+            return "student", info, None
+        info = self.get_course_info(record_id)
+        if info is not None:
+            return "course", info, None
+        return None
+
+    @property
+    def version(self) -> int:
+        """Database-wide change counter, shared by every process using the file"""
+        with self.engine.connect() as conn:
+            return conn.execute(select(meta_table.c.value).where(meta_table.c.key == "version")).scalar_one()
+
+    def get_record_version(self, record_id: str) -> int:
+        """Get how many times a student or course record has changed"""
+        with self.engine.connect() as conn:
+            for table in (students_table, courses_table):
+                version = conn.execute(select(table.c.version).where(table.c.id == record_id)).scalar()
+                if version is not None:
+                    return version
+        return 0
+
+    # ---- indexed lookups ----
+
+    def _ids(self, query) -> list:
+        with self.engine.connect() as conn:
+            return list(conn.execute(query).scalars())
+
+    def find_students_by_course(self, course_id: str) -> list:
+        """Get IDs of students enrolled in a course"""
+        return self._ids(select(enrollments_table.c.student_id)
+                         .where(enrollments_table.c.course_id == course_id)
+                         .order_by(enrollments_table.c.student_id))
+
+    def find_students_by_major(self, major: str) -> list:
+        """Get IDs of students in a major"""
+        return self._ids(select(students_table.c.id)
+                         .where(students_table.c.major_key == normalize_name(major))
+                         .order_by(students_table.c.id))
+
+    def find_students_by_name(self, name: str) -> list:
+        """Get IDs of students matching a full name, or a first name if no full name matches"""
+        name = normalize_name(name)
+        return (self._ids(select(students_table.c.id).where(students_table.c.name_key == name)
+                          .order_by(students_table.c.id))
+                or self._ids(select(students_table.c.id).where(students_table.c.first_name_key == name)
+                             .order_by(students_table.c.id)))
+
+    def find_grades(self, grade: str) -> list:
+        """Get (student_id, course_id) pairs with a given grade"""
+        with self.engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(
+                select(enrollments_table.c.student_id, enrollments_table.c.course_id)
+                .where(enrollments_table.c.grade == grade.upper())
+                .order_by(enrollments_table.c.student_id, enrollments_table.c.course_id)
+            )]
+
+    def find_courses_by_instructor(self, instructor: str) -> list:
+        """Get IDs of courses taught by an instructor"""
+        return self._ids(select(courses_table.c.id)
+                         .where(courses_table.c.instructor_key == normalize_name(instructor))
+                         .order_by(courses_table.c.id))
+
+    def find_courses_by_name(self, name: str) -> list:
+        """Get IDs of courses with a given name"""
+        return self._ids(select(courses_table.c.id)
+                         .where(courses_table.c.name_key == normalize_name(name))
+                         .order_by(courses_table.c.id))
+
+    def find_top_students_by_gpa(self, limit: int = 1, highest: bool = True) -> list:
+        """Get IDs of the students with the highest (or lowest) GPA"""
+        order = students_table.c.gpa.desc() if highest else students_table.c.gpa.asc()
+        return self._ids(select(students_table.c.id).order_by(order).limit(limit))
+
+    # ---- writes ----
+
+    def changed_since(self, version: int) -> Optional[set]:
+        """Always None: rows only carry their own version, so which ones changed is unknown"""
+        return None
+
+    def _bump_version(self, conn):
+        conn.execute(update(meta_table).where(meta_table.c.key == "version")
+                     .values(value=meta_table.c.value + 1))
+
+    def load_records(self, students: dict, courses: dict):
+        """Insert student and course dicts shaped like Config.STUDENT_DATABASE/COURSE_DATABASE"""
+        with self.engine.begin() as conn:
+            self._insert_rows(conn, courses_table, [self._course_row(course_id, info)
+                                                    for course_id, info in courses.items()])
+            self._insert_rows(conn, students_table, [self._student_row(student_id, info)
+                                                     for student_id, info in students.items()])
+            self._insert_rows(conn, enrollments_table, [row for student_id, info in students.items()
+                                                        for row in self._enrollment_rows(student_id, info)])
+            self._bump_version(conn)
+
+    def add_student(self, student_id: str, info: dict):
+        """Insert a new student"""
+        if self.get_student_info(student_id) is not None:
+            raise ValueError(f"Student already exists: {student_id}")
+        self.load_records({student_id: info}, {})
+
+    def update_student(self, student_id: str, updates: dict):
+        """Update fields of an existing student"""
+        old = self.get_student_info(student_id)
+        if old is None:
+            raise KeyError(f"Unknown student: {student_id}")
+        new = {**old, **updates}
+        row = self._student_row(student_id, new)
+        del row["id"]
+        with self.engine.begin() as conn:
+            conn.execute(update(students_table).where(students_table.c.id == student_id)
+                         .values(version=students_table.c.version + 1, **row))
+            if "courses" in updates or "grades" in updates:
+                conn.execute(enrollments_table.delete().where(enrollments_table.c.student_id == student_id))
+                self._insert_rows(conn, enrollments_table, self._enrollment_rows(student_id, new))
+            self._bump_version(conn)
+
+    def add_course(self, course_id: str, info: dict):
+        """Insert a new course"""
+        if self.get_course_info(course_id) is not None:
+            raise ValueError(f"Course already exists: {course_id}")
+        self.load_records({}, {course_id: info})
+
+    def update_course(self, course_id: str, updates: dict):
+        """Update fields of an existing course"""
+        old = self.get_course_info(course_id)
+        if old is None:
+            raise KeyError(f"Unknown course: {course_id}")
+        row = self._course_row(course_id, {**old, **updates})
+        del row["id"]
+        with self.engine.begin() as conn:
+            conn.execute(update(courses_table).where(courses_table.c.id == course_id)
+                         .values(version=courses_table.c.version + 1, **row))
+            self._bump_version(conn)
+
+    # ---- bulk ingestion ----
+
+    @contextmanager
+    def deferred_indexes(self):
+        """Drop secondary indexes for a bulk load and rebuild them once it finishes.
+
+        Building an index over sorted data once is much cheaper than maintaining it row by
+        row; lookups by anything but primary key are slow until the load completes.
+        """
+        indexes = [index for table in metadata.sorted_tables for index in table.indexes]
+        for index in indexes:
+            index.drop(self.engine, checkfirst=True)
+        try:
+            yield
+        finally:
+            for index in indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def _bulk_insert(self, write_rows, record_ids: list) -> list:
+        """Run a bulk insert in one transaction, falling back to row by row on conflicts.
+
+        write_rows(conn, ids) inserts the records for ids. Returns [(record_id, error)] for
+        records that could not be inserted.
+        """
+        try:
+            with self.engine.begin() as conn:
+                write_rows(conn, record_ids)
+                self._bump_version(conn)
+            return []
+        except IntegrityError:
+            pass
+
+        rejected = []
+        with self.engine.begin() as conn:
+            for record_id in record_ids:
+                try:
+                    with conn.begin_nested():
+                        write_rows(conn, [record_id])
+                except IntegrityError as e:
+                    rejected.append((record_id, f"conflicts with existing data: {e.orig}"))
+            self._bump_version(conn)
+        return rejected
+
+    def bulk_insert_students(self, records: list) -> list:
+        """Insert [(student_id, info)] in one transaction; returns [(student_id, error)] rejects"""
+        by_id = dict(records)
+
+        def write_rows(conn, student_ids):
+            self._insert_rows(conn, students_table,
+                              [self._student_row(student_id, by_id[student_id]) for student_id in student_ids])
+            self._insert_rows(conn, enrollments_table,
+                              [row for student_id in student_ids
+                               for row in self._enrollment_rows(student_id, by_id[student_id])])
+
+        return self._bulk_insert(write_rows, list(by_id))
+
+    def bulk_insert_courses(self, records: list) -> list:
+        """Insert [(course_id, info)] in one transaction; returns [(course_id, error)] rejects"""
+        by_id = dict(records)
+
+        def write_rows(conn, course_ids):
+            self._insert_rows(conn, courses_table,
+                              [self._course_row(course_id, by_id[course_id]) for course_id in course_ids])
+
+        return self._bulk_insert(write_rows, list(by_id))
+
+    def bulk_upsert_grades(self, grades: list) -> list:
+        """Set grades from [(student_id, course_id, grade)], enrolling students where needed.
+
+        Returns [((student_id, course_id), error)] for grades of unknown students.
+        """
+        latest = {(student_id, course_id): grade for student_id, course_id, grade in grades}
+        student_ids = {student_id for student_id, _course_id in latest}
+        with self.engine.begin() as conn:
+            known = set(conn.execute(select(students_table.c.id)
+                                     .where(students_table.c.id.in_(student_ids))).scalars())
+            existing = set(conn.execute(
+                select(enrollments_table.c.student_id, enrollments_table.c.course_id)
+                .where(tuple_(enrollments_table.c.student_id, enrollments_table.c.course_id).in_(list(latest)))
+            ).all())
+            next_position = dict(conn.execute(
+                select(enrollments_table.c.student_id, func.max(enrollments_table.c.position) + 1)
+                .where(enrollments_table.c.student_id.in_(known))
+                .group_by(enrollments_table.c.student_id)
+            ).all())
+
+            rejected, updates, inserts = [], [], []
+            for (student_id, course_id), grade in latest.items():
+                if student_id not in known:
+                    rejected.append(((student_id, course_id), f"unknown student: {student_id}"))
+                elif (student_id, course_id) in existing:
+                    updates.append({"sid": student_id, "cid": course_id, "grade": grade})
+                else:
+                    position = next_position.get(student_id, 0)
+                    next_position[student_id] = position + 1
+                    inserts.append({"student_id": student_id, "course_id": course_id,
+                                    "position": position, "grade": grade})
+
+            if updates:
+                conn.execute(
+                    update(enrollments_table)
+                    .where(and_(enrollments_table.c.student_id == bindparam("sid"),
+                                enrollments_table.c.course_id == bindparam("cid")))
+                    .values(grade=bindparam("grade")),
+                    updates
+                )
+            self._insert_rows(conn, enrollments_table, inserts)
+            changed = list({student_id for student_id, _course_id in latest} & known)
+            if changed:
+                conn.execute(update(students_table).where(students_table.c.id.in_(changed))
+                             .values(version=students_table.c.version + 1))
+            self._bump_version(conn)
+        return rejected
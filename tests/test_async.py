@@ -0,0 +1,150 @@
+import asyncio
+import time
+import pytest
+import database
+from config import Config
+from database import Database
+from fake_llm_server import FakeBehaviour, FakeGeminiClient, FakeLLMServer
+from gemini_provider import GeminiProvider
+from ollama_provider import OllamaProvider, close_async_client
+from rag_engine import RAGEngine
+
+MODEL = "mistral:latest"
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer(behaviour=FakeBehaviour(latency_ms=200)) as server:
+        yield server
+
+
+def run(coroutine_fn):
+    """Run a coroutine on a fresh event loop, closing its pooled HTTP clients afterwards"""
+    async def main():
+        try:
+            return await coroutine_fn()
+        finally:
+            await close_async_client()
+    return asyncio.run(main())
+
+
+def test_concurrent_queries_overlap(server):
+    provider = OllamaProvider(MODEL, base_urls=[server.url], raise_errors=True)
+    start = time.monotonic()
+    responses = run(lambda: asyncio.gather(*(provider.aquery(f"q{number}") for number in range(20))))
+    # Twenty 200ms answers in flight at once take about as long as one
+    assert time.monotonic() - start < 2.5
+    assert responses == [f"Echo: q{number}" for number in range(20)]
+    assert server.requests == 20
+
+
+def test_stream_yields_tokens_in_order(server):
+    provider = OllamaProvider(MODEL, base_urls=[server.url], raise_errors=True)
+
+    async def main():
+        return [token async for token in provider.astream_query("one two three")]
+
+    assert run(main) == ["Echo: ", "one ", "two ", "three"]
+
+
+def test_async_errors_are_returned_as_text(server):
+    server.behaviour = FakeBehaviour(error_rate=1.0)
+    provider = OllamaProvider(MODEL, base_urls=[server.url])
+    assert run(lambda: provider.aquery("q")).startswith("Error")
+
+
+def test_gemini_async_query_and_stream():
+    provider = GeminiProvider(client=FakeGeminiClient(FakeBehaviour(latency_ms=50)))
+
+    async def main():
+        answers = await asyncio.gather(*(provider.aquery(f"q{number}") for number in range(10)))
+        tokens = [token async for token in provider.astream_query("streamed question")]
+        return answers, tokens
+
+    answers, tokens = run(main)
+    assert answers == [f"Echo: q{number}" for number in range(10)]
+    assert "".join(tokens) == "Echo: streamed question"
+
+
+@pytest.fixture
+def engine(server, monkeypatch):
+    monkeypatch.setattr(database, "_shared_database", Database())
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    monkeypatch.setattr(Config, "ASYNC_MAX_CONCURRENCY", 4)
+    provider = OllamaProvider(MODEL, base_urls=[server.url], raise_errors=True)
+    engine = RAGEngine(provider_type="ollama", provider=provider)
+    engine.cache = None
+    return engine
+
+
+class InFlightProvider:
+    """Async provider recording the most calls it had in flight at once"""
+
+    model_name = "mistral"
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def aquery(self, query: str, context: str = "") -> str:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.05)
+        self.in_flight -= 1
+        return f"answer to {query}"
+
+
+def test_engine_caps_provider_calls_in_flight(engine):
+    engine.provider = InFlightProvider()
+    results = run(lambda: asyncio.gather(*(engine.aquery_detailed(f"Question {number}") for number in range(12))))
+    assert engine.provider.max_in_flight == 4
+    assert [result["response"] for result in results] == [f"answer to Question {number}" for number in range(12)]
+    assert all(result["source"] == "provider" for result in results)
+
+
+def test_engine_async_stream(engine):
+    async def main():
+        stream = await engine.astream_query("Tell me about Alice Johnson")
+        tokens = [token async for token in stream]
+        return stream, tokens
+
+    stream, tokens = run(main)
+    assert "".join(tokens) == stream.text == "Echo: Question: Tell me about Alice Johnson"
+    assert stream.source == "provider"
+    assert 0 < stream.ttft <= stream.latency
+
+
+def test_lookups_run_off_the_event_loop(engine, monkeypatch):
+    lookup = engine._lookup
+    lookups = []
+
+    def slow_lookup(question):
+        # Stands in for a slow SQLite cache read or embedding
+        started = time.monotonic()
+        time.sleep(0.3)
+        lookups.append((started, time.monotonic()))
+        return lookup(question)
+
+    monkeypatch.setattr(engine, "_lookup", slow_lookup)
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def stream():
+        return "".join([token async for token in await engine.astream_query("Tell me about Bob Smith")])
+
+    async def main():
+        task = asyncio.ensure_future(ticker())
+        await asyncio.sleep(0)
+        try:
+            return await engine.aquery("Tell me about Alice Johnson"), await stream()
+        finally:
+            task.cancel()
+
+    assert run(main) == ("Echo: Question: Tell me about Alice Johnson", "Echo: Question: Tell me about Bob Smith")
+    # The event loop kept ticking while each lookup ran
+    for started, finished in lookups:
+        assert len([tick for tick in ticks if started < tick < finished]) >= 10
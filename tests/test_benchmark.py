@@ -0,0 +1,87 @@
+import time
+import pytest
+import database
+from benchmark import LoadBenchmark
+from config import Config
+from database import Database
+from fake_llm_server import FakeBehaviour, FakeLLMServer
+from ollama_balancer import EndpointPool
+from ollama_provider import OllamaProvider
+from rag_engine import RAGEngine
+
+MODEL = "mistral:latest"
+QUESTIONS = [f"Question {number} about the courses" for number in range(50)]
+
+
+@pytest.fixture
+def servers():
+    started = [FakeLLMServer(behaviour=FakeBehaviour(latency_ms=10)).start() for _ in range(2)]
+    yield started
+    for server in started:
+        server.stop()
+
+
+@pytest.fixture
+def make_engine(servers, monkeypatch):
+    monkeypatch.setattr(database, "_shared_database", Database())
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    monkeypatch.setattr(Config, "SINGLE_FLIGHT_ENABLED", False)
+
+    def make(**options) -> RAGEngine:
+        """An engine over both fake servers, using a pool with no background health checks"""
+        urls = [server.url for server in servers]
+        provider = OllamaProvider(MODEL, base_urls=urls)
+        provider.pool = EndpointPool(urls, prefer_loaded=False, health_check_interval=0, **options)
+        engine = RAGEngine(provider_type="ollama", provider=provider)
+        engine.cache = None
+        return engine
+    return make
+
+
+def run(engine, duration: float = 0.3, concurrency: int = 4) -> dict:
+    return LoadBenchmark(engine, QUESTIONS, concurrency=concurrency, duration=duration, warmup=0).run()
+
+
+def test_load_is_spread_across_endpoints(servers, make_engine):
+    engine = make_engine()
+    summary = run(engine)
+    assert summary["errors"] == 0
+    assert summary["successes"] == sum(server.requests for server in servers)
+    first, second = (server.requests for server in servers)
+    # Four workers over two servers keep about two requests in flight on each
+    assert abs(first - second) <= max(4, summary["requests"] // 5)
+    assert all(endpoint["outstanding"] == 0 for endpoint in engine.provider.pool.stats())
+
+
+def test_failed_endpoint_is_ejected_then_let_back_in(servers, make_engine):
+    failing, healthy = servers
+    failing.behaviour = FakeBehaviour(latency_ms=10, error_rate=1.0, error_status=500)
+    engine = make_engine(eject_after_failures=2, eject_seconds=0.5)
+    # One request at a time, so none are already on their way to it when it is ejected
+    summary = run(engine, duration=0.2, concurrency=1)
+    # Two failures in a row eject it; the rest of the run goes to the other server
+    assert failing.requests == summary["errors"] == 2
+    assert summary["successes"] == healthy.requests > 2
+    assert [endpoint["healthy"] for endpoint in engine.provider.pool.stats()] == [False, True]
+
+    failing.behaviour = FakeBehaviour(latency_ms=10)
+    time.sleep(0.5)
+    summary = run(engine)
+    assert summary["errors"] == 0
+    assert failing.requests > 2 + summary["requests"] // 5
+    assert [endpoint["healthy"] for endpoint in engine.provider.pool.stats()] == [True, True]
+
+
+def test_every_endpoint_down(servers, make_engine):
+    for server in servers:
+        server.behaviour = FakeBehaviour(error_rate=1.0, error_status=500)
+    engine = make_engine(eject_after_failures=1, eject_seconds=60)
+    benchmark = LoadBenchmark(engine, QUESTIONS, concurrency=4, duration=0.2, warmup=0)
+    summary = benchmark.run()
+    # With every server ejected the pool fails open, so each request is still tried and reported
+    assert summary["requests"] == sum(server.requests for server in servers) > 2
+    assert all(server.requests > 1 for server in servers)
+    assert summary["successes"] == 0 and summary["error_rate"] == 1.0
+    assert summary["throughput"] == 0.0 and summary["latency"]["p50"] is None
+    assert summary["by_source"] == {}
+    assert all(record["error"] == "Error: Ollama returned status 500" for record in benchmark.records)
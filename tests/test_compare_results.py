@@ -0,0 +1,41 @@
+import json
+import pytest
+from compare_results import ALL_QUESTIONS, compare, main
+
+
+def write_results(path, latencies: dict, failed: tuple = ()) -> str:
+    """A TestResults file for provider "ollama" with one answer per question"""
+    results = [{"question": question, "latency": latency, "success": question not in failed}
+               for question, latency in latencies.items()]
+    path.write_text(json.dumps({"results": {"ollama": results}}))
+    return str(path)
+
+
+def test_failing_question_counts_as_one_regression(tmp_path):
+    latencies = {f"q{number}": 1.0 for number in range(10)}
+    baseline = write_results(tmp_path / "baseline.json", latencies)
+    candidate = write_results(tmp_path / "candidate.json", latencies, failed=("q3",))
+    report = compare([baseline], [candidate])
+    assert report["failing"] == ["ollama: q3"]
+    # q3 is left out of the error rate, which would otherwise have risen by 10 points
+    assert report["error_rates"]["ollama"] == {"baseline": 0.0, "candidate": 0.0, "regression": False}
+    assert report["regressions"] == 1
+
+
+def test_single_runs_only_compare_the_pooled_row(tmp_path):
+    baseline = write_results(tmp_path / "baseline.json", {f"q{number}": 1.0 + number / 100 for number in range(10)})
+    candidate = write_results(tmp_path / "candidate.json", {f"q{number}": 2.0 + number / 100 for number in range(10)})
+    report = compare([baseline], [candidate])
+    per_question = [row for row in report["comparisons"] if row["question"] != ALL_QUESTIONS]
+    pooled = [row for row in report["comparisons"] if row["question"] == ALL_QUESTIONS]
+    assert all(row["ci_low"] is None and not row["regression"] for row in per_question)
+    assert all(row["regression"] for row in pooled if row["metric"] == "mean")
+
+
+def test_candidate_runs_must_be_positive(tmp_path):
+    files = [write_results(tmp_path / f"run{number}.json", {"q": 1.0}) for number in range(3)]
+    with pytest.raises(SystemExit):
+        main([*files, "--candidate-runs", "0"])
+    with pytest.raises(SystemExit):
+        main([*files, "--candidate-runs", "3"])
+    assert main([*files, "--candidate-runs", "1"]) == 0
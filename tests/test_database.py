@@ -0,0 +1,34 @@
+from database import Database
+
+
+def test_update_during_iteration_does_not_cache_stale_text():
+    db = Database()
+    first, second = list(db.get_all_students())[:2]
+    records = db.iter_records()
+    # The records are copied when iteration starts; the update lands before the second is rendered
+    assert next(records)[0] == first
+    db.update_student(second, {"gpa": 1.23})
+    stale = dict(record[::2] for record in records)[second]
+    assert "GPA: 1.23" not in stale
+
+    assert "GPA: 1.23" in db.render_record(second)[1]
+    assert "GPA: 1.23" in db.format_as_context()
+
+
+def test_fragments_are_rerendered_after_an_update():
+    db = Database()
+    course = next(iter(db.get_all_courses()))
+    before = db.render_record(course)[1]
+    assert db.render_record(course)[1] is before
+    db.update_course(course, {"instructor": "Dr. Nobody"})
+    assert "Instructor: Dr. Nobody" in db.render_record(course)[1]
+    assert db.render_record("missing") is None
+
+
+def test_changed_since_lists_changed_records():
+    db = Database()
+    version = db.version
+    student = next(iter(db.get_all_students()))
+    db.update_student(student, {"gpa": 3.0})
+    assert db.changed_since(version) == {student}
+    assert db.changed_since(db.version) == set()
@@ -0,0 +1,121 @@
+import os
+import threading
+import numpy as np
+import embedding_store
+from embedding_store import EmbeddingStore
+from embeddings import HashingEmbedder
+
+
+class CountingEmbedder:
+    """Embeds a text as its length in every dimension, counting the texts it embeds"""
+
+    model_name = "counting"
+    dimension = 4
+
+    def __init__(self):
+        self.embedded = 0
+
+    def embed(self, texts: list) -> np.ndarray:
+        self.embedded += len(texts)
+        return np.array([[len(text)] * self.dimension for text in texts], dtype=np.float32)
+
+
+def make_records(count: int, changed: int = -1) -> list:
+    return [(f"STU{number:03d}", "student", f"Student {number}" + (" updated" if number == changed else ""))
+            for number in range(count)]
+
+
+def assert_rows_match(store: EmbeddingStore, records: list):
+    texts = dict((record_id, text) for record_id, _record_type, text in records)
+    for record_id, row in zip(store.ids.tolist(), store.embeddings):
+        assert row[0] == len(texts[record_id])
+
+
+def test_only_changed_records_are_re_embedded(tmp_path):
+    embedder = CountingEmbedder()
+    EmbeddingStore(str(tmp_path)).sync(make_records(20), embedder)
+    assert embedder.embedded == 20
+
+    store = EmbeddingStore(str(tmp_path))
+    ids, embeddings = store.sync(make_records(20), embedder)
+    assert store.last_sync == {"records": 20, "embedded": 0, "reused": 20}
+    assert isinstance(embeddings, np.memmap)
+
+    records = make_records(21, changed=5)
+    store.sync(records, embedder)
+    assert store.last_sync == {"records": 21, "embedded": 2, "reused": 19}
+    assert_rows_match(store, records)
+
+
+def test_old_generations_are_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_store, "STALE_GENERATION_SECONDS", -1)
+    store = EmbeddingStore(str(tmp_path))
+    for count in (3, 4, 5, 6):
+        store.sync(make_records(count), CountingEmbedder())
+    generations = [name for name in os.listdir(tmp_path) if name.startswith(embedding_store.GENERATION_PREFIX)]
+    # The current generation and the one it replaced
+    assert len(generations) == 2 and store.generation in generations
+
+
+def test_interrupted_save_keeps_the_previous_generation(tmp_path, monkeypatch):
+    records = make_records(10)
+    EmbeddingStore(str(tmp_path)).sync(records, CountingEmbedder())
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    # The new matrix is written, then the save dies before the new IDs
+    save = np.save
+    monkeypatch.setattr(np, "save", lambda path, array: crash() if path.endswith("ids.npy") else save(path, array))
+    try:
+        EmbeddingStore(str(tmp_path)).sync(make_records(12, changed=0), CountingEmbedder())
+    except OSError:
+        pass
+    monkeypatch.undo()
+
+    store = EmbeddingStore(str(tmp_path))
+    assert store.load()
+    assert store.ids.tolist() == [record[0] for record in records]
+    assert_rows_match(store, records)
+    embedder = CountingEmbedder()
+    store.sync(records, embedder)
+    assert embedder.embedded == 0
+
+
+def test_concurrent_saves_never_mix_generations(tmp_path):
+    corpora = [make_records(count, changed=count % 7) for count in range(5, 25)]
+    errors = []
+
+    def sync(records):
+        try:
+            store = EmbeddingStore(str(tmp_path))
+            ids, embeddings = store.sync(records, CountingEmbedder())
+            assert ids == [record[0] for record in records] and len(embeddings) == len(records)
+            assert_rows_match(store, records)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=sync, args=(records,)) for records in corpora]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    store = EmbeddingStore(str(tmp_path))
+    assert store.load()
+    saved = next(records for records in corpora if len(records) == len(store.ids))
+    assert_rows_match(store, saved)
+
+
+def test_fitted_embedder_state_is_restored(tmp_path):
+    records = [(f"C{number}", "course", f"Course about topic {number % 5}") for number in range(30)]
+    first = HashingEmbedder(dimension=64)
+    _ids, saved = EmbeddingStore(str(tmp_path)).sync(records, first)
+
+    second = HashingEmbedder(dimension=64)
+    store = EmbeddingStore(str(tmp_path))
+    _ids, loaded = store.sync(records, second)
+    assert store.last_sync["embedded"] == 0
+    assert np.array_equal(second.idf, first.idf)
+    assert np.array_equal(np.asarray(loaded), np.asarray(saved))
@@ -0,0 +1,41 @@
+import numpy as np
+from embeddings import HashingEmbedder
+
+TEXTS = ["Alice Johnson - Computer Science, GPA 3.8", "Bob Smith - Data Science, GPA 3.6",
+         "Machine Learning Fundamentals taught by Dr. Brown", "Introduction to AI"]
+
+
+def test_embeddings_are_deterministic_unit_vectors():
+    first = HashingEmbedder(dimension=128).embed(TEXTS)
+    second = HashingEmbedder(dimension=128).embed(TEXTS)
+    assert first.dtype == np.float32 and first.shape == (len(TEXTS), 128)
+    assert np.array_equal(first, second)
+    assert np.allclose(np.linalg.norm(first, axis=1), 1.0, atol=1e-6)
+
+
+def test_a_text_embeds_the_same_whatever_else_is_in_the_batch():
+    embedder = HashingEmbedder(dimension=128)
+    alone = embedder.embed([TEXTS[2]])[0]
+    batched = embedder.embed(TEXTS)[2]
+    assert np.allclose(alone, batched, atol=1e-6)
+
+
+def test_similar_texts_are_closer_than_unrelated_ones():
+    embedder = HashingEmbedder(dimension=512).fit(TEXTS)
+    query, related, unrelated = embedder.embed(["machine learning course", TEXTS[2], TEXTS[1]])
+    assert query @ related > query @ unrelated
+
+
+def test_fitted_state_round_trips():
+    fitted = HashingEmbedder(dimension=64).fit(TEXTS)
+    restored = HashingEmbedder(dimension=64)
+    assert not restored.fitted
+    restored.set_state(fitted.get_state())
+    assert restored.fitted
+    assert np.array_equal(restored.embed(TEXTS), fitted.embed(TEXTS))
+    # Fitting changes the weights, so an unfitted embedder would disagree
+    assert not np.array_equal(HashingEmbedder(dimension=64).embed(TEXTS), fitted.embed(TEXTS))
+
+
+def test_empty_input():
+    assert HashingEmbedder(dimension=32).embed([]).shape == (0, 32)
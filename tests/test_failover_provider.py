@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import failover_provider
+from failover_provider import FailoverProvider
+from rate_limiter import TokenBucket
+
+
+class FakeProvider:
+    """A provider that answers after delay seconds, or raises if fail is set"""
+
+    def __init__(self, name: str, delay: float = 0.0, fail: bool = False, tokens: int = 3):
+        self.model_name = name
+        self.delay = delay
+        self.fail = fail
+        self.tokens = tokens
+        self.calls = 0
+        self.cancelled = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+
+    def query(self, query: str, context: str = "") -> str:
+        self._start()
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError(f"{self.model_name} failed")
+        return f"{self.model_name}: {query}"
+
+    async def aquery(self, query: str, context: str = "") -> str:
+        self._start()
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.model_name} failed")
+        return f"{self.model_name}: {query}"
+
+    def stream_query(self, query: str, context: str = ""):
+        self._start()
+        if self.fail:
+            raise RuntimeError(f"{self.model_name} failed")
+        for position in range(self.tokens):
+            yield f"{self.model_name}{position} "
+
+    async def astream_query(self, query: str, context: str = ""):
+        for token in self.stream_query(query, context):
+            yield token
+
+
+def make_failover(primary, secondary, **options) -> FailoverProvider:
+    return FailoverProvider([("primary", primary), ("secondary", secondary)], **options)
+
+
+def test_primary_answers_when_healthy():
+    failover = make_failover(FakeProvider("a"), FakeProvider("b"), mode="failover", timeout=5)
+    assert failover.query("q") == "a: q"
+    assert failover.stats()["decisions"] == {"primary": 1}
+
+
+def test_error_fails_over_to_the_secondary():
+    primary, secondary = FakeProvider("a", fail=True), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="failover", timeout=5)
+    assert failover.query("q") == "b: q"
+    stats = failover.stats()
+    assert stats["decisions"] == {"failover": 1}
+    assert stats["providers"]["primary"]["errors"] == 1
+    assert stats["providers"]["secondary"]["wins"] == 1
+
+
+def test_slow_primary_times_out():
+    failover = make_failover(FakeProvider("a", delay=1.0), FakeProvider("b"), mode="failover", timeout=0.1)
+    start = time.monotonic()
+    assert failover.query("q") == "b: q"
+    assert time.monotonic() - start < 0.8
+    assert failover.stats()["providers"]["primary"]["timeouts"] == 1
+
+
+def test_every_provider_failing_returns_an_error():
+    failover = make_failover(FakeProvider("a", fail=True), FakeProvider("b", fail=True), mode="failover", timeout=5)
+    response = failover.query("q")
+    assert response.startswith("Error querying providers:")
+    assert "a failed" in response and "b failed" in response
+    assert failover.stats()["decisions"] == {"all_failed": 1}
+
+
+def test_hung_primary_does_not_starve_the_secondary(monkeypatch):
+    # With few threads per provider, hung primary calls fill the primary's threads; the
+    # queries still reach the secondary and time out on run time, not time spent queued
+    monkeypatch.setattr(failover_provider, "MAX_WORKERS", 2)
+    release = threading.Event()
+    primary, secondary = FakeProvider("a"), FakeProvider("b")
+    primary.query = lambda query, context="": release.wait(10) and "late"
+    failover = make_failover(primary, secondary, mode="failover", timeout=0.2)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            responses = list(executor.map(failover.query, [f"q{number}" for number in range(8)]))
+    finally:
+        release.set()
+    assert responses == [f"b: q{number}" for number in range(8)]
+    assert failover.stats()["decisions"] == {"failover": 8}
+
+
+def test_failed_over_calls_use_the_secondarys_rate_limit():
+    primary, secondary = FakeProvider("a", fail=True), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="failover", timeout=5,
+                             rate_limiters={"secondary": TokenBucket(rate=20, burst=1)})
+    start = time.monotonic()
+    assert [failover.query(f"q{number}") for number in range(3)] == ["b: q0", "b: q1", "b: q2"]
+    # One call at once, then one every 50ms
+    assert time.monotonic() - start >= 0.08
+    providers = failover.stats()["providers"]
+    assert providers["secondary"]["rate_limit_wait"] >= 0.08
+    assert providers["primary"]["rate_limit_wait"] == 0.0
+
+
+def test_rate_limited_primary_fails_over_after_the_timeout():
+    primary, secondary = FakeProvider("a"), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="failover", timeout=0.1,
+                             rate_limiters={"primary": TokenBucket(rate=1, burst=1)})
+    assert failover.query("q0") == "a: q0"
+    # The primary's next call waits a second for its limiter, longer than the timeout
+    assert failover.query("q1") == "b: q1"
+    assert failover.stats()["decisions"] == {"primary": 1, "failover": 1}
+
+
+def test_async_calls_use_each_providers_rate_limit():
+    failover = make_failover(FakeProvider("a", fail=True), FakeProvider("b"), mode="failover", timeout=5,
+                             rate_limiters={"secondary": TokenBucket(rate=20, burst=1)})
+
+    async def main():
+        return await asyncio.gather(*(failover.aquery(f"q{number}") for number in range(3)))
+
+    assert asyncio.run(main()) == ["b: q0", "b: q1", "b: q2"]
+    assert failover.stats()["providers"]["secondary"]["rate_limit_wait"] >= 0.08
+
+
+def test_hedge_fires_when_the_primary_is_slow():
+    primary, secondary = FakeProvider("a", delay=1.0), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=0.05)
+    start = time.monotonic()
+    assert failover.query("q") == "b: q"
+    assert time.monotonic() - start < 0.8
+    assert failover.stats()["decisions"] == {"hedge_won_secondary": 1}
+
+
+def test_no_hedge_when_the_primary_is_fast():
+    primary, secondary = FakeProvider("a"), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=0.5)
+    assert failover.query("q") == "a: q"
+    assert secondary.calls == 0
+    assert failover.stats()["decisions"] == {"primary": 1}
+
+
+def test_hedge_fails_over_when_the_primary_errors_early():
+    primary, secondary = FakeProvider("a", fail=True), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=5)
+    start = time.monotonic()
+    assert failover.query("q") == "b: q"
+    assert time.monotonic() - start < 1
+    assert failover.stats()["decisions"] == {"failover": 1}
+
+
+def test_hedge_gives_up_when_both_providers_hang():
+    primary, secondary = FakeProvider("a", delay=1.0), FakeProvider("b", delay=1.0)
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=0.05, timeout=0.2)
+    start = time.monotonic()
+    response = failover.query("q")
+    # The secondary, sent at 0.05s, has had its 0.2s
+    assert 0.2 <= time.monotonic() - start < 0.6
+    assert response == "Error querying providers: primary: timed out after 0.2s; secondary: timed out after 0.2s"
+    stats = failover.stats()
+    assert stats["decisions"] == {"all_failed": 1}
+    assert stats["providers"]["primary"]["timeouts"] == stats["providers"]["secondary"]["timeouts"] == 1
+
+
+def test_async_hedge_gives_up_when_both_providers_hang():
+    primary, secondary = FakeProvider("a", delay=5.0), FakeProvider("b", delay=5.0)
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=0.05, timeout=0.2)
+
+    async def main():
+        response = await failover.aquery("q")
+        await asyncio.sleep(0)
+        return response
+
+    start = time.monotonic()
+    assert asyncio.run(main()).startswith("Error querying providers: ")
+    assert time.monotonic() - start < 0.6
+    assert primary.cancelled == secondary.cancelled == 1
+    assert failover.stats()["decisions"] == {"all_failed": 1}
+
+
+def test_hedge_delay_becomes_the_primarys_p95():
+    failover = make_failover(FakeProvider("a"), FakeProvider("b"), mode="hedge", hedge_delay=5)
+    assert failover._delay() == 5
+    for _ in range(failover_provider.MIN_HEDGE_SAMPLES):
+        failover._record("primary", "success", 0.01)
+    assert failover._delay() == pytest.approx(0.01)
+
+
+def test_concurrent_hedged_queries():
+    primary, secondary = FakeProvider("a", delay=0.3), FakeProvider("b", delay=0.01)
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=0.05)
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        responses = list(executor.map(failover.query, [f"q{number}" for number in range(40)]))
+    assert responses == [f"b: q{number}" for number in range(40)]
+    stats = failover.stats()
+    assert stats["decisions"] == {"hedge_won_secondary": 40}
+    assert stats["providers"]["primary"]["requests"] == 40
+
+
+def test_async_failover_and_timeout():
+    failover = make_failover(FakeProvider("a", delay=1.0), FakeProvider("b"), mode="failover", timeout=0.1)
+
+    async def main():
+        return await asyncio.gather(*(failover.aquery(f"q{number}") for number in range(10)))
+
+    assert asyncio.run(main()) == [f"b: q{number}" for number in range(10)]
+    assert failover.stats()["providers"]["primary"]["timeouts"] == 10
+
+
+def test_async_hedge_cancels_the_losing_request():
+    primary, secondary = FakeProvider("a", delay=1.0), FakeProvider("b")
+    failover = make_failover(primary, secondary, mode="hedge", hedge_delay=0.05)
+
+    async def main():
+        response = await failover.aquery("q")
+        await asyncio.sleep(0)
+        return response
+
+    assert asyncio.run(main()) == "b: q"
+    assert primary.cancelled == 1
+    assert failover.stats()["decisions"] == {"hedge_won_secondary": 1}
+
+
+def test_stream_fails_over_before_the_first_token():
+    failover = make_failover(FakeProvider("a", fail=True), FakeProvider("b"), mode="failover", timeout=5)
+    assert "".join(failover.stream_query("q")) == "b0 b1 b2 "
+    assert failover.stats()["decisions"] == {"failover": 1}
+
+
+def test_async_stream_fails_over_before_the_first_token():
+    failover = make_failover(FakeProvider("a", fail=True), FakeProvider("b"), mode="failover", timeout=5)
+
+    async def main():
+        return "".join([token async for token in failover.astream_query("q")])
+
+    assert asyncio.run(main()) == "b0 b1 b2 "
@@ -0,0 +1,104 @@
+import json
+import time
+import pytest
+import requests
+from fake_llm_server import DISTRIBUTIONS, FakeBehaviour, FakeGeminiClient, FakeLLMServer
+
+
+@pytest.fixture
+def server():
+    with FakeLLMServer() as server:
+        yield server
+
+
+def post(server, path: str, payload: dict) -> requests.Response:
+    return requests.post(f"{server.url}{path}", json=payload, timeout=10)
+
+
+def test_chat_streams_ndjson_tokens(server):
+    response = post(server, "/api/chat", {"model": "mistral", "stream": True,
+                                          "messages": [{"role": "system", "content": "records"},
+                                                       {"role": "user", "content": "how are you"}]})
+    assert response.headers["Content-Type"] == "application/x-ndjson"
+    chunks = [json.loads(line) for line in response.text.splitlines() if line]
+    assert "".join(chunk["message"]["content"] for chunk in chunks) == "Echo: how are you"
+    assert [chunk["done"] for chunk in chunks] == [False] * (len(chunks) - 1) + [True]
+    assert chunks[-1]["eval_count"] == 4 and chunks[-1]["prompt_eval_count"] > 0
+
+
+def test_generate_without_streaming(server):
+    result = post(server, "/api/generate", {"model": "phi:latest", "prompt": "hello", "stream": False}).json()
+    assert result["response"] == "Echo: hello"
+    assert result["done"] and result["model"] == "phi:latest"
+
+
+def test_tokens_are_paced_by_tokens_per_second():
+    with FakeLLMServer(behaviour=FakeBehaviour(tokens_per_second=20)) as server:
+        start = time.monotonic()
+        arrivals = []
+        with requests.post(f"{server.url}/api/generate", stream=True, timeout=10,
+                           json={"model": "mistral", "prompt": "one two three four"}) as response:
+            for line in response.iter_lines():
+                if line:
+                    arrivals.append(time.monotonic() - start)
+    # Five tokens 50ms apart, then the final message
+    assert len(arrivals) == 6
+    assert arrivals[4] - arrivals[0] >= 0.18
+
+
+def test_injected_errors_use_the_configured_status():
+    with FakeLLMServer(behaviour=FakeBehaviour(error_rate=1.0, error_status=503)) as server:
+        response = post(server, "/api/chat", {"model": "mistral", "messages": []})
+        assert response.status_code == 503
+        assert response.json() == {"error": "injected failure"}
+        assert (server.requests, server.errors) == (1, 1)
+
+
+def test_unknown_models_and_paths_are_404(server):
+    assert post(server, "/api/chat", {"model": "gpt-4", "messages": []}).status_code == 404
+    assert requests.get(f"{server.url}/api/nothing", timeout=10).status_code == 404
+
+
+def test_models_are_listed_and_loaded_on_first_use(server):
+    tags = requests.get(f"{server.url}/api/tags", timeout=10).json()
+    assert [model["name"] for model in tags["models"]] == server.models
+    assert requests.get(f"{server.url}/api/ps", timeout=10).json() == {"models": []}
+    post(server, "/api/generate", {"model": "llama2", "prompt": "hi", "stream": False})
+    loaded = requests.get(f"{server.url}/api/ps", timeout=10).json()["models"]
+    assert [model["name"] for model in loaded] == ["llama2:latest"]
+
+
+@pytest.mark.parametrize("latency", DISTRIBUTIONS)
+def test_seeded_behaviour_repeats(latency):
+    def sample(behaviour):
+        return [(behaviour.first_token_delay(), behaviour.should_fail()) for _ in range(50)]
+
+    first = sample(FakeBehaviour(latency, latency_ms=100, error_rate=0.3, seed=7))
+    assert first == sample(FakeBehaviour(latency, latency_ms=100, error_rate=0.3, seed=7))
+    assert all(delay >= 0 for delay, _ in first)
+    assert 0 < sum(failed for _, failed in first) < 50
+
+
+def test_canned_responses_cycle():
+    behaviour = FakeBehaviour(response="canned", canned_responses=["first", "second"])
+    assert [behaviour.answer("q") for _ in range(3)] == ["first", "second", "first"]
+
+
+def test_invalid_options_are_rejected():
+    with pytest.raises(ValueError):
+        FakeBehaviour(latency="pareto")
+    with pytest.raises(ValueError):
+        FakeBehaviour(response="random")
+
+
+def test_gemini_client_streams_and_injects_errors():
+    client = FakeGeminiClient(FakeBehaviour(error_rate=1.0))
+    model = client.model("gemini")
+    with pytest.raises(RuntimeError):
+        model.generate_content("Question: q")
+    assert client.errors == 1
+
+    client.behaviour = FakeBehaviour()
+    chunks = list(model.generate_content("records\n\nQuestion: what now", stream=True))
+    assert "".join(chunk.text for chunk in chunks) == "Echo: what now"
+    assert len(chunks) == 3
@@ -0,0 +1,186 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from config import Config
+from fake_llm_server import FakeBehaviour, FakeGeminiClient, FakeGeminiError
+from gemini_provider import GeminiProvider
+from rag_engine import RAGEngine
+
+
+@pytest.fixture(autouse=True)
+def caching(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_CONTEXT_CACHE_ENABLED", True)
+    monkeypatch.setattr(Config, "GEMINI_CONTEXT_CACHE_MIN_TOKENS", 10)
+    monkeypatch.setattr(Config, "GEMINI_CONTEXT_CACHE_MAX_ENTRIES", 8)
+
+
+def make_context(label: str) -> str:
+    return f"# Database {label}\n" + "Alice Johnson studies Computer Science with a 3.8 GPA. " * 5
+
+
+def test_cache_hit_reuses_the_handle():
+    client = FakeGeminiClient()
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    assert provider.query("first?", context) == "Echo: first?"
+    assert provider.query("second?", context) == "Echo: second?"
+    assert list(client.caches.values()) == [context]
+    # Only the question is sent once the prompt is cached
+    assert client.prompts == ["Question: first?", "Question: second?"]
+    assert provider.context_cache_stats() == {"created": 1, "reused": 1, "inline": 0, "failures": 0, "entries": 1}
+
+
+def test_database_change_creates_a_new_cache():
+    client = FakeGeminiClient()
+    provider = GeminiProvider(client=client)
+    provider.query("q", make_context("v1"))
+    provider.query("q", make_context("v2"))
+    assert sorted(client.caches.values()) == [make_context("v1"), make_context("v2")]
+    assert provider.context_cache_stats()["created"] == 2
+
+
+def test_least_recently_used_cache_is_deleted(monkeypatch):
+    monkeypatch.setattr(Config, "GEMINI_CONTEXT_CACHE_MAX_ENTRIES", 2)
+    client = FakeGeminiClient()
+    provider = GeminiProvider(client=client)
+    provider.query("q", make_context("a"))
+    provider.query("q", make_context("b"))
+    provider.query("q", make_context("a"))
+    provider.query("q", make_context("c"))
+    assert sorted(client.caches.values()) == [make_context("a"), make_context("c")]
+    assert provider.context_cache_stats()["entries"] == 2
+
+
+def test_failed_create_falls_back_to_the_inline_prompt():
+    client = FakeGeminiClient(cache_min_tokens=100000)
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    assert provider.query("first?", context) == "Echo: first?"
+    assert provider.query("second?", context) == "Echo: second?"
+    assert client.caches == {}
+    assert client.prompts == [f"{context}\n\nQuestion: first?", f"{context}\n\nQuestion: second?"]
+    # A refused prompt is not offered to the caching API again
+    assert provider.context_cache_stats() == {"created": 0, "reused": 0, "inline": 2, "failures": 1, "entries": 0}
+
+
+def test_transient_failure_keeps_the_cache():
+    client = FakeGeminiClient(FakeBehaviour(error_status=503))
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    provider.query("first?", context)
+
+    client.behaviour.error_rate = 1.0
+    assert provider.query("second?", context) == "Error querying Gemini: 503 injected failure"
+    client.behaviour.error_rate = 0.0
+    assert provider.query("third?", context) == "Echo: third?"
+
+    # One request per question: the failed one is not resent inline
+    assert client.prompts == ["Question: first?", "Question: second?", "Question: third?"]
+    assert len(client.caches) == 1
+    assert provider.context_cache_stats() == {"created": 1, "reused": 2, "inline": 0, "failures": 0, "entries": 1}
+
+
+def test_transient_stream_failure_keeps_the_cache():
+    client = FakeGeminiClient(FakeBehaviour(error_status=500))
+    provider = GeminiProvider(client=client, raise_errors=True)
+    context = make_context("v1")
+    provider.query("first?", context)
+    client.behaviour.error_rate = 1.0
+    with pytest.raises(FakeGeminiError):
+        list(provider.stream_query("second?", context))
+    client.behaviour.error_rate = 0.0
+    assert "".join(provider.stream_query("third?", context)) == "Echo: third?"
+    assert client.prompts[-1] == "Question: third?" and provider.context_cache_stats()["created"] == 1
+
+
+def test_expired_cache_is_resent_inline_and_recreated():
+    client = FakeGeminiClient()
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    provider.query("first?", context)
+    # The server dropped the cache before the provider's TTL ran out
+    client.caches.clear()
+    assert provider.query("second?", context) == "Echo: second?"
+    assert client.prompts[-2:] == ["Question: second?", f"{context}\n\nQuestion: second?"]
+    assert provider.query("third?", context) == "Echo: third?"
+    assert client.prompts[-1] == "Question: third?"
+    assert list(client.caches.values()) == [context]
+    stats = provider.context_cache_stats()
+    assert stats["created"] == 2 and stats["failures"] == 1
+
+
+def test_transient_create_failure_is_retried_later(monkeypatch):
+    client = FakeGeminiClient()
+    create_cache = client.create_cache
+    failures = [FakeGeminiError(503, "backend unavailable")]
+
+    def flaky_create(*args):
+        if failures:
+            raise failures.pop()
+        return create_cache(*args)
+
+    client.create_cache = flaky_create
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    assert provider.query("first?", context) == "Echo: first?"
+    assert provider.query("second?", context) == "Echo: second?"
+    assert client.caches == {}
+
+    monkeypatch.setattr(Config, "GEMINI_CONTEXT_CACHE_RETRY_SECONDS", 0)
+    provider = GeminiProvider(client=client)
+    failures.append(FakeGeminiError(503, "backend unavailable"))
+    provider.query("third?", context)
+    assert provider.query("fourth?", context) == "Echo: fourth?"
+    assert client.prompts[-1] == "Question: fourth?"
+
+
+def test_short_prompts_are_sent_inline():
+    client = FakeGeminiClient()
+    provider = GeminiProvider(client=client)
+    assert provider.query("q", "tiny") == "Echo: q"
+    assert client.caches == {}
+    assert provider.context_cache_stats()["inline"] == 1
+
+
+def test_concurrent_first_calls_create_one_cache():
+    client = FakeGeminiClient()
+    create_cache = client.create_cache
+    creates = []
+
+    def slow_create(*args):
+        creates.append(threading.current_thread().name)
+        time.sleep(0.2)
+        return create_cache(*args)
+
+    client.create_cache = slow_create
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        responses = list(executor.map(lambda number: provider.query(f"q{number}", context), range(8)))
+    assert responses == [f"Echo: q{number}" for number in range(8)]
+    assert len(creates) == 1
+    stats = provider.context_cache_stats()
+    assert stats["created"] == 1 and stats["reused"] == 7
+
+
+def test_stream_uses_the_cached_prompt():
+    client = FakeGeminiClient()
+    provider = GeminiProvider(client=client)
+    context = make_context("v1")
+    provider.query("first?", context)
+    assert "".join(provider.stream_query("second question?", context)) == "Echo: second question?"
+    assert client.prompts[-1] == "Question: second question?"
+
+
+def test_full_retrieval_mode_reuses_one_cache(monkeypatch):
+    # Keyword retrieval sends a different context per question; "full" sends the same one
+    monkeypatch.setattr(Config, "RETRIEVAL_MODE", "full")
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    client = FakeGeminiClient()
+    engine = RAGEngine(provider=GeminiProvider(client=client))
+    questions = ["Compare all students", "Which courses are hardest?", "Summarise grades"]
+    for question in questions:
+        assert engine.query(question) == f"Echo: {question}"
+    stats = engine.provider.context_cache_stats()
+    assert stats["created"] == 1 and stats["reused"] == len(questions) - 1
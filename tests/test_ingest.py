@@ -0,0 +1,160 @@
+import json
+import pytest
+from sqlalchemy import inspect
+import ingest
+from sql_database import SQLDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLDatabase(f"sqlite:///{tmp_path / 'students.db'}", seed=False)
+
+
+def write(path, text: str) -> str:
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def rejects(stats: dict) -> list:
+    with open(stats["rejects_file"], encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def load(kind: str, path: str, db, **kwargs) -> dict:
+    return ingest.ingest(kind, path, db, progress=lambda message: None, **kwargs)
+
+
+COURSES_CSV = (
+    "id,name,instructor,credits,description\n"
+    "CS101,Intro to Programming,Dr. Lee,3,Basics\n"
+    "CS201,Data Structures,Dr. Chen,4,\n"
+)
+
+
+def test_csv_load(tmp_path, db):
+    stats = load("courses", write(tmp_path / "courses.csv", COURSES_CSV), db)
+    assert (stats["rows"], stats["inserted"], stats["rejected"]) == (2, 2, 0)
+    assert db.get_course_info("CS201") == {"name": "Data Structures", "instructor": "Dr. Chen",
+                                           "credits": 4, "description": ""}
+
+    path = write(tmp_path / "students.csv",
+                 "id,name,email,major,gpa,courses,grades\n"
+                 "STU001,Alice Johnson,alice@university.edu,Computer Science,3.8,CS101;CS201,CS101:a\n")
+    assert load("students", path, db)["inserted"] == 1
+    assert db.get_student_info("STU001") == {
+        "name": "Alice Johnson", "email": "alice@university.edu", "major": "Computer Science",
+        "gpa": 3.8, "courses": ["CS101", "CS201"], "grades": {"CS101": "A"}
+    }
+
+
+def test_jsonl_load(tmp_path, db):
+    rows = [
+        {"id": "STU001", "name": "Alice Johnson", "email": "alice@university.edu", "major": "Physics",
+         "gpa": 3.5, "courses": ["PHY101"], "grades": {"PHY101": "B+"}},
+        {"id": "STU002", "name": "Bob Smith", "email": "bob@university.edu", "major": "Physics", "gpa": "2.9"}
+    ]
+    path = write(tmp_path / "students.jsonl", "".join(json.dumps(row) + "\n\n" for row in rows))
+    stats = load("students", path, db)
+    assert (stats["rows"], stats["inserted"], stats["rejected"]) == (2, 2, 0)
+    assert db.get_student_info("STU001")["grades"] == {"PHY101": "B+"}
+    assert db.get_student_info("STU002")["courses"] == []
+    assert db.find_students_by_major("physics") == ["STU001", "STU002"]
+
+
+def test_bad_rows_are_rejected_without_stopping_the_load(tmp_path, db):
+    good = {"id": "STU001", "name": "Alice Johnson", "email": "alice@university.edu",
+            "major": "Physics", "gpa": 3.5}
+    lines = [
+        json.dumps(good),
+        json.dumps({**good, "id": "STU002", "email": 123}),
+        json.dumps({**good, "id": "STU003", "gpa": 5}),
+        json.dumps({**good, "id": "STU004", "name": ""}),
+        json.dumps({**good, "id": "STU005", "grades": {"PHY101": "Z"}}),
+        "{not json",
+        json.dumps(["a", "list"]),
+        json.dumps({**good, "name": "Alice Again"}),
+        json.dumps({**good, "id": "STU009"})
+    ]
+    path = write(tmp_path / "students.jsonl", "\n".join(lines) + "\n")
+    stats = load("students", path, db)
+    assert (stats["rows"], stats["inserted"], stats["rejected"]) == (9, 2, 7)
+    errors = {reject["line"]: reject["error"] for reject in rejects(stats)}
+    assert errors == {
+        2: "email must be a string: 123",
+        3: "gpa out of range: 5.0",
+        4: "missing field: name",
+        5: "invalid grade: 'Z'",
+        6: errors[6],
+        7: "row is not a JSON object",
+        8: "duplicate of line 1 in this chunk"
+    }
+    assert errors[6].startswith("invalid JSON")
+    assert stats["rejects_file"] == f"{path}.rejects.jsonl"
+    assert sorted(db.get_all_students()) == ["STU001", "STU009"]
+
+
+def test_rows_conflicting_with_existing_data_are_rejected(tmp_path, db):
+    load("courses", write(tmp_path / "courses.csv", COURSES_CSV), db)
+    path = write(tmp_path / "more.csv",
+                 "id,name,instructor,credits,description\n"
+                 "CS301,Algorithms,Dr. Chen,4,Sorting\n"
+                 "CS101,Renamed,Dr. Lee,3,Duplicate of an earlier load\n")
+    # Chunks of one row each put the conflict in its own transaction
+    stats = load("courses", path, db, chunk_size=1)
+    assert (stats["inserted"], stats["rejected"]) == (1, 1)
+    [reject] = rejects(stats)
+    assert reject["line"] == 3 and reject["error"].startswith("conflicts with existing data")
+    assert db.get_course_info("CS101")["name"] == "Intro to Programming"
+    assert db.get_course_info("CS301")["name"] == "Algorithms"
+
+
+def test_grades_are_upserted(tmp_path, db):
+    db.bulk_insert_students([("STU001", {"name": "Alice Johnson", "email": "alice@university.edu",
+                                         "major": "Physics", "gpa": 3.5, "courses": ["PHY101"],
+                                         "grades": {}})])
+    path = write(tmp_path / "grades.csv",
+                 "student_id,course_id,grade\n"
+                 "STU001,PHY101,A-\n"
+                 "STU001,MATH201,B\n"
+                 "STU404,PHY101,A\n")
+    stats = load("grades", path, db)
+    assert (stats["inserted"], stats["rejected"]) == (2, 1)
+    assert rejects(stats)[0]["error"] == "unknown student: STU404"
+    info = db.get_student_info("STU001")
+    assert info["courses"] == ["PHY101", "MATH201"]
+    assert info["grades"] == {"PHY101": "A-", "MATH201": "B"}
+    assert db.get_record_version("STU001") == 1
+
+    path = write(tmp_path / "regrade.csv", "student_id,course_id,grade\nSTU001,PHY101,C\n")
+    load("grades", path, db)
+    assert db.get_student_info("STU001")["grades"]["PHY101"] == "C"
+    assert db.find_grades("a-") == []
+
+
+def index_names(url: str) -> set:
+    inspector = inspect(SQLDatabase(url, seed=False).engine)
+    return {index["name"] for table in ("students", "courses", "enrollments")
+            for index in inspector.get_indexes(table)}
+
+
+@pytest.mark.parametrize("keep_indexes", [False, True])
+def test_indexes_during_a_command_line_load(tmp_path, monkeypatch, capsys, keep_indexes):
+    url = f"sqlite:///{tmp_path / 'students.db'}"
+    all_indexes = index_names(url)
+    assert "ix_students_gpa" in all_indexes
+    seen = []
+
+    def run(*args):
+        seen.append(index_names(url))
+        return load_file(*args)
+
+    load_file = ingest.ingest
+    monkeypatch.setattr(ingest, "ingest", run)
+    argv = ["courses", write(tmp_path / "courses.csv", COURSES_CSV), "--database-url", url]
+    assert ingest.main(argv + ["--keep-indexes"] if keep_indexes else argv) == 0
+    assert "Loaded 2 of 2 courses rows" in capsys.readouterr().out
+
+    # Secondary indexes are dropped for the load unless kept, and always rebuilt after it
+    assert seen == [all_indexes if keep_indexes else set()]
+    assert index_names(url) == all_indexes
+    assert SQLDatabase(url, seed=False).find_courses_by_instructor("dr chen") == ["CS201"]
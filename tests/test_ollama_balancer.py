@@ -0,0 +1,128 @@
+import pytest
+from fake_llm_server import FakeBehaviour, FakeLLMServer
+from ollama_balancer import EndpointPool
+from ollama_provider import OllamaProvider
+
+MODEL = "mistral:latest"
+
+
+@pytest.fixture
+def servers():
+    started = [FakeLLMServer().start(), FakeLLMServer().start()]
+    yield started
+    for server in started:
+        server.stop()
+
+
+def make_provider(servers, **options) -> OllamaProvider:
+    """An OllamaProvider over the fake servers, using a pool with no background health checks"""
+    provider = OllamaProvider(MODEL, base_urls=[server.url for server in servers], raise_errors=True)
+    provider.pool = EndpointPool([server.url for server in servers], health_check_interval=0, **options)
+    return provider
+
+
+def test_least_outstanding_picks_the_idle_server(servers):
+    pool = EndpointPool([server.url for server in servers], prefer_loaded=False, health_check_interval=0)
+    first = pool.select(MODEL)
+    second = pool.select(MODEL)
+    assert first is not second
+    pool.release(first, 0.1, True)
+    assert pool.select(MODEL) is first
+
+
+def test_requests_are_spread_over_every_server(servers):
+    provider = make_provider(servers, prefer_loaded=False)
+    for number in range(10):
+        assert provider.query(f"question {number}") == f"Echo: question {number}"
+    assert [server.requests for server in servers] == [5, 5]
+    assert all(endpoint["outstanding"] == 0 for endpoint in provider.pool.stats())
+
+
+def test_latency_strategy_prefers_the_faster_server(servers):
+    pool = EndpointPool([server.url for server in servers], strategy="latency", prefer_loaded=False,
+                        health_check_interval=0)
+    slow, fast = pool.endpoints
+    pool.release(pool.select(), 0.0, True)
+    pool.release(pool.select(), 0.0, True)
+    slow.latency, fast.latency = 1.0, 0.1
+    # Even with a request already in flight, the fast server is expected to answer sooner
+    held = pool.select()
+    assert held is fast
+    assert pool.select() is fast
+
+
+def test_prefer_loaded_sends_requests_to_the_warm_server(servers):
+    provider = make_provider(servers, prefer_loaded=True)
+    provider.query("warm up")
+    warm = [server for server in servers if server.requests == 1]
+    assert len(warm) == 1
+    for number in range(5):
+        provider.query(f"question {number}")
+    assert warm[0].requests == 6
+
+
+def test_failing_server_is_ejected(servers):
+    failing, healthy = servers
+    failing.behaviour = FakeBehaviour(error_rate=1.0, error_status=500)
+    provider = make_provider(servers, prefer_loaded=False, eject_after_failures=2, eject_seconds=60)
+    answers = []
+    for number in range(10):
+        try:
+            answers.append(provider.query(f"question {number}"))
+        except RuntimeError:
+            pass
+    # Two failures in a row eject it; every later request goes to the healthy server
+    assert failing.requests == 2
+    assert healthy.requests == 8
+    assert len(answers) == 8
+    assert [endpoint["healthy"] for endpoint in provider.pool.stats()] == [False, True]
+
+
+def test_health_check_restores_a_recovered_server(servers):
+    failing, healthy = servers
+    failing.behaviour = FakeBehaviour(error_rate=1.0, error_status=500)
+    provider = make_provider(servers, prefer_loaded=False, eject_after_failures=1, eject_seconds=60)
+    for number in range(4):
+        try:
+            provider.query(f"question {number}")
+        except RuntimeError:
+            pass
+    assert not provider.pool.endpoints[0].healthy
+
+    failing.behaviour = FakeBehaviour()
+    provider.pool.check_health()
+    assert provider.pool.endpoints[0].healthy
+    for number in range(4):
+        provider.query(f"question {number}")
+    assert failing.requests == 1 + 2
+    assert healthy.requests == 3 + 2
+
+
+def test_health_check_ejects_an_unreachable_server(servers):
+    pool = EndpointPool([server.url for server in servers], prefer_loaded=False, health_check_interval=0)
+    servers[0].stop()
+    pool.check_health()
+    down, up = pool.endpoints
+    assert not down.healthy and up.healthy
+    assert all(pool.select() is up for _ in range(3))
+
+
+def test_health_check_reads_loaded_models(servers):
+    provider = make_provider(servers, prefer_loaded=True)
+    provider.query("warm up")
+    provider.pool.endpoints[0].loaded_models.clear()
+    provider.pool.endpoints[1].loaded_models.clear()
+    provider.pool.check_health()
+    loaded = [endpoint["loaded_models"] for endpoint in provider.pool.stats()]
+    assert sorted(loaded) == [[], ["mistral", "mistral:latest"]]
+
+
+def test_all_ejected_fails_open_on_the_server_due_back_first(servers):
+    pool = EndpointPool([server.url for server in servers], health_check_interval=0,
+                        eject_after_failures=1, eject_seconds=60)
+    first, second = pool.endpoints
+    pool.release(pool.select(), 0.0, False)
+    pool.release(pool.select(), 0.0, False)
+    assert not first.healthy and not second.healthy
+    first.ejected_until -= 30
+    assert pool.select() is first
@@ -0,0 +1,131 @@
+import io
+import json
+import time
+import pytest
+import requests
+import ollama_provider
+from config import Config
+from fake_llm_server import FakeBehaviour, FakeLLMServer, FakeOllamaHandler
+from ollama_balancer import EndpointPool
+from ollama_provider import OllamaProvider
+from token_budget import count_tokens
+
+MODEL = "mistral:latest"
+
+
+class FailFirst(FakeBehaviour):
+    """Fails the first `failures` requests with error_status, then answers normally"""
+
+    def __init__(self, failures: int, **options):
+        super().__init__(**options)
+        self.failures = failures
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            self.failures -= 1
+            return self.failures >= 0
+
+
+@pytest.fixture
+def server(monkeypatch):
+    # Sessions are built from Config when first used, so start each test without any
+    monkeypatch.setattr(ollama_provider, "_sessions", {})
+    monkeypatch.setattr(Config, "OLLAMA_RETRY_BACKOFF", 0)
+    with FakeLLMServer() as server:
+        yield server
+
+
+def make_provider(server, raise_errors: bool = False) -> OllamaProvider:
+    provider = OllamaProvider(MODEL, base_urls=[server.url], raise_errors=raise_errors)
+    provider.pool = EndpointPool([server.url], health_check_interval=0)
+    return provider
+
+
+def test_sequential_queries_reuse_one_connection(server, monkeypatch):
+    ports = []
+    do_post = FakeOllamaHandler.do_POST
+
+    def recording_do_post(handler):
+        ports.append(handler.client_address[1])
+        do_post(handler)
+
+    monkeypatch.setattr(FakeOllamaHandler, "do_POST", recording_do_post)
+    provider = make_provider(server, raise_errors=True)
+    for number in range(5):
+        assert provider.query(f"question {number}") == f"Echo: question {number}"
+    assert list(provider.stream_query("streamed")) == ["Echo: ", "streamed"]
+    assert len(ports) == 6
+    assert len(set(ports)) == 1
+
+
+def test_service_unavailable_is_retried(server, monkeypatch):
+    monkeypatch.setattr(Config, "OLLAMA_MAX_RETRIES", 3)
+    server.behaviour = FailFirst(2, error_status=503)
+    assert make_provider(server).query("question") == "Echo: question"
+    assert server.requests == 3
+    assert server.errors == 2
+
+
+def test_retries_give_up_with_the_last_status(server, monkeypatch):
+    monkeypatch.setattr(Config, "OLLAMA_MAX_RETRIES", 2)
+    server.behaviour = FakeBehaviour(error_rate=1.0, error_status=503)
+    assert make_provider(server).query("question") == "Error: Ollama returned status 503"
+    assert server.requests == 3
+
+
+def test_server_errors_are_not_retried(server):
+    server.behaviour = FailFirst(1, error_status=500)
+    assert make_provider(server).query("question") == "Error: Ollama returned status 500"
+    assert server.requests == 1
+
+
+def test_read_timeouts_are_not_replayed(server, monkeypatch):
+    monkeypatch.setattr(Config, "OLLAMA_MAX_RETRIES", 3)
+    monkeypatch.setattr(Config, "OLLAMA_READ_TIMEOUT", 0.2)
+    server.behaviour = FakeBehaviour(latency_ms=500)
+    provider = make_provider(server, raise_errors=True)
+    with pytest.raises(requests.exceptions.RequestException):
+        provider.query("question")
+    # Give a replayed request time to arrive before counting
+    time.sleep(0.5)
+    assert server.requests == 1
+
+
+def test_chat_payload_and_prompt_eval_stats(server, monkeypatch):
+    payloads = []
+    do_post = FakeOllamaHandler.do_POST
+
+    def recording_do_post(handler):
+        body = handler.rfile.read(int(handler.headers["Content-Length"]))
+        payloads.append(json.loads(body))
+        rfile, handler.rfile = handler.rfile, io.BytesIO(body)
+        try:
+            do_post(handler)
+        finally:
+            handler.rfile = rfile
+
+    monkeypatch.setattr(FakeOllamaHandler, "do_POST", recording_do_post)
+    monkeypatch.setattr(Config, "OLLAMA_KEEP_ALIVE", "5m")
+    server.behaviour = FakeBehaviour(latency_ms=100)
+    provider = make_provider(server, raise_errors=True)
+    context = "You are a university assistant.\nStudent STU001: Alice Johnson"
+    assert provider.query("What is Alice's GPA?", context) == "Echo: Question: What is Alice's GPA?"
+    assert provider.query("Hello") == "Echo: Hello"
+
+    with_context, without_context = payloads
+    # The context is its own system message ahead of the question, so it is a stable prefix
+    assert with_context["messages"] == [
+        {"role": "system", "content": context},
+        {"role": "user", "content": "Question: What is Alice's GPA?"}
+    ]
+    assert without_context["messages"] == [{"role": "user", "content": "Hello"}]
+    assert all(payload["keep_alive"] == "5m" and payload["stream"] is False for payload in payloads)
+    assert all("context" not in payload for payload in payloads)
+
+    stats = provider.prompt_eval_stats()
+    prompt_tokens = count_tokens(context + "\nQuestion: What is Alice's GPA?") + count_tokens("Hello")
+    assert stats["requests"] == 2
+    assert stats["prompt_tokens"] == prompt_tokens
+    assert stats["avg_prompt_tokens"] == prompt_tokens / 2
+    assert stats["prompt_eval_seconds"] == pytest.approx(0.2)
+    assert stats["avg_prompt_eval_seconds"] == pytest.approx(0.1)
@@ -0,0 +1,75 @@
+import threading
+import time
+import pytest
+import database
+from config import Config
+from database import Database
+from rag_engine import RAGEngine
+from rate_limiter import TokenBucket
+
+
+class ScriptedProvider:
+    """Answers after a per-question delay; raises or returns an error string for chosen questions"""
+
+    model_name = "mistral"
+
+    def __init__(self, delays: dict):
+        self.delays = delays
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def query(self, query: str, context: str = "") -> str:
+        with self._lock:
+            self.calls.append((query, time.monotonic()))
+        time.sleep(self.delays.get(query, 0.0))
+        if query.startswith("raise"):
+            raise ConnectionError("connection reset")
+        if query.startswith("error"):
+            return "Error querying Ollama: 503 Service Unavailable"
+        return f"answer to {query}"
+
+
+@pytest.fixture
+def make_engine(monkeypatch):
+    monkeypatch.setattr(database, "_shared_database", Database())
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    monkeypatch.setattr(Config, "SINGLE_FLIGHT_ENABLED", False)
+
+    def make(provider) -> RAGEngine:
+        engine = RAGEngine(provider_type="ollama", provider=provider)
+        engine.cache = None
+        return engine
+    return make
+
+
+def test_results_keep_input_order_and_capture_errors(make_engine):
+    # Earlier questions answer last, so completion order is the reverse of input order
+    questions = ["slow question", "raise now", "error please", "fast question"]
+    provider = ScriptedProvider({"slow question": 0.3, "raise now": 0.2, "error please": 0.1})
+    results = make_engine(provider).query_batch(questions, max_workers=4)
+
+    assert [result["question"] for result in results] == questions
+    slow, raised, error, fast = results
+    assert (slow["response"], slow["success"], slow["error"]) == ("answer to slow question", True, None)
+    assert (raised["source"], raised["success"], raised["error"]) == ("error", False, "connection reset")
+    assert error["success"] is False and error["error"] == "Error querying Ollama: 503 Service Unavailable"
+    assert fast["response"] == "answer to fast question" and fast["prompt_tokens"] > 0
+    assert slow["latency"] >= 0.3 > fast["latency"]
+
+
+def test_rate_limiter_wait_is_reported_apart_from_latency(make_engine):
+    engine = make_engine(ScriptedProvider({}))
+    # One call at once, then one every 50ms
+    engine.rate_limiter = TokenBucket(rate=20, burst=1)
+    questions = [f"question {number}" for number in range(5)]
+    start = time.monotonic()
+    results = engine.query_batch(questions, max_workers=5)
+    assert time.monotonic() - start >= 0.19
+
+    assert all(result["success"] for result in results)
+    waits = sorted(result["rate_limit_wait"] for result in results)
+    assert waits[0] == 0.0 and waits[-1] >= 0.19
+    assert sum(waits) == pytest.approx(0.05 + 0.1 + 0.15 + 0.2, abs=0.05)
+    assert all(result["latency"] < 0.1 for result in results)
+    calls = sorted(started for _question, started in engine.provider.calls)
+    assert all(later - earlier >= 0.04 for earlier, later in zip(calls, calls[1:]))
@@ -0,0 +1,86 @@
+import pytest
+from database import Database
+from query_router import QueryRouter
+
+
+@pytest.fixture
+def router():
+    return QueryRouter(Database())
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("What is Alice Johnson's GPA and major?", "Alice Johnson (STU001):\n- GPA: 3.8\n- Major: Computer Science"),
+    ("What is Alice's GPA and major?", "Alice Johnson (STU001):\n- GPA: 3.8\n- Major: Computer Science"),
+    ("What grade did Bob Smith get in CS101?", "Bob Smith (STU002):\n- Grade in CS101: B+"),
+    ("Who teaches Machine Learning Fundamentals?", "ML101: Machine Learning Fundamentals\n- Instructor: Dr. Brown"),
+    ("How many students are enrolled in CS101?",
+     "3 students are enrolled in CS101 (Introduction to Computer Science)."),
+    ("Who has the highest GPA?", "Carol Davis (STU003) has the highest GPA: 3.9."),
+])
+def test_lookups_are_answered_from_the_database(router, question, answer):
+    assert router.route(question) == answer
+
+
+def test_grade_listing(router):
+    answer = router.route("Which students got A grades?")
+    assert answer.startswith("A grades in the database:")
+    assert "- Bob Smith (STU002): STAT101" in answer
+    assert "A-" not in answer
+
+
+@pytest.mark.parametrize("question", [
+    # Analysis
+    "Compare Alice Johnson and Bob Smith",
+    "Why is Carol Davis's GPA so high?",
+    "What courses should Bob Smith take next?",
+    # Negation
+    "Is Alice Johnson not enrolled in CS101?",
+    "Which students are not in CS101?",
+    # Several entities
+    "What are Alice Johnson and Carol Davis's GPAs?",
+    "Who teaches CS101 and CS201?",
+    # Asks for something the lookup does not cover
+    "What is Alice Johnson's GPA and favourite food?",
+    "Who has the highest and lowest GPA?",
+])
+def test_other_questions_fall_back_to_the_llm(router, question):
+    assert router.route(question) is None
+
+
+def test_ambiguous_names_fall_back():
+    db = Database()
+    db.add_student("STU999", {"name": "Alice Cooper", "email": "cooper@university.edu", "major": "Music",
+                              "gpa": 3.1, "courses": [], "grades": {}})
+    router = QueryRouter(db)
+    assert router.route("What is Alice's GPA?") is None
+    assert router.route("What is Alice Cooper's GPA?") == "Alice Cooper (STU999):\n- GPA: 3.1"
+
+
+def test_answers_follow_database_updates():
+    db = Database()
+    router = QueryRouter(db)
+    db.update_course("ML101", {"instructor": "Dr. Green"})
+    assert router.route("Who teaches ML101?") == "ML101: Machine Learning Fundamentals\n- Instructor: Dr. Green"
+
+
+def test_gpa_ties_name_every_student():
+    db = Database()
+    router = QueryRouter(db)
+    db.update_student("STU001", {"gpa": 3.9})
+    assert router.route("Who has the highest GPA?") == (
+        "Alice Johnson (STU001) and Carol Davis (STU003) share the highest GPA: 3.9.")
+    for number in range(5):
+        db.add_student(f"STU10{number}", {"name": f"Student {number}", "email": f"s{number}@university.edu",
+                                          "major": "Music", "gpa": 3.9, "courses": [], "grades": {}})
+    answer = router.route("Who has the highest GPA?")
+    assert answer.startswith("Alice Johnson (STU001), Carol Davis (STU003), Student 0 (STU100),")
+    assert answer.endswith("and Student 4 (STU104) share the highest GPA: 3.9.")
+    assert router.route("Who has the lowest GPA?") == "Bob Smith (STU002) has the lowest GPA: 3.6."
+
+
+def test_stats_count_hits_by_intent(router):
+    router.route("Who teaches ML101?")
+    router.route("What is Alice Johnson's GPA?")
+    router.route("Compare Alice Johnson and Bob Smith")
+    assert router.stats() == {"hits": 2, "misses": 1, "hit_rate": 2 / 3,
+                              "hits_by_intent": {"course_instructor": 1, "student_lookup": 1}}
@@ -0,0 +1,118 @@
+import pytest
+import database
+import response_cache
+from config import Config
+from database import Database
+from rag_engine import RAGEngine
+from response_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend, make_cache_key
+
+
+class Clock:
+    """Stands in for the time module so TTLs can be tested without sleeping"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class CountingProvider:
+    model_name = "mistral"
+
+    def __init__(self):
+        self.calls = 0
+
+    def query(self, query: str, context: str = "") -> str:
+        self.calls += 1
+        return f"answer {self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_backend(request, tmp_path):
+    def make(max_entries: int = 10, ttl: float = 60):
+        if request.param == "memory":
+            return MemoryCacheBackend(max_entries, ttl)
+        return SQLiteCacheBackend(str(tmp_path / "cache.db"), max_entries, ttl)
+    return make
+
+
+def test_entries_expire_after_the_ttl(make_backend, clock):
+    backend = make_backend(ttl=60)
+    backend.set("key", "value")
+    clock.now += 59
+    assert backend.get("key") == "value"
+    clock.now += 2
+    assert backend.get("key") is None
+    assert len(backend) == 0
+
+
+def test_least_recently_used_entry_is_evicted(make_backend, clock):
+    backend = make_backend(max_entries=2)
+    backend.set("a", "1")
+    clock.now += 1
+    backend.set("b", "2")
+    clock.now += 1
+    assert backend.get("a") == "1"
+    clock.now += 1
+    backend.set("c", "3")
+    assert backend.get("b") is None
+    assert (backend.get("a"), backend.get("c")) == ("1", "3")
+    assert len(backend) == 2
+
+
+def test_sqlite_cache_is_shared_between_connections(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteCacheBackend(path, 10, 60).set("key", "value")
+    assert SQLiteCacheBackend(path, 10, 60).get("key") == "value"
+
+
+def test_key_covers_every_input():
+    base = ("ollama", "mistral", "What is Alice's GPA?", "prompt", 1)
+    key = make_cache_key(*base)
+    # Case, spacing and trailing punctuation do not matter
+    assert make_cache_key("ollama", "mistral", "  what is alice's   GPA ", "prompt", 1) == key
+    for position, value in enumerate(("gemini", "llama2", "What is Bob's GPA?", "other prompt", 2)):
+        changed = list(base)
+        changed[position] = value
+        assert make_cache_key(*changed) != key
+
+
+def test_engine_answers_repeats_from_the_cache_until_the_database_changes(make_backend, monkeypatch):
+    monkeypatch.setattr(database, "_shared_database", Database())
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    monkeypatch.setattr(Config, "SINGLE_FLIGHT_ENABLED", False)
+    provider = CountingProvider()
+    engine = RAGEngine(provider_type="ollama", provider=provider)
+    engine.cache = ResponseCache(make_backend())
+
+    question = "Summarise Alice Johnson's record"
+    assert engine.query_detailed(question)["source"] == "provider"
+    cached = engine.query_detailed(question.upper())
+    assert (cached["source"], cached["response"]) == ("cache", "answer 1")
+
+    engine.db.update_student("STU001", {"gpa": 3.9})
+    refreshed = engine.query_detailed(question)
+    assert (refreshed["source"], refreshed["response"]) == ("provider", "answer 2")
+    assert engine.query_detailed(question)["response"] == "answer 2"
+    assert provider.calls == 2
+    assert engine.cache.stats()["hits"] == 2
+
+
+def test_error_responses_are_not_cached(monkeypatch):
+    monkeypatch.setattr(database, "_shared_database", Database())
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    monkeypatch.setattr(Config, "SINGLE_FLIGHT_ENABLED", False)
+    provider = CountingProvider()
+    provider.query = lambda query, context="": "Error querying Ollama: connection refused"
+    engine = RAGEngine(provider_type="ollama", provider=provider)
+    engine.cache = ResponseCache(MemoryCacheBackend(10, 60))
+    engine.query("Summarise Bob Smith's record")
+    assert len(engine.cache.backend) == 0
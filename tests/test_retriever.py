@@ -0,0 +1,68 @@
+import sys
+import threading
+from database import Database
+from retriever import Retriever
+
+
+def make_database(extra_students: int = 0) -> Database:
+    db = Database()
+    for number in range(extra_students):
+        db.add_student(f"GEN{number:05d}", {
+            "name": f"Generated Person{number}", "email": f"person{number}@university.edu",
+            "major": "Undeclared", "gpa": 3.0, "courses": ["CS101"], "grades": {"CS101": "B"}
+        })
+    return db
+
+
+def ranked_ids(retriever: Retriever, question: str) -> list:
+    return [chunk["id"] for chunk in retriever.retrieve(question)]
+
+
+def test_incremental_refresh_matches_a_fresh_build():
+    db = make_database(50)
+    retriever = Retriever(db, mode="keyword", top_k=5)
+    db.update_student("STU001", {"major": "Underwater Basketweaving"})
+    db.add_course("ART999", {"name": "Underwater Basketweaving", "instructor": "Dr. Reed",
+                             "credits": 1, "description": "Weaving baskets below the waterline"})
+    for question in ("underwater basketweaving", "who teaches ART999", "Alice Johnson major"):
+        assert ranked_ids(retriever, question) == ranked_ids(Retriever(db, mode="keyword", top_k=5), question)
+    assert retriever.built_version == db.version
+    assert "Underwater Basketweaving" in retriever.retrieve("Alice Johnson")[0]["text"]
+
+
+def test_queries_during_rebuilds_see_a_whole_build():
+    db = make_database(3000)
+    retriever = Retriever(db, mode="keyword", top_k=3)
+    stop = threading.Event()
+
+    def rebuild():
+        number = 0
+        while not stop.is_set():
+            # Full rebuilds alternating with incremental updates
+            retriever.build()
+            db.update_student(f"GEN{number % 3000:05d}", {"gpa": 2.0 + number % 10 / 10})
+            retriever.refresh()
+            number += 1
+
+    # Switch threads often so queries land inside rebuilds
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    thread = threading.Thread(target=rebuild)
+    thread.start()
+    try:
+        # A half-built index falls back to the first chunks, which start with Alice
+        results = [ranked_ids(retriever, "Bob Smith")[:1] for _ in range(1000)]
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert results == [["STU002"]] * 1000
+
+
+def test_full_mode_refresh_keeps_token_total():
+    db = make_database(5)
+    retriever = Retriever(db, mode="full")
+    db.update_student("STU002", {"major": "A much longer major name than before"})
+    retriever.refresh()
+    assert sum(chunk["tokens"] for chunk in retriever.retrieve("anything")) == sum(
+        chunk["tokens"] for chunk in Retriever(db, mode="full").retrieve("anything"))
@@ -0,0 +1,117 @@
+import math
+import numpy as np
+import pytest
+from database import Database
+from response_cache import normalize_question
+from semantic_cache import SemanticCache
+
+PROVIDER = ("ollama", "mistral")
+
+
+class TableEmbedder:
+    """Embeds questions from a fixed table; unlisted questions all share one vector"""
+
+    def __init__(self, vectors: dict = None):
+        self.vectors = {normalize_question(question): vector for question, vector in (vectors or {}).items()}
+
+    def embed(self, texts: list) -> np.ndarray:
+        return np.array([self.vectors.get(text, [1.0, 0.0]) for text in texts], dtype=np.float32)
+
+
+def at_angle(similarity: float) -> list:
+    return [similarity, math.sqrt(1 - similarity ** 2)]
+
+
+@pytest.fixture
+def db():
+    return Database()
+
+
+def make_cache(db, embedder=None, threshold: float = 0.9) -> SemanticCache:
+    return SemanticCache(db, embedder=embedder or TableEmbedder(), threshold=threshold, max_entries=8)
+
+
+@pytest.mark.parametrize("offset, hit", [(0.001, True), (-0.001, False)])
+def test_threshold(db, offset, hit):
+    stored, asked = "What is Alice Johnson's GPA?", "Tell me Alice Johnson's grade point average"
+    embedder = TableEmbedder({stored: [1.0, 0.0], asked: at_angle(0.9 + offset)})
+    cache = make_cache(db, embedder, threshold=0.9)
+    cache.store(PROVIDER, stored, "3.8")
+    result = cache.lookup(PROVIDER, asked)
+    if hit:
+        answer, similarity = result
+        assert answer == "3.8" and similarity == pytest.approx(0.901, abs=1e-4)
+    else:
+        assert result is None
+    assert cache.stats()["hits"] == int(hit)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    # Different students
+    ("What is Alice's GPA?", "What is Bob's GPA?"),
+    ("What is Alice Johnson's GPA?", "What is Carol Davis's GPA?"),
+    # Different courses
+    ("Who teaches CS101?", "Who teaches CS201?"),
+    # Different grade letters
+    ("Which students got A grades?", "Which students got B grades?"),
+    ("Who got an A- in CS201?", "Who got an A in CS201?"),
+    # Negation and comparison
+    ("Which students are enrolled in CS101?", "Which students are not enrolled in CS101?"),
+    ("Who has the highest GPA?", "Who has the lowest GPA?"),
+    # Numbers
+    ("Which students have a GPA above 3.5?", "Which students have a GPA above 3.8?"),
+])
+def test_identical_embeddings_with_different_entities_or_terms_miss(db, stored, asked):
+    # Every question embeds to the same vector, so only the guard keeps them apart
+    cache = make_cache(db)
+    cache.store(PROVIDER, stored, "cached answer")
+    assert cache.lookup(PROVIDER, asked) is None
+    assert cache.lookup(PROVIDER, stored) == ("cached answer", pytest.approx(1.0))
+
+
+def test_answers_are_kept_per_provider_and_model(db):
+    cache = make_cache(db)
+    cache.store(PROVIDER, "What is Alice's GPA?", "3.8")
+    assert cache.lookup(("ollama", "llama2"), "What is Alice's GPA?") is None
+    assert cache.lookup(("gemini", "gemini-pro"), "What is Alice's GPA?") is None
+
+
+def test_update_to_a_dependency_invalidates_the_answer(db):
+    cache = make_cache(db)
+    chunks = [{"type": "student", "id": "STU001"}]
+    cache.store(PROVIDER, "What is Alice's GPA?", "3.8", chunks)
+    # Changes to records the answer did not use leave it cached
+    db.update_student("STU002", {"gpa": 3.0})
+    assert cache.lookup(PROVIDER, "What is Alice's GPA?")[0] == "3.8"
+
+    db.update_student("STU001", {"gpa": 3.9})
+    assert cache.lookup(PROVIDER, "What is Alice's GPA?") is None
+    stats = cache.stats()
+    assert stats["invalidations"] == 1 and stats["entries"] == 0
+
+
+def test_enrollment_change_invalidates_course_answers(db):
+    cache = make_cache(db)
+    cache.store(PROVIDER, "How many students take AI101?", "1")
+    db.update_student("STU001", {"courses": ["CS101", "AI101"]})
+    assert cache.lookup(PROVIDER, "How many students take AI101?") is None
+
+
+def test_questions_naming_no_record_depend_on_the_database_version(db):
+    cache = make_cache(db)
+    cache.store(PROVIDER, "Which major is most popular?", "Computer Science")
+    assert cache.lookup(PROVIDER, "Which major is most popular?")[0] == "Computer Science"
+    db.update_course("ML101", {"credits": 3})
+    assert cache.lookup(PROVIDER, "Which major is most popular?") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_entry_is_evicted(db):
+    cache = SemanticCache(db, embedder=TableEmbedder(), threshold=0.9, max_entries=2)
+    cache.store(PROVIDER, "Who teaches CS101?", "Dr. Smith")
+    cache.store(PROVIDER, "Who teaches CS201?", "Dr. Johnson")
+    cache.lookup(PROVIDER, "Who teaches CS101?")
+    cache.store(PROVIDER, "Who teaches AI101?", "Dr. Lee")
+    assert cache.lookup(PROVIDER, "Who teaches CS201?") is None
+    assert cache.lookup(PROVIDER, "Who teaches CS101?")[0] == "Dr. Smith"
+    assert cache.lookup(PROVIDER, "Who teaches AI101?")[0] == "Dr. Lee"
@@ -0,0 +1,81 @@
+import threading
+import time
+import pytest
+import shared_engines
+from config import Config
+from ollama_provider import OllamaProvider
+from rag_engine import RAGEngine
+
+
+class RecordingEngine:
+    """Stands in for RAGEngine, recording what each engine was built for"""
+
+    built = []
+
+    def __init__(self, provider_type: str, ollama_model: str = None):
+        self.provider_type = provider_type
+        self.ollama_model = ollama_model
+        time.sleep(0.01)
+        RecordingEngine.built.append((provider_type, ollama_model))
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(shared_engines, "_engines", {})
+    monkeypatch.setattr(shared_engines, "_discovery", {})
+    monkeypatch.setattr(shared_engines, "RAGEngine", RecordingEngine)
+    monkeypatch.setattr(RecordingEngine, "built", [])
+
+
+def test_engines_are_keyed_on_provider_and_model():
+    mistral = shared_engines.get_rag_engine("ollama", "mistral")
+    assert shared_engines.get_rag_engine("ollama", "mistral") is mistral
+    llama = shared_engines.get_rag_engine("ollama", "llama2")
+    gemini = shared_engines.get_rag_engine("gemini")
+    assert shared_engines.get_rag_engine("gemini") is gemini
+    assert len({id(mistral), id(llama), id(gemini)}) == 3
+    assert (llama.provider_type, llama.ollama_model) == ("ollama", "llama2")
+    assert RecordingEngine.built == [("ollama", "mistral"), ("ollama", "llama2"), ("gemini", None)]
+
+
+def test_concurrent_sessions_share_one_engine():
+    engines = []
+    threads = [threading.Thread(target=lambda: engines.append(shared_engines.get_rag_engine("ollama", "mistral")))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len({id(engine) for engine in engines}) == 1
+    assert RecordingEngine.built == [("ollama", "mistral")]
+
+
+def test_discovery_is_probed_once_per_ttl(monkeypatch):
+    probes = []
+
+    def probe(name, value):
+        def run():
+            probes.append(name)
+            return value
+        return staticmethod(run)
+
+    monkeypatch.setattr(Config, "PROVIDER_DISCOVERY_TTL", 0.2)
+    monkeypatch.setattr(RAGEngine, "get_available_providers", probe("providers", ["gemini", "ollama"]))
+    monkeypatch.setattr(OllamaProvider, "is_available", probe("ollama", True))
+    monkeypatch.setattr(OllamaProvider, "get_available_models", probe("models", ["mistral", "llama2"]))
+    monkeypatch.setattr(shared_engines, "RAGEngine", RAGEngine)
+
+    for _ in range(3):
+        assert shared_engines.get_available_providers() == ["gemini", "ollama"]
+        assert shared_engines.is_ollama_available() is True
+        assert shared_engines.get_ollama_models() == ["mistral", "llama2"]
+    assert probes == ["providers", "ollama", "models"]
+
+    # Callers get their own copy of a cached list
+    shared_engines.get_ollama_models().append("changed")
+    assert shared_engines.get_ollama_models() == ["mistral", "llama2"]
+
+    time.sleep(0.25)
+    shared_engines.get_available_providers()
+    shared_engines.get_ollama_models()
+    assert probes == ["providers", "ollama", "models", "providers", "models"]
@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from single_flight import SingleFlight
+
+
+def wait_until(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_with_the_same_key_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def call():
+        runs.append(threading.current_thread().name)
+        release.wait(5)
+        return "answer"
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        futures = [executor.submit(flight.do, "key", call) for _ in range(8)]
+        # Hold the leader until every other caller has joined it
+        wait_until(lambda: flight.stats()["coalesced"] == 7)
+        assert flight.stats()["in_flight"] == 1
+        release.set()
+        results = [future.result(5) for future in futures]
+    assert results == ["answer"] * 8
+    assert len(runs) == 1
+    assert flight.stats() == {"calls": 1, "coalesced": 7, "coalesced_rate": 7 / 8, "in_flight": 0}
+
+
+def test_waiting_callers_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def call():
+        release.wait(5)
+        raise ValueError("provider down")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flight.do, "key", call) for _ in range(4)]
+        wait_until(lambda: flight.stats()["coalesced"] == 3)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError, match="provider down"):
+                future.result(5)
+    # The key is free again after a failure
+    assert flight.do("key", lambda: "recovered") == "recovered"
+
+
+def test_different_keys_run_independently():
+    flight = SingleFlight()
+    barrier = threading.Barrier(3, timeout=5)
+
+    def call(key):
+        # Deadlocks unless all three keys run at the same time
+        barrier.wait()
+        return key
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [executor.submit(flight.do, key, lambda key=key: call(key)) for key in "abc"]
+        assert [future.result(5) for future in futures] == ["a", "b", "c"]
+    assert flight.stats()["calls"] == 3
+    assert flight.stats()["coalesced"] == 0
+
+
+def test_finished_calls_are_not_reused():
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do("key", lambda: next(counter)) == 0
+    assert flight.do("key", lambda: next(counter)) == 1
+
+
+def test_async_callers_share_one_call():
+    flight = SingleFlight()
+    runs = []
+
+    async def call():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", call) for _ in range(10)))
+
+    assert asyncio.run(main()) == ["answer"] * 10
+    assert len(runs) == 1
+    assert flight.stats()["coalesced"] == 9
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelling_one_async_caller_does_not_cancel_the_call():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        first = asyncio.ensure_future(flight.ado("key", call))
+        second = asyncio.ensure_future(flight.ado("key", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_async_exception_reaches_every_caller():
+    flight = SingleFlight()
+
+    async def call():
+        await asyncio.sleep(0.01)
+        raise ValueError("provider down")
+
+    async def main():
+        return await asyncio.gather(*(flight.ado("key", call) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flight.stats()["calls"] == 1
@@ -0,0 +1,138 @@
+from collections.abc import Mapping
+import pytest
+from sqlalchemy import event
+import database
+from config import Config
+from database import Database
+from rag_engine import RAGEngine
+from response_cache import MemoryCacheBackend, ResponseCache
+from retriever import Retriever
+from sql_database import SQLDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    return SQLDatabase(f"sqlite:///{tmp_path / 'students.db'}")
+
+
+def add_students(db, count: int):
+    db.bulk_insert_students([(f"GEN{number:03d}", {
+        "name": f"Generated Person{number}", "email": f"person{number}@university.edu",
+        "major": "Undeclared", "gpa": 2.0, "courses": ["CS101"], "grades": {}
+    }) for number in range(count)])
+
+
+def test_seeded_from_config(db, tmp_path):
+    assert dict(db.get_all_students().items()) == Config.STUDENT_DATABASE
+    assert dict(db.get_all_courses().items()) == Config.COURSE_DATABASE
+    assert sorted(db.iter_records()) == sorted(Database().iter_records())
+    # Reopening an existing file does not seed it again
+    assert len(SQLDatabase(db.url).get_all_students()) == len(Config.STUDENT_DATABASE)
+    assert len(SQLDatabase(f"sqlite:///{tmp_path / 'empty.db'}", seed=False).get_all_students()) == 0
+
+
+def test_mappings_stream_in_keyset_pages(db, monkeypatch):
+    monkeypatch.setattr(Config, "DATABASE_STREAM_BATCH_SIZE", 4)
+    add_students(db, 10)
+    statements = []
+    event.listen(db.engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    students = db.get_all_students()
+    assert isinstance(students, Mapping) and not isinstance(students, dict)
+    assert statements == []
+    ids = list(students)
+    assert ids == [f"GEN{number:03d}" for number in range(10)] + sorted(Config.STUDENT_DATABASE)
+    # 13 students in pages of 4, then an empty page; later pages start after the last ID seen
+    pages = [statement for statement in statements if statement.startswith("SELECT students.")]
+    assert len(pages) == 5
+    assert "students.id >" not in pages[0] and all("students.id >" in page for page in pages[1:])
+
+    assert len(students) == 13
+    assert students["STU001"] == Config.STUDENT_DATABASE["STU001"]
+    assert "GEN009" in students and "NOPE" not in students
+    with pytest.raises(KeyError):
+        students["NOPE"]
+    assert [info["gpa"] for info in students.values()][-3:] == [3.8, 3.6, 3.9]
+    assert list(db.get_all_courses()) == sorted(Config.COURSE_DATABASE)
+
+
+@pytest.mark.parametrize("lookup, argument", [
+    ("find_students_by_course", "CS101"),
+    ("find_students_by_course", "CS999"),
+    ("find_students_by_major", "computer science"),
+    ("find_students_by_major", "Data  Science!"),
+    ("find_students_by_name", "Carol Davis"),
+    ("find_students_by_name", "bob"),
+    ("find_students_by_name", "Nobody"),
+    ("find_grades", "a"),
+    ("find_grades", "B+"),
+    ("find_courses_by_instructor", "dr. lee"),
+    ("find_courses_by_name", "Data Structures"),
+])
+def test_lookups_match_the_in_memory_database(db, lookup, argument):
+    assert getattr(db, lookup)(argument) == getattr(Database(), lookup)(argument)
+
+
+@pytest.mark.parametrize("limit, highest", [(1, True), (2, True), (1, False), (3, False)])
+def test_gpa_ranking_matches_the_in_memory_database(db, limit, highest):
+    assert db.find_top_students_by_gpa(limit, highest) == Database().find_top_students_by_gpa(limit, highest)
+
+
+def test_updates_bump_versions_and_reach_lookups(db):
+    version = db.version
+    db.update_student("STU001", {"major": "Physics", "grades": {"CS101": "C"}})
+    db.update_course("CS201", {"instructor": "Dr. Moreau"})
+    assert db.version == version + 2
+    assert db.get_record_version("STU001") == 1 and db.get_record_version("STU002") == 0
+    assert db.get_record_version("CS201") == 1
+    assert db.find_students_by_major("physics") == ["STU001"]
+    assert db.find_grades("C") == [("STU001", "CS101")]
+    assert db.find_courses_by_instructor("Dr. Moreau") == ["CS201"]
+    assert "- Major: Physics" in db.render_record("STU001")[1]
+    assert "Instructor: Dr. Moreau" in db.format_as_context()
+    # Another connection to the same file sees the shared counter
+    assert SQLDatabase(db.url).version == db.version
+    with pytest.raises(KeyError):
+        db.update_student("NOPE", {"gpa": 1.0})
+    with pytest.raises(ValueError):
+        db.add_course("CS201", Config.COURSE_DATABASE["CS201"])
+
+
+def test_retriever_rebuilds_in_full_without_a_change_log(db, monkeypatch):
+    retriever = Retriever(db, mode="keyword", top_k=1)
+    version = db.version
+    db.update_student("STU002", {"major": "Underwater Basketweaving"})
+    assert db.changed_since(version) is None
+
+    builds = []
+    build = retriever.build
+    monkeypatch.setattr(retriever, "build", lambda: builds.append(1) or build())
+    [chunk] = retriever.retrieve("underwater basketweaving")
+    assert builds == [1]
+    assert chunk["id"] == "STU002" and "Underwater Basketweaving" in chunk["text"]
+    assert retriever.built_version == db.version
+
+
+def test_cached_answers_are_dropped_after_an_update(db, monkeypatch):
+    monkeypatch.setattr(database, "_shared_database", db)
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+    monkeypatch.setattr(Config, "SINGLE_FLIGHT_ENABLED", False)
+    contexts = []
+
+    class RecordingProvider:
+        model_name = "mistral"
+
+        def query(self, query: str, context: str = "") -> str:
+            contexts.append(context)
+            return f"answer {len(contexts)}"
+
+    engine = RAGEngine(provider_type="ollama", provider=RecordingProvider())
+    engine.cache = ResponseCache(MemoryCacheBackend(10, 60))
+    question = "Summarise Alice Johnson's record"
+    assert engine.query(question) == "answer 1"
+    assert engine.query(question) == "answer 1"
+
+    db.update_student("STU001", {"gpa": 2.5})
+    assert engine.query(question) == "answer 2"
+    assert "GPA: 2.5" in contexts[-1] and "GPA: 2.5" not in contexts[0]
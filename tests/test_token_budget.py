@@ -0,0 +1,72 @@
+import logging
+import pytest
+import database
+from config import Config
+from database import Database
+from rag_engine import RAGEngine
+from retriever import Retriever
+from token_budget import count_tokens, get_token_budget
+
+
+@pytest.mark.parametrize("text, tokens", [
+    ("", 0),
+    ("GPA", 1),
+    ("Hello, world!", 6),
+    # One token per four characters of a word
+    ("internationalization", 5),
+    ("STU001: 3.8", 6),
+    ("  spaced   out  ", 3),
+])
+def test_count_tokens(text, tokens):
+    assert count_tokens(text) == tokens
+
+
+def test_budget_lookup(monkeypatch):
+    monkeypatch.setattr(Config, "MODEL_TOKEN_BUDGETS", {"mistral": 3000, "llama3": 6000, "big-model": 32000})
+    monkeypatch.setattr(Config, "DEFAULT_TOKEN_BUDGET", 1234)
+    assert get_token_budget("mistral") == 3000
+    # Ollama tags share their base model's budget unless listed themselves
+    assert get_token_budget("llama3:8b") == 6000
+    assert get_token_budget("unknown-model") == 1234
+    assert get_token_budget(None) == 1234
+    # A failover pair is held to its smaller budget
+    assert get_token_budget("big-model|mistral") == 3000
+    assert get_token_budget("big-model|unknown-model") == 1234
+
+
+def test_full_mode_honours_the_hard_limit():
+    retriever = Retriever(Database(), mode="full")
+    every_chunk = retriever.retrieve("Carol Davis")
+    assert len(every_chunk) == len(retriever.chunks)
+    total = sum(chunk["tokens"] for chunk in every_chunk)
+    assert retriever.retrieve("Carol Davis", max_tokens=total) == every_chunk
+
+    limit = total // 2
+    chunks = retriever.retrieve("Carol Davis", max_tokens=limit)
+    assert 0 < len(chunks) < len(every_chunk)
+    assert sum(chunk["tokens"] for chunk in chunks) <= limit
+    # The most relevant records are the ones kept
+    assert chunks[0]["id"] == "STU003"
+
+    assert retriever.retrieve("Carol Davis", max_tokens=1) == []
+
+
+def test_prompt_tokens_are_logged_at_debug(monkeypatch, caplog):
+    monkeypatch.setattr(database, "_shared_database", Database())
+    monkeypatch.setattr(Config, "QUERY_ROUTER_ENABLED", False)
+
+    class EchoProvider:
+        model_name = "mistral"
+
+        def query(self, query: str, context: str = "") -> str:
+            return "answer"
+
+    engine = RAGEngine(provider_type="ollama", provider=EchoProvider())
+    engine.cache = None
+    with caplog.at_level(logging.INFO, logger="rag_engine"):
+        engine.query("Summarise Bob Smith's record")
+    assert caplog.records == []
+    with caplog.at_level(logging.DEBUG, logger="rag_engine"):
+        result = engine.query_detailed("Summarise Carol Davis's record")
+    [record] = caplog.records
+    assert record.getMessage().startswith(f"ollama/mistral prompt: {result['prompt_tokens']} tokens")
@@ -0,0 +1,101 @@
+import sys
+import numpy as np
+import pytest
+import vector_index
+from config import Config
+from database import Database
+from embeddings import HashingEmbedder
+from retriever import Retriever
+from vector_index import NumpyIndex, RecordIndex
+
+
+def unit_vectors(count: int, dimension: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def brute_force(vectors: np.ndarray, queries: np.ndarray, k: int) -> tuple:
+    """Top-k positions and cosine similarities, scored one pair at a time"""
+    positions, scores = [], []
+    for query in queries:
+        similarities = [float(np.dot(query, vector) / (np.linalg.norm(query) * np.linalg.norm(vector)))
+                        for vector in vectors]
+        ranked = sorted(range(len(vectors)), key=lambda position: -similarities[position])[:k]
+        positions.append(ranked)
+        scores.append([similarities[position] for position in ranked])
+    return np.array(positions), np.array(scores)
+
+
+@pytest.mark.parametrize("block_rows", [vector_index.SEARCH_BLOCK_ROWS, 64])
+def test_numpy_index_is_exact_knn(monkeypatch, block_rows):
+    # Small blocks make the search merge candidates across many blocks
+    monkeypatch.setattr(vector_index, "SEARCH_BLOCK_ROWS", block_rows)
+    vectors, queries = unit_vectors(500, 24, seed=1), unit_vectors(7, 24, seed=2)
+    index = NumpyIndex(24)
+    index.add(vectors[:200])
+    index.add(vectors[200:])
+    assert len(index) == 500
+
+    scores, positions = index.search(queries, 10)
+    expected_positions, expected_scores = brute_force(vectors, queries, 10)
+    assert positions.tolist() == expected_positions.tolist()
+    np.testing.assert_allclose(scores, expected_scores, atol=1e-5)
+
+
+def test_numpy_index_pads_and_updates():
+    vectors = unit_vectors(3, 8, seed=3)
+    index = NumpyIndex(8)
+    scores, positions = index.search(vectors[0], 2)
+    assert positions.tolist() == [[-1, -1]] and np.isneginf(scores).all()
+
+    index.add(vectors)
+    scores, positions = index.search(vectors[0], 5)
+    assert positions[0, 0] == 0 and scores[0, 0] == pytest.approx(1.0)
+    assert positions[0, 3:].tolist() == [-1, -1]
+
+    index.update([2], vectors[0])
+    _scores, positions = index.search(vectors[0], 2)
+    assert sorted(positions[0].tolist()) == [0, 2]
+    with pytest.raises(ValueError):
+        index.add(np.zeros((1, 4)))
+
+
+def test_record_index_updates_in_place():
+    records = [("STU001", "student", "Alice Johnson studies Computer Science"),
+               ("STU002", "student", "Bob Smith studies Mathematics"),
+               ("CS101", "course", "Introduction to Programming taught by Dr. Smith")]
+    index = RecordIndex(HashingEmbedder(dimension=256), backend="numpy")
+    index.build(records)
+    assert index.search("Bob Smith Mathematics", 1)[0][0] == "STU002"
+
+    index.update([("STU002", "student", "Bob Smith studies Marine Biology"),
+                  ("BIO101", "course", "Marine Biology field trips")])
+    assert index.ids == ["STU001", "STU002", "CS101", "BIO101"]
+    assert [record_id for record_id, _score in index.search("Marine Biology", 2)] in (
+        ["STU002", "BIO101"], ["BIO101", "STU002"])
+
+
+@pytest.fixture
+def offline_embeddings(monkeypatch):
+    monkeypatch.setattr(Config, "EMBEDDING_BACKEND", "hashing")
+    monkeypatch.setattr(Config, "HASHING_EMBEDDING_DIM", 256)
+    monkeypatch.setattr(Config, "EMBEDDING_STORE_DIR", "")
+    # Any attempt to load (or download) a sentence-transformers model fails the test
+    monkeypatch.setitem(sys.modules, "sentence_transformers", None)
+
+
+def test_vector_retriever(offline_embeddings):
+    db = Database()
+    retriever = Retriever(db, mode="vector", top_k=3)
+    assert isinstance(retriever.embedder, HashingEmbedder)
+    assert len(retriever.record_index.ids) == len(retriever.chunks)
+
+    chunks = retriever.retrieve("Tell me about Carol Davis")
+    assert chunks[0]["id"] == "STU003"
+    assert len(chunks) <= 3
+    assert retriever.retrieve("Who teaches Machine Learning?")[0]["id"] == "ML101"
+
+    db.add_course("OCE210", {"name": "Oceanography", "instructor": "Dr. Reed",
+                             "credits": 3, "description": "Tides, currents and marine ecosystems"})
+    assert retriever.retrieve("Oceanography tides and currents")[0]["id"] == "OCE210"
+    assert retriever.built_version == db.version
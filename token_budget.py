@@ -0,0 +1,24 @@
+import re
+from config import Config
+
+# Words and individual punctuation marks, the units BPE tokenizers mostly split on
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count without a model tokenizer.
+
+    Each punctuation mark counts as one token and each word as one token per four
+    characters, which tracks common BPE tokenizers closely for English and IDs.
+    """
+    return sum((len(piece) + 3) // 4 for piece in TOKEN_PATTERN.findall(text))
+
+
+def get_token_budget(model_name: str) -> int:
+    """Prompt token budget for a model from MODEL_TOKEN_BUDGETS, falling back to DEFAULT_TOKEN_BUDGET"""
+    # A failover provider's model name joins its models with "|"; the smallest budget applies
+    budgets = []
+    for name in (model_name or "").split("|"):
+        budget = Config.MODEL_TOKEN_BUDGETS.get(name, Config.MODEL_TOKEN_BUDGETS.get(name.split(":")[0]))
+        budgets.append(budget or Config.DEFAULT_TOKEN_BUDGET)
+    return min(budgets)
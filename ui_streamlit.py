@@ -3,8 +3,12 @@ import streamlit as st
 from datetime import datetime
 import json
 import os
-from rag_engine import RAGEngine
 from prompts import Prompts
+from config import configure_logging
+# Module state outlives reruns, so engines and discovery results are shared by every session
+from shared_engines import get_available_providers, get_ollama_models, get_rag_engine, is_ollama_available
+
+configure_logging()
 
 st.set_page_config(
     page_title="Student RAG Workshop",
@@ -41,7 +45,7 @@ if "chat_history" not in st.session_state:
     st.session_state.chat_history = []
 
 if "current_provider" not in st.session_state:
-    providers = RAGEngine.get_available_providers()
+    providers = get_available_providers()
     st.session_state.current_provider = providers[0] if providers else None
 
 if "current_model" not in st.session_state:
@@ -129,7 +133,7 @@ elif page == "💬 Full RAG Chat":
     with st.sidebar:
         st.subheader("⚙️ Settings")
         
-        providers = RAGEngine.get_available_providers()
+        providers = get_available_providers()
         
         if providers:
             provider = st.selectbox(
@@ -141,8 +145,7 @@ elif page == "💬 Full RAG Chat":
             
             # Model selection for Ollama
             if provider == "ollama":
-                from ollama_provider import OllamaProvider
-                models = OllamaProvider.get_available_models()
+                models = get_ollama_models()
                 if models:
                     model = st.selectbox(
                         "Select Model:",
@@ -153,10 +156,9 @@ elif page == "💬 Full RAG Chat":
             
             st.divider()
             
-            # Initialize RAG engine if needed
-            if st.session_state.rag_engine is None or st.session_state.rag_engine.provider_type != provider:
-                ollama_model = st.session_state.current_model if provider == "ollama" else None
-                st.session_state.rag_engine = RAGEngine(provider_type=provider, ollama_model=ollama_model)
+            # Engines are cached per provider and model, so switching either is cheap
+            ollama_model = st.session_state.current_model if provider == "ollama" else None
+            st.session_state.rag_engine = get_rag_engine(provider, ollama_model)
             
             # Chat controls
             col1, col2 = st.columns(2)
@@ -201,10 +203,16 @@ elif page == "💬 Full RAG Chat":
             st.write(user_input)
         
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                response = st.session_state.rag_engine.query(user_input)
-            st.write(response)
-            st.caption(f"Provider: {st.session_state.current_provider.upper()} • {datetime.now().strftime('%H:%M:%S')}")
+            placeholder = st.empty()
+            placeholder.markdown("Thinking...")
+            stream = st.session_state.rag_engine.stream_query(user_input)
+            # Render tokens as they arrive instead of waiting for the whole answer
+            for token in stream:
+                placeholder.markdown(stream.text + "▌")
+            response = stream.text
+            placeholder.markdown(response)
+            st.caption(f"Provider: {st.session_state.current_provider.upper()} • {datetime.now().strftime('%H:%M:%S')} • "
+                       f"first token {stream.ttft or 0:.2f}s • total {stream.latency:.2f}s")
         
         st.session_state.chat_history.append({
             "role": "assistant",
@@ -225,7 +233,7 @@ elif page == "🔧 Gemini Module":
             st.info("Run: `python workshop_basic_gemini.py`")
     
     try:
-        rag = RAGEngine(provider_type="gemini")
+        rag = get_rag_engine("gemini")
         
         st.subheader("📝 Example Prompts")
         examples = rag.get_example_prompts()
@@ -260,14 +268,12 @@ elif page == "🦙 Ollama Module":
             st.info("Run: `python workshop_basic_ollama.py`")
     
     try:
-        from ollama_provider import OllamaProvider
-        
-        if not OllamaProvider.is_available():
+        if not is_ollama_available():
             st.error("❌ Ollama not running")
             st.info("Start Ollama: `ollama serve`")
             st.stop()
         
-        models = OllamaProvider.get_available_models()
+        models = get_ollama_models()
         
         st.subheader("📦 Available Models")
         st.write(", ".join(models) if models else "No models found")
@@ -276,7 +282,7 @@ elif page == "🦙 Ollama Module":
         
         st.divider()
         
-        rag = RAGEngine(provider_type="ollama", ollama_model=selected_model)
+        rag = get_rag_engine("ollama", selected_model)
         
         st.subheader("📝 Example Prompts")
         examples = rag.get_example_prompts()
@@ -309,7 +315,7 @@ elif page == "✍️ Prompts Practice":
         if st.button("📖 View Code"):
             st.info("Run: `python workshop_simple_prompts.py`")
     
-    providers = RAGEngine.get_available_providers()
+    providers = get_available_providers()
     
     if not providers:
         st.error("❌ No providers available")
@@ -320,8 +326,7 @@ elif page == "✍️ Prompts Practice":
         provider = st.selectbox("Select Provider:", providers)
     with col2:
         if provider == "ollama":
-            from ollama_provider import OllamaProvider
-            models = OllamaProvider.get_available_models()
+            models = get_ollama_models()
             model = st.selectbox("Select Model:", models) if models else None
         else:
             model = None
@@ -378,7 +383,7 @@ elif page == "✍️ Prompts Practice":
         st.info(f"**Final Prompt:** {final_prompt}")
         
         # Query
-        rag = RAGEngine(provider_type=provider, ollama_model=model)
+        rag = get_rag_engine(provider, model)
         
         with st.spinner("Processing..."):
             response = rag.query(final_prompt)
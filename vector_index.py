@@ -0,0 +1,227 @@
+import math
+import numpy as np
+from typing import Optional
+from config import Config
+
+# Rows scored per matrix multiply in the brute-force index; bounds temporary memory
+SEARCH_BLOCK_ROWS = 262144
+
+
+class VectorIndex:
+    """Common interface for nearest-neighbour indexes over unit-length float32 vectors"""
+
+    dimension = 0
+    # Whether update() can replace vectors in place
+    updatable = False
+
+    def add(self, vectors: np.ndarray):
+        """Append vectors; their positions continue from the current size"""
+        raise NotImplementedError
+
+    def update(self, positions: list, vectors: np.ndarray):
+        """Replace the vectors at positions"""
+        raise NotImplementedError
+
+    def search(self, queries: np.ndarray, k: int) -> tuple:
+        """Return (scores, positions) arrays of shape (n_queries, k), best first.
+
+        Missing results are padded with score -inf and position -1.
+        """
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+
+def _as_matrix(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """Coerce vectors to a contiguous (n, dimension) float32 matrix"""
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    if matrix.shape[1] != dimension:
+        raise ValueError(f"Expected vectors of dimension {dimension}, got {matrix.shape[1]}")
+    return matrix
+
+
+class NumpyIndex(VectorIndex):
+    """Exact brute-force inner-product search with NumPy"""
+
+    updatable = True
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self.matrix = np.empty((0, dimension), dtype=np.float32)
+
+    def add(self, vectors: np.ndarray):
+        vectors = _as_matrix(vectors, self.dimension)
+        if len(self.matrix):
+            self.matrix = np.concatenate([self.matrix, vectors])
+        else:
+            self.matrix = vectors
+
+    def update(self, positions: list, vectors: np.ndarray):
+        vectors = _as_matrix(vectors, self.dimension)
+        if not self.matrix.flags.writeable:
+            # Memory-mapped read-only from the embedding store; copy once before writing
+            self.matrix = np.array(self.matrix)
+        self.matrix[positions] = vectors
+
+    def search(self, queries: np.ndarray, k: int) -> tuple:
+        queries = _as_matrix(queries, self.dimension)
+        n_queries = len(queries)
+        best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        best_positions = np.full((n_queries, k), -1, dtype=np.int64)
+        if k <= 0 or not len(self.matrix):
+            return best_scores, best_positions
+
+        for start in range(0, len(self.matrix), SEARCH_BLOCK_ROWS):
+            block = self.matrix[start:start + SEARCH_BLOCK_ROWS]
+            scores = queries @ block.T
+            take = min(k, block.shape[0])
+            if take < block.shape[0]:
+                candidates = np.argpartition(-scores, take - 1, axis=1)[:, :take]
+            else:
+                candidates = np.broadcast_to(np.arange(take), (n_queries, take))
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+
+            # Merge this block's candidates with the best seen so far
+            merged_scores = np.concatenate([best_scores, candidate_scores], axis=1)
+            merged_positions = np.concatenate([best_positions, candidates + start], axis=1)
+            order = np.argsort(-merged_scores, axis=1, kind="stable")[:, :k]
+            best_scores = np.take_along_axis(merged_scores, order, axis=1)
+            best_positions = np.take_along_axis(merged_positions, order, axis=1)
+
+        return best_scores, best_positions
+
+    def __len__(self) -> int:
+        return len(self.matrix)
+
+
+class FaissIndex(VectorIndex):
+    """Approximate inner-product search with a FAISS IVF or HNSW index"""
+
+    def __init__(self, dimension: int, kind: str = "ivf"):
+        # Imported lazily so the NumPy backend works without faiss installed
+        import faiss
+
+        self.faiss = faiss
+        self.dimension = dimension
+        self.kind = kind
+        if kind == "hnsw":
+            self.index = faiss.IndexHNSWFlat(dimension, Config.FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+            self.index.hnsw.efSearch = Config.FAISS_HNSW_EF_SEARCH
+        elif kind == "ivf":
+            # Built on the first add, when the number of lists can be sized to the data
+            self.index = None
+        else:
+            raise ValueError(f"Unknown FAISS index kind: {kind}")
+
+    def _build_ivf(self, training_vectors: np.ndarray):
+        """Create and train the IVF index from the first batch of vectors"""
+        faiss = self.faiss
+        # FAISS wants roughly 39+ training points per list
+        nlist = max(1, min(Config.FAISS_IVF_NLIST, len(training_vectors) // 39, int(math.sqrt(len(training_vectors)))))
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        self.index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        self.index.train(training_vectors)
+        self.index.nprobe = min(Config.FAISS_IVF_NPROBE, nlist)
+        self._quantizer = quantizer
+
+    def add(self, vectors: np.ndarray):
+        vectors = _as_matrix(vectors, self.dimension)
+        if not len(vectors):
+            return
+        if self.index is None:
+            self._build_ivf(vectors)
+        self.index.add(vectors)
+
+    def search(self, queries: np.ndarray, k: int) -> tuple:
+        queries = _as_matrix(queries, self.dimension)
+        if self.index is None or k <= 0:
+            return (np.full((len(queries), max(k, 0)), -np.inf, dtype=np.float32),
+                    np.full((len(queries), max(k, 0)), -1, dtype=np.int64))
+        scores, positions = self.index.search(queries, k)
+        scores = np.where(positions < 0, -np.inf, scores).astype(np.float32)
+        return scores, positions.astype(np.int64)
+
+    def __len__(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+
+def create_index(dimension: int, backend: Optional[str] = None) -> VectorIndex:
+    """Create the vector index configured by VECTOR_INDEX_BACKEND"""
+    backend = backend or Config.VECTOR_INDEX_BACKEND
+    if backend == "numpy":
+        return NumpyIndex(dimension)
+    if backend == "faiss-ivf":
+        return FaissIndex(dimension, kind="ivf")
+    if backend == "faiss-hnsw":
+        return FaissIndex(dimension, kind="hnsw")
+    raise ValueError(f"Unknown vector index backend: {backend}")
+
+
+class RecordIndex:
+    """Nearest-neighbour index over the embedded student and course records"""
+
+    def __init__(self, embedder, backend: Optional[str] = None, store=None):
+        self.embedder = embedder
+        self.backend = backend
+        self.ids = []
+        self.positions = {}
+        # EmbeddingStore to sync with; shared by the indexes rebuilt from it
+        self.store = store
+        self.index = create_index(embedder.dimension, backend)
+
+    @property
+    def updatable(self) -> bool:
+        return self.index.updatable
+
+    def build(self, records):
+        """Embed records, (record_id, record_type, text) tuples such as Database.iter_records(), into the index.
+
+        With EMBEDDING_STORE_DIR set, embeddings are loaded memory-mapped from disk and
+        only records whose content changed since the last build are re-embedded.
+        """
+        if Config.EMBEDDING_STORE_DIR:
+            from embedding_store import EmbeddingStore
+
+            if self.store is None:
+                self.store = EmbeddingStore()
+            ids, embeddings = self.store.sync(records, self.embedder)
+        else:
+            ids, texts = [], []
+            for record_id, _record_type, text in records:
+                ids.append(record_id)
+                texts.append(text)
+            if hasattr(self.embedder, "fit"):
+                self.embedder.fit(texts)
+            embeddings = self.embedder.embed(texts)
+        self.ids = ids
+        self.positions = {record_id: position for position, record_id in enumerate(ids)}
+        self.index = create_index(self.embedder.dimension, self.backend)
+        self.index.add(embeddings)
+
+    def update(self, records: list):
+        """Re-embed changed records in place and append new ones, without rebuilding.
+
+        Changes are not written to the embedding store; the next build re-embeds them from there.
+        """
+        if not records:
+            return
+        vectors = self.embedder.embed([text for _record_id, _record_type, text in records])
+        changed = [row for row, record in enumerate(records) if record[0] in self.positions]
+        added = [row for row, record in enumerate(records) if record[0] not in self.positions]
+        if changed:
+            self.index.update([self.positions[records[row][0]] for row in changed], vectors[changed])
+        if added:
+            # IDs first, so a concurrent search never finds a position without one
+            for row in added:
+                self.positions[records[row][0]] = len(self.ids)
+                self.ids.append(records[row][0])
+            self.index.add(vectors[added])
+
+    def search(self, question: str, k: int) -> list:
+        """Return [(record_id, score)] for the k records nearest to a question"""
+        scores, positions = self.index.search(self.embedder.embed([question]), k)
+        return [(self.ids[position], float(score))
+                for score, position in zip(scores[0], positions[0]) if position >= 0]
@@ -3,6 +3,7 @@ WORKSHOP MODULE 2: Basic Ollama Integration
 Learn how to use Ollama with simple prompts
 """
 
+from config import configure_logging
 from rag_engine import RAGEngine
 from ollama_provider import OllamaProvider
 
@@ -42,10 +43,13 @@ def main():
         if not user_input:
             continue
         
-        print("\nAssistant: ", end="")
-        response = rag.query(user_input)
-        print(response)
+        print("\nAssistant: ", end="", flush=True)
+        stream = rag.stream_query(user_input)
+        for token in stream:
+            print(token, end="", flush=True)
+        print(f"\n[first token {stream.ttft or 0:.2f}s • total {stream.latency:.2f}s]")
         print()
 
 if __name__ == "__main__":
+    configure_logging()
     main()